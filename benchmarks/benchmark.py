@@ -0,0 +1,379 @@
+#!/usr/bin/python3
+
+"""Benchmark suite
+
+Times the main operations of iucn_modlib on synthetic Red List data and
+records their peak memory. Results are written as JSON, so that runs can be
+compared over time.
+
+    python benchmarks/benchmark.py --scale 1000 10000 --output results.json
+    python benchmarks/benchmark.py --compare old.json results.json
+"""
+
+import argparse
+import datetime
+import gc
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import iucn_modlib
+from iucn_modlib import synthetic
+
+
+BENCHMARKS = []
+
+
+def benchmark(name):
+    """Register a benchmark
+
+    The decorated function receives the benchmark context (see Context) and
+    returns a zero-argument callable (the timed operation) and the number of
+    items it processes.
+    """
+    def register(func):
+        BENCHMARKS.append((name, func))
+        return func
+    return register
+
+
+def measure(func, repeat):
+    """Time a callable (best of repeat) and record its peak memory"""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return min(times), peak
+
+
+@benchmark('loadBatchSource')
+def bench_loadBatchSource(ctx):
+    return lambda: iucn_modlib.loadBatchSource(ctx['batch']), ctx['scale']
+
+
+@benchmark('loadBatchSource (serial)')
+def bench_loadBatchSource_serial(ctx):
+    return lambda: iucn_modlib.loadBatchSource(ctx['batch'], workers=1), ctx['scale']
+
+
+@benchmark('loadBatchSource (zip)')
+def bench_loadBatchSource_zip(ctx):
+    archive = ctx['batch'] + '.zip'
+    if not os.path.exists(archive):
+        import zipfile
+        with zipfile.ZipFile(archive, 'w', zipfile.ZIP_DEFLATED) as z:
+            for filename in sorted(os.listdir(ctx['batch'])):
+                z.write(os.path.join(ctx['batch'], filename), filename)
+    return lambda: iucn_modlib.loadBatchSource(archive), ctx['scale']
+
+
+@benchmark('TaxonFactoryRedListBatch')
+def bench_TaxonFactoryRedListBatch(ctx):
+    taxa = ctx['sample']
+    source = ctx['source']
+    return lambda: [iucn_modlib.TaxonFactoryRedListBatch(t, source) for t in taxa], len(taxa)
+
+
+@benchmark('TaxonFactorySQLite')
+def bench_TaxonFactorySQLite(ctx):
+    path = ctx['batch'] + '.sqlite'
+    if not os.path.exists(path):
+        iucn_modlib.writeBatchSQLite(ctx['source'], path)
+    con = iucn_modlib.openBatchSQLite(path)
+    taxa = ctx['sample']
+    return lambda: [iucn_modlib.TaxonFactorySQLite(t, con) for t in taxa], len(taxa)
+
+
+@benchmark('lazyTaxa (elevations)')
+def bench_lazyTaxa(ctx):
+    source = ctx['source']
+    return lambda: [t.elevation_upper for t in iucn_modlib.lazyTaxa(source)], ctx['scale']
+
+
+@benchmark('Taxon.fix')
+def bench_fix(ctx):
+    taxa = [iucn_modlib.TaxonFactoryRedListBatch(t, ctx['source'], False, False) for t in ctx['sample']]
+    originals = [(t.elevation_lower, t.elevation_upper, [dict(h) for h in t.habitats]) for t in taxa]
+
+    def run():
+        for t, (lower, upper, habitats) in zip(taxa, originals):
+            t.elevation_lower, t.elevation_upper, t.habitats = lower, upper, [dict(h) for h in habitats]
+            t.fix('elevation')
+            t.fix('habitats')
+    return run, len(taxa)
+
+
+@benchmark('Taxon.habitatCodes')
+def bench_habitatCodes(ctx):
+    filters = [iucn_modlib.HabitatFiltersFactory(t) for t in ('kba_breeding', 'kba_nonbreeding')]
+    taxa = ctx['taxa']
+    return lambda: [t.habitatCodes(f) for t in taxa for f in filters], len(taxa)
+
+
+@benchmark('FilterTableFactory')
+def bench_FilterTableFactory(ctx):
+    source = ctx['source']
+    return lambda: iucn_modlib.FilterTableFactory(source, ['kba_breeding', 'kba_nonbreeding'], 'jung'), ctx['scale']
+
+
+@benchmark('BatchQuery.taxonids')
+def bench_BatchQuery(ctx):
+    query = iucn_modlib.BatchQuery(ctx['source'])
+    return lambda: (
+        query.taxonids(class_ = 'AVES', category = 'threatened', systems = 'terrestrial', elevationUpper = (None, 500)),
+        query.taxonids(habitats = '1.6')
+        ), ctx['scale']
+
+
+@benchmark('IUCNHabitatCodes_v3_1.toLevel')
+def bench_toLevel(ctx):
+    HC = iucn_modlib.IUCNHabitatCodes_v3_1()
+    codes = ctx['codes']
+    return lambda: [HC.toLevel(c, l) for c in codes for l in (1, 2)], len(codes)
+
+
+@benchmark('translator.toJung')
+def bench_toJung(ctx):
+    codes = ctx['codes']
+    return lambda: [iucn_modlib.translator.toJung(c) for c in codes], len(codes)
+
+
+@benchmark('translator.toESACCI')
+def bench_toESACCI(ctx):
+    codes = ctx['codes']
+    return lambda: [iucn_modlib.translator.toESACCI(c) for c in codes], len(codes)
+
+
+@benchmark('ElevationIndex.mask')
+def bench_elevationIndex(ctx):
+    index = iucn_modlib.ElevationIndex(ctx['dem_index'])
+    ranges = ctx['elevations']
+    return lambda: [index.mask(lower, upper) for lower, upper in ranges], len(ranges)
+
+
+@benchmark('DEM threshold')
+def bench_demThreshold(ctx):
+    import numpy
+    dem = numpy.load(ctx['dem'], mmap_mode='r')
+    ranges = ctx['elevations']
+    return lambda: [(dem >= lower) & (dem <= upper) & (dem != -32768) for lower, upper in ranges], len(ranges)
+
+
+@benchmark('scheduleTiles')
+def bench_scheduleTiles(ctx):
+    from iucn_modlib.raster import scheduleTiles
+    params = ctx['parameters']
+    return lambda: scheduleTiles(params, ctx['land_cover'], ctx['dem'], nodata = -32768), len(params)
+
+
+@benchmark('per-species masks')
+def bench_perSpeciesMasks(ctx):
+    import numpy
+    params = ctx['parameters']
+    def run():
+        landCover = numpy.load(ctx['land_cover'], mmap_mode='r')
+        dem = numpy.load(ctx['dem'], mmap_mode='r')
+        return [
+            int((numpy.isin(landCover, p.land_cover_codes) & (dem >= p.elevation_lower) & (dem <= p.elevation_upper) & (dem != -32768)).sum())
+            for p in params
+            ]
+    return run, len(params)
+
+
+FIXTURES = {}
+
+
+def fixture(name):
+    """Register a fixture
+
+    The decorated function receives the benchmark context and returns the
+    fixture value. Fixtures are built on first use by a benchmark, so only
+    the data the selected benchmarks need is generated or loaded.
+    """
+    def register(func):
+        FIXTURES[name] = func
+        return func
+    return register
+
+
+class Context:
+    """The fixtures of one benchmark, built lazily
+
+    A new context is used for each benchmark, so the fixtures of one
+    benchmark are freed before the next is measured. Files (synthetic
+    batches, rasters) are kept in the working folder and reused.
+    """
+
+    def __init__(self, scale, sample, workdir):
+        self._values = {'scale': scale, 'sample_size': sample, 'workdir': workdir}
+
+    def __getitem__(self, name):
+        if name not in self._values:
+            self._values[name] = FIXTURES[name](self)
+        return self._values[name]
+
+
+@fixture('batch')
+def fixture_batch(ctx):
+    batch = os.path.join(ctx['workdir'], f'batch_{ctx["scale"]}')
+    if not os.path.exists(os.path.join(batch, 'assessments.csv')):
+        start = time.perf_counter()
+        synthetic.writeSyntheticBatch(batch, ctx['scale'])
+        print(f'Generated {ctx["scale"]} taxa in {time.perf_counter() - start:.1f}s', file=sys.stderr)
+    return batch
+
+
+@fixture('source')
+def fixture_source(ctx):
+    return iucn_modlib.loadBatchSource(ctx['batch'])
+
+
+@fixture('sample')
+def fixture_sample(ctx):
+    ids = [int(t) for t in ctx['source']['assessments'].internalTaxonId]
+    rng = random.Random(0)
+    return rng.sample(ids, min(ctx['sample_size'], len(ids)))
+
+
+@fixture('taxa')
+def fixture_taxa(ctx):
+    return [iucn_modlib.TaxonFactoryRedListBatch(t, ctx['source']) for t in ctx['sample']]
+
+
+@fixture('codes')
+def fixture_codes(ctx):
+    return [t.habitatCodes() for t in ctx['taxa']]
+
+
+@fixture('elevations')
+def fixture_elevations(ctx):
+    return [(t.elevation_lower, t.elevation_upper) for t in ctx['taxa'][:50]]
+
+
+@fixture('parameters')
+def fixture_parameters(ctx):
+    return [iucn_modlib.ModelParametersFactory(t, 'kba_breeding', 'jung') for t in ctx['taxa'][:50]]
+
+
+@fixture('dem_index')
+def fixture_dem_index(ctx):
+    index = os.path.join(ctx['workdir'], 'dem_index')
+    if not os.path.exists(os.path.join(index, 'index.json')):
+        import numpy
+        dem = os.path.join(ctx['workdir'], 'dem.npy')
+        numpy.save(dem, synthetic.syntheticDEM((2000, 4000)))
+        iucn_modlib.writeElevationIndex(index, dem, nodata = -32768)
+    return index
+
+
+@fixture('dem')
+def fixture_dem(ctx):
+    # written with its elevation index
+    ctx['dem_index']
+    return os.path.join(ctx['workdir'], 'dem.npy')
+
+
+@fixture('land_cover')
+def fixture_land_cover(ctx):
+    landCover = os.path.join(ctx['workdir'], 'land_cover.npy')
+    if not os.path.exists(landCover):
+        import numpy
+        classes = iucn_modlib.translator.getCrosswalk('jung').targets
+        numpy.save(landCover, synthetic.syntheticLandCover((2000, 4000), classes).astype(numpy.uint16))
+    return landCover
+
+
+def run(scale, sample, repeat, selected, workdir):
+    results = []
+    for name, func in BENCHMARKS:
+        if selected is not None and name not in selected:
+            continue
+        op, n = func(Context(scale, sample, workdir))
+        seconds, peak = measure(op, repeat)
+        # the operation holds the benchmark's fixtures
+        del op
+        gc.collect()
+        results.append({
+            'name': name,
+            'scale': scale,
+            'items': n,
+            'seconds': seconds,
+            'us_per_item': seconds / max(n, 1) * 1e6,
+            'peak_bytes': peak
+            })
+        print(f'{name:40s} {scale:>8d} {n:>8d} {seconds:10.4f}s {results[-1]["us_per_item"]:12.1f}us/item {peak / 2**20:10.1f}MiB', file=sys.stderr)
+    return results
+
+
+def metadata():
+    try:
+        commit = subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+            ).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        'timestamp': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        'iucn_modlib': iucn_modlib.__version__,
+        'commit': commit,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count()
+        }
+
+
+def compare(old, new):
+    """Print the relative change of each benchmark between two result files"""
+    with open(old) as f:
+        old = {(r['name'], r['scale']): r for r in json.load(f)['results']}
+    with open(new) as f:
+        new = {(r['name'], r['scale']): r for r in json.load(f)['results']}
+    for key in sorted(set(old) & set(new)):
+        o, n = old[key], new[key]
+        print(f'{key[0]:40s} {key[1]:>8d} time {n["us_per_item"] / o["us_per_item"] - 1:+7.1%} memory {n["peak_bytes"] / max(o["peak_bytes"], 1) - 1:+7.1%}')
+
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scale', type=int, nargs='+', default=[1000], help='Number of synthetic taxa (e.g. 1000 10000 150000).')
+    parser.add_argument('--sample', type=int, default=1000, help='Taxa used by per-taxon benchmarks.')
+    parser.add_argument('--repeat', type=int, default=3, help='Timing repeats (best is kept).')
+    parser.add_argument('--only', nargs='+', default=None, help='Benchmarks to run.')
+    parser.add_argument('--workdir', default=None, help='Folder for synthetic data (reused between runs).')
+    parser.add_argument('--output', default=None, help='JSON results file. Defaults to stdout.')
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'), default=None, help='Compare two results files.')
+    args = parser.parse_args(argv)
+
+    if args.compare is not None:
+        compare(*args.compare)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        workdir = args.workdir or tmp
+        results = []
+        for scale in args.scale:
+            results.extend(run(scale, args.sample, args.repeat, args.only, workdir))
+    output = json.dumps({'metadata': metadata(), 'results': results}, indent=2)
+    if args.output is None:
+        print(output)
+    else:
+        with open(args.output, 'w') as f:
+            f.write(output)
+
+
+if __name__ == '__main__':
+    main()
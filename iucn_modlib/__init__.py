@@ -15,10 +15,75 @@ THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES WITH RE
 __copyright__ = 'Copyright 2022 Daniele Baisero <daniele.baisero@gmail.com>'
 
 
+import importlib
+
 from .classes.Taxon import Taxon
+from .classes.LazyTaxon import LazyTaxon
 from .classes.HabitatFilters import HabitatFilters
-from .factories.TaxonFactories import TaxonFactoryRedListAPI, TaxonFactoryRedListAPIJsons, TaxonFactoryRedListBatch
+from .classes.RedListAPIJsonBundle import RedListAPIJsonBundle, writeRedListAPIJsonBundle
+from .classes.ModelParameters import ModelParameters
+from .classes.ParameterCache import ParameterCache
+from .classes.ParameterGroups import ParameterGroups, groupParameters
+from .classes.TaxonCache import TaxonCache, setTaxonCache
 from .factories.HabitatFiltersFactories import HabitatFiltersFactory
+from .factories.ModelParametersFactories import ModelParametersFactory, TranslatorFactory
 from .classes.IUCNHabitatCodes import IUCNHabitatCodes_v3_1
 from . import translator
 
+
+# Attributes whose modules depend on pandas, numpy or requests are loaded on
+# first access, so that `import iucn_modlib` stays cheap for code that only
+# needs habitat codes, filters or translators.
+# name: (module, attribute), with attribute None for modules.
+_lazy = {
+    'TaxonFactoryRedListAPI':           ('.factories.TaxonFactories', 'TaxonFactoryRedListAPI'),
+    'TaxonFactoryRedListAPIJsons':      ('.factories.TaxonFactories', 'TaxonFactoryRedListAPIJsons'),
+    'TaxonFactoryRedListAPIJsonBundle': ('.factories.TaxonFactories', 'TaxonFactoryRedListAPIJsonBundle'),
+    'TaxonFactoryRedListBatch':         ('.factories.TaxonFactories', 'TaxonFactoryRedListBatch'),
+    'TaxonFactoryKBADB':                ('.factories.TaxonFactories', 'TaxonFactoryKBADB'),
+    'TaxonFactorySQLite':               ('.factories.TaxonFactories', 'TaxonFactorySQLite'),
+    'LazyTaxonFactory':                 ('.factories.LazyTaxonFactories', 'LazyTaxonFactory'),
+    'lazyTaxa':                         ('.factories.LazyTaxonFactories', 'lazyTaxa'),
+    'loadBatchSource':                  ('.factories.TaxonFactories', 'loadBatchSource'),
+    'BatchDiff':                        ('.batch.Fingerprints', 'BatchDiff'),
+    'batchFingerprints':                ('.batch.Fingerprints', 'batchFingerprints'),
+    'diffBatchSources':                 ('.batch.Fingerprints', 'diffBatchSources'),
+    'resolveNames':                     ('.batch.NameIndex', 'resolveNames'),
+    'BatchQuery':                       ('.batch.Query', 'BatchQuery'),
+    'writeBatchSQLite':                 ('.batch.SQLiteMirror', 'writeBatchSQLite'),
+    'openBatchSQLite':                  ('.batch.SQLiteMirror', 'openBatchSQLite'),
+    'HabitatMatrix':                    ('.classes.HabitatMatrix', 'HabitatMatrix'),
+    'HabitatMatrixFactory':             ('.factories.HabitatMatrixFactories', 'HabitatMatrixFactory'),
+    'FilterTableFactory':               ('.factories.FilterTableFactories', 'FilterTableFactory'),
+    'TaxonResolver':                    ('.resolver', 'TaxonResolver'),
+    'ElevationIndex':                   ('.raster.ElevationIndex', 'ElevationIndex'),
+    'writeElevationIndex':              ('.raster.ElevationIndex', 'writeElevationIndex'),
+    'redlist_api':                      ('.redlist_api', None),
+    'batch':                            ('.batch', None),
+    'raster':                           ('.raster', None),
+    'pipeline':                         ('.pipeline', None),
+    'resolver':                         ('.resolver', None),
+    }
+
+
+def __getattr__(name):
+    if name not in _lazy:
+        raise AttributeError(f"module '{__name__}' has no attribute '{name}'")
+    module, attribute = _lazy[name]
+    value = importlib.import_module(module, __name__)
+    if attribute is not None:
+        value = getattr(value, attribute)
+    globals()[name] = value
+    return value
+
+
+__all__ = [
+    'Taxon', 'LazyTaxon', 'HabitatFilters', 'RedListAPIJsonBundle', 'writeRedListAPIJsonBundle',
+    'ModelParameters', 'ParameterCache', 'ParameterGroups', 'groupParameters', 'TaxonCache', 'setTaxonCache', 'HabitatFiltersFactory', 'ModelParametersFactory', 'TranslatorFactory',
+    'IUCNHabitatCodes_v3_1', 'translator'
+    ] + list(_lazy.keys())
+
+
+def __dir__():
+    return sorted(list(globals().keys()) + list(_lazy.keys()))
+
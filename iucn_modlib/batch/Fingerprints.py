@@ -0,0 +1,163 @@
+#!/usr/bin/python3
+
+from dataclasses import dataclass, field
+from typing import List
+import hashlib
+import os
+import pandas
+import numpy
+
+
+# Batch source tables and their taxon id columns, as returned by loadBatchSource
+TABLES = (
+    ('assessments', 'internalTaxonId'),
+    ('taxonomy', 'internalTaxonId'),
+    ('habitats', 'taxonid'),
+    ('all_other_fields', 'internalTaxonId'),
+    ('common_names', 'internalTaxonId')
+    )
+
+
+@dataclass
+class BatchDiff:
+    """A dataclass to store the differences between two batch releases.
+
+    added: list: Taxon IDs only in the new release.
+    removed: list: Taxon IDs only in the old release.
+    changed: list: Taxon IDs in both releases, with different fingerprints.
+    unchanged: int: The number of taxa with identical fingerprints.
+    """
+    added: List = field(default_factory=lambda: [])
+    removed: List = field(default_factory=lambda: [])
+    changed: List = field(default_factory=lambda: [])
+    unchanged: int = 0
+
+    def toProcess(self):
+        """Return the taxon IDs that need to be (re)processed: added and changed
+        """
+        return sorted(self.added + self.changed)
+
+
+def _canonical(df):
+    """Internal: a table as strings, with columns in a fixed order
+
+    Numeric columns are cast to float first, so that values do not depend
+    on whether pandas inferred an integer or a float column (e.g. because of
+    missing values elsewhere in the table).
+    """
+    df = df[sorted(df.columns)]
+    return pandas.DataFrame({
+        c: (df[c].astype('float64') if pandas.api.types.is_numeric_dtype(df[c]) and not pandas.api.types.is_bool_dtype(df[c]) else df[c]).astype(str)
+        for c in df.columns
+        })
+
+
+def batchFingerprints(source):
+    """Compute a per-taxon content fingerprint of a batch source
+
+    The fingerprint of a taxon is a hash over all of its rows in the five
+    batch tables, independent of row order. It changes when any value in
+    any of those rows changes, or when rows are added or removed.
+
+        Args:
+            source (dict): A batch source, as returned by loadBatchSource.
+
+        Returns:
+            pandas.Series: Hex fingerprints (str), indexed by taxon ID.
+    """
+    if 'fingerprints' in source:
+        return source['fingerprints']
+    ids = []
+    hashes = []
+    for tableNumber, (table, idColumn) in enumerate(TABLES):
+        df = source[table]
+        rowHashes = pandas.util.hash_pandas_object(
+            _canonical(df), index=False, categorize=False
+            ).to_numpy(dtype=numpy.uint64)
+        ids.append(df[idColumn].to_numpy(dtype=numpy.int64))
+        hashes.append(numpy.column_stack([
+            numpy.full(len(df), tableNumber, dtype=numpy.uint64), rowHashes
+            ]))
+    ids = numpy.concatenate(ids)
+    hashes = numpy.concatenate(hashes)
+
+    # sort rows by taxon, table and row hash, so that row order is irrelevant
+    order = numpy.lexsort((hashes[:, 1], hashes[:, 0], ids))
+    ids = ids[order]
+    hashes = numpy.ascontiguousarray(hashes[order])
+    taxa, starts = numpy.unique(ids, return_index=True)
+    ends = numpy.append(starts[1:], len(ids))
+    fingerprints = [
+        hashlib.blake2b(hashes[s:e].tobytes(), digest_size=16).hexdigest()
+        for s, e in zip(starts, ends)
+        ]
+    return pandas.Series(fingerprints, index=pandas.Index(taxa, name='taxonid'), name='fingerprint')
+
+
+def writeFingerprintManifest(fingerprints, path):
+    """Write fingerprints to a CSV manifest (taxonid, fingerprint)
+    """
+    fingerprints.to_frame().to_csv(path)
+
+
+def readFingerprintManifest(path):
+    """Read fingerprints from a CSV manifest (taxonid, fingerprint)
+    """
+    return pandas.read_csv(path, index_col='taxonid', dtype={'fingerprint': str})['fingerprint']
+
+
+def diffBatchFingerprints(old, new):
+    """Compare two sets of fingerprints
+
+        Args:
+            old (pandas.Series): Fingerprints of the old release.
+            new (pandas.Series): Fingerprints of the new release.
+
+        Returns:
+            BatchDiff: The added, removed and changed taxa.
+    """
+    joined = old.rename('old').to_frame().join(new.rename('new'), how='outer')
+    added = joined.index[joined.old.isna()]
+    removed = joined.index[joined.new.isna()]
+    both = joined.loc[joined.old.notna() & joined.new.notna()]
+    changed = both.index[both.old != both.new]
+    return BatchDiff(
+        added     = sorted(int(t) for t in added),
+        removed   = sorted(int(t) for t in removed),
+        changed   = sorted(int(t) for t in changed),
+        unchanged = int((both.old == both.new).sum())
+        )
+
+
+def _fingerprints(source):
+    """Internal: fingerprints of a batch folder, batch source or manifest file
+    """
+    if isinstance(source, pandas.Series):
+        return source
+    if isinstance(source, dict):
+        return batchFingerprints(source)
+    if os.path.isfile(source):
+        return readFingerprintManifest(source)
+    from ..factories.TaxonFactories import loadBatchSource
+    return batchFingerprints(loadBatchSource(source))
+
+
+def diffBatchSources(old, new):
+    """Compare two batch releases
+
+        Args:
+            old: The old release. A batch folder, a batch source (dict), a
+                fingerprint manifest file or fingerprints (pandas.Series).
+            new: The new release, as for old.
+
+        Returns:
+            BatchDiff: The added, removed and changed taxa.
+
+        Examples:
+            diffBatchSources('redlist_2022_2/', 'redlist_2023_1/')
+            diffBatchSources('redlist_2022_2_fingerprints.csv', 'redlist_2023_1/')
+    """
+    return diffBatchFingerprints(_fingerprints(old), _fingerprints(new))
+
+
+# HIC SVNT DRACONES
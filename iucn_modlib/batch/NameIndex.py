@@ -0,0 +1,83 @@
+#!/usr/bin/python3
+
+import pandas
+
+from .SourceIndex import sourceIndex
+
+
+def _normalise(names):
+    """Internal: vectorised normalisation of a Series of names"""
+    return names.astype(str).str.lower().str.split().str[:2].str.join(' ')
+
+
+def normaliseName(name):
+    """Normalise a scientific name for lookups
+
+    Lower-cases the name, collapses whitespace and strips infraspecific
+    ranks and names, keeping the binomial.
+
+    Examples:
+        normaliseName('  Panthera   leo ')          -> 'panthera leo'
+        normaliseName('Panthera leo ssp. persica')  -> 'panthera leo'
+    """
+    return ' '.join(str(name).lower().split()[:2])
+
+
+def batchNameIndex(source, normalise = False):
+    """Return a scientific name -> taxon ID index of a batch source
+
+    The index is built once per batch source, and stored in it (see
+    sourceIndex: it is rebuilt if the assessments table is replaced).
+
+        Args:
+            source (dict): A batch source, as returned by loadBatchSource.
+            normalise (bool): Key the index on normalised names
+                (see normaliseName). When several taxa share a normalised
+                name, species take precedence over infraspecific taxa.
+
+        Returns:
+            dict: Names (str) to taxon IDs (int).
+    """
+    def build():
+        assessments = source['assessments']
+        names = assessments.scientificName.astype(str)
+        index = pandas.DataFrame({
+            'name': _normalise(names) if normalise else names,
+            'words': names.str.split().str.len(),
+            'taxonid': assessments.internalTaxonId
+            })
+        index = index.sort_values('words', kind='stable').drop_duplicates('name')
+        return dict(zip(index.name.tolist(), index.taxonid.tolist()))
+    return sourceIndex(source, 'name_index_normalised' if normalise else 'name_index', ['assessments'], build)
+
+
+def resolveNames(names, source, normalise = True):
+    """Resolve a list of scientific names to taxon IDs in one join
+
+        Args:
+            names (list): Scientific names.
+            source (dict): A batch source, as returned by loadBatchSource.
+            normalise (bool): Match names not found verbatim on normalised
+                names (see normaliseName). Names found verbatim, e.g.
+                infraspecific taxa, keep their own taxon ID.
+
+        Returns:
+            tuple: (resolved, unresolved), where resolved is a dict of the
+                given names to taxon IDs (int), and unresolved a list of the
+                names that were not found.
+
+        Example:
+            resolved, unresolved = resolveNames(['Ursus maritimus', 'Equus unicornis'], source)
+    """
+    names = pandas.Series(list(names), dtype=object)
+    taxonids = names.astype(str).map(pandas.Series(batchNameIndex(source), dtype='Int64'))
+    if normalise:
+        missing = taxonids.isna()
+        taxonids[missing] = _normalise(names[missing]).map(pandas.Series(batchNameIndex(source, True), dtype='Int64'))
+    found = taxonids.notna()
+    resolved = dict(zip(names[found].tolist(), taxonids[found].astype(int).tolist()))
+    unresolved = names[~found].tolist()
+    return resolved, unresolved
+
+
+# HIC SVNT DRACONES
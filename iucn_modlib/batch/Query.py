@@ -0,0 +1,287 @@
+#!/usr/bin/python3
+
+import numpy
+import pandas
+
+from .SourceIndex import sourceIndex
+
+
+RANKS = ('kingdom', 'phylum', 'class', 'order', 'family', 'genus')
+
+# Red List category abbreviations
+CATEGORIES = {
+    'EX': 'Extinct',
+    'EW': 'Extinct in the Wild',
+    'CR': 'Critically Endangered',
+    'EN': 'Endangered',
+    'VU': 'Vulnerable',
+    'NT': 'Near Threatened',
+    'LC': 'Least Concern',
+    'DD': 'Data Deficient'
+    }
+
+THREATENED = ('Critically Endangered', 'Endangered', 'Vulnerable')
+
+SYSTEMS = ('Terrestrial', 'Freshwater', 'Marine')
+
+# Range predicates: argument name: all_other_fields column
+LIMITS = {
+    'elevationLower': 'ElevationLower.limit',
+    'elevationUpper': 'ElevationUpper.limit',
+    'depthLower':     'DepthLower.limit',
+    'depthUpper':     'DepthUpper.limit'
+    }
+
+
+class _InvertedIndex:
+    """Internal: label -> sorted row positions
+
+    labels holds one label per entry, and rows the row position of each
+    entry (default: entries are rows).
+    """
+
+    def __init__(self, labels, rows = None):
+        codes, uniques = pandas.factorize(pandas.Series(labels, dtype=object))
+        rows = numpy.arange(len(codes)) if rows is None else numpy.asarray(rows)
+        keep = codes >= 0
+        codes, rows = codes[keep], rows[keep]
+        order = numpy.lexsort((rows, codes))
+        codes, rows = codes[order], rows[order]
+        # distinct (label, row) entries
+        distinct = numpy.r_[True, (codes[1:] != codes[:-1]) | (rows[1:] != rows[:-1])] if len(codes) > 0 else numpy.zeros(0, dtype=bool)
+        codes, rows = codes[distinct], rows[distinct]
+        self.rows = rows
+        self.bounds = numpy.searchsorted(codes, numpy.arange(len(uniques) + 1))
+        self.labels = {label: i for i, label in enumerate(uniques.tolist())}
+
+    def lookup(self, labels):
+        """Return the sorted, distinct row positions of labels"""
+        parts = [
+            self.rows[self.bounds[self.labels[l]]:self.bounds[self.labels[l] + 1]]
+            for l in labels if l in self.labels
+            ]
+        if len(parts) == 0:
+            return numpy.zeros(0, dtype=numpy.int64)
+        return parts[0] if len(parts) == 1 else numpy.unique(numpy.concatenate(parts))
+
+
+def _aligned(table, taxonids):
+    """Internal: positions of taxonids in a table's internalTaxonId column (-1 if missing)"""
+    return pandas.Index(table.internalTaxonId.to_numpy()).get_indexer(taxonids)
+
+
+def _column(table, positions, column, dtype):
+    """Internal: a table column aligned to rows by positions, NaN where missing"""
+    values = pandas.to_numeric(table[column], errors='coerce').to_numpy(dtype=dtype, na_value=numpy.nan)
+    out = numpy.full(len(positions), numpy.nan, dtype=dtype)
+    found = positions >= 0
+    out[found] = values[positions[found]]
+    return out
+
+
+def batchQueryIndex(source):
+    """Return the query index of a batch source
+
+    The index is built once per batch source, and stored in it (see
+    sourceIndex: it is rebuilt if the source's tables are replaced). It
+    holds the taxon IDs (in assessments table order), an inverted index of
+    each taxonomic rank, of the Red List category and of the habitat codes,
+    the systems as boolean columns and the elevation and depth limits as
+    float columns (NaN when missing).
+
+        Args:
+            source (dict): A batch source, as returned by loadBatchSource.
+
+        Returns:
+            dict: The index.
+    """
+    def build():
+        assessments = source['assessments']
+        taxonids = assessments.internalTaxonId.to_numpy(dtype=numpy.int64)
+        index = {'taxonids': taxonids}
+
+        taxonomy = source['taxonomy']
+        positions = _aligned(taxonomy, taxonids)
+        for rank in RANKS:
+            names = taxonomy[f'{rank}Name'].astype(str).str.lower().to_numpy(dtype=object)
+            labels = numpy.where(positions >= 0, names[positions], None)
+            index[rank] = _InvertedIndex(labels)
+
+        index['category'] = _InvertedIndex(assessments.redlistCategory.to_numpy(dtype=object))
+        systems = assessments.systems.fillna('').astype(str)
+        for system in SYSTEMS:
+            index[system.lower()] = systems.str.contains(system, regex=False).to_numpy()
+
+        others = source['all_other_fields']
+        positions = _aligned(others, taxonids)
+        for name, column in LIMITS.items():
+            index[name] = _column(others, positions, column, numpy.float64)
+
+        habitats = source['habitats']
+        rows = pandas.Index(taxonids).get_indexer(habitats.taxonid.to_numpy())
+        keep = (rows >= 0) & habitats.code.notna().to_numpy()
+        index['habitats'] = _InvertedIndex(habitats.code.to_numpy()[keep].astype(str), rows[keep])
+        return index
+    return sourceIndex(source, 'query_index', ['assessments', 'taxonomy', 'all_other_fields', 'habitats'], build)
+
+
+def _labels(values):
+    """Internal: a predicate value as a list"""
+    if isinstance(values, (str, int)):
+        return [values]
+    return list(values)
+
+
+class BatchQuery:
+    """A predicate query engine over a batch source
+
+    Selects taxa by taxonomy, Red List category, systems, elevation and
+    depth limits and habitat codes without constructing Taxon objects.
+    Indexed predicates (ranks, category, habitats, taxon IDs) give candidate
+    rows, smallest first, and the other predicates are evaluated as
+    vectorised column masks on the candidates only. All predicates are
+    combined AND-wise; a predicate given several values matches any of them.
+
+    Elevation and depth limits are the values of the batch download, before
+    Taxon.fix('elevation'): taxa with a missing limit never match a
+    predicate on it.
+
+    source: A batch source (dict or folder, see loadBatchSource).
+
+    Examples:
+        query = BatchQuery(source)
+        query.taxonids(class_ = 'AVES', category = 'threatened', systems = 'terrestrial', elevationUpper = (None, 500))
+        query.taxonids(habitats = '1.6')
+        for taxon in query.taxa(family = ('FELIDAE', 'CANIDAE')):
+            ...
+    """
+
+    def __init__(self, source):
+        if not isinstance(source, dict):
+            from ..factories.TaxonFactories import loadBatchSource
+            source = loadBatchSource(source)
+        self.source = source
+        self.index = batchQueryIndex(source)
+
+    def __len__(self):
+        return len(self.index['taxonids'])
+
+    def _categories(self, values):
+        categories = []
+        for v in _labels(values):
+            if str(v).lower() == 'threatened':
+                categories += THREATENED
+            else:
+                categories.append(CATEGORIES.get(str(v).upper(), v))
+        return categories
+
+    def _habitatCodes(self, codes):
+        """Internal: the indexed habitat codes equal to, or below, codes"""
+        indexed = self.index['habitats'].labels
+        matched = []
+        for c in _labels(codes):
+            c = str(c)
+            matched += [k for k in indexed if k == c or k.startswith(c + '.')]
+        return matched
+
+    def rows(
+            self, *, kingdom = None, phylum = None, class_ = None, order = None, family = None, genus = None,
+            category = None, systems = None, elevationLower = None, elevationUpper = None,
+            depthLower = None, depthUpper = None, habitats = None, taxonids = None
+            ):
+        """Return the row positions (in assessments table order) of the matching taxa
+
+            Args:
+                kingdom, phylum, class_, order, family, genus: A name or a
+                    list of names (case-insensitive).
+                category: A Red List category, its abbreviation (e.g. 'EN')
+                    or 'threatened' (CR, EN, VU), or a list of them.
+                systems: 'Terrestrial', 'Freshwater' or 'Marine'
+                    (case-insensitive), or a list of systems that must all
+                    be present.
+                elevationLower, elevationUpper, depthLower, depthUpper: A
+                    (min, max) tuple of inclusive bounds, None for no bound.
+                habitats: An IUCN habitat code, or a list of codes. Taxa
+                    using a code or any code below it (e.g. '1' matches
+                    '1.6') match.
+                taxonids: A list of taxon IDs.
+
+            Returns:
+                numpy array: Sorted row positions.
+        """
+        candidates = []
+        for rank, value in zip(RANKS, (kingdom, phylum, class_, order, family, genus)):
+            if value is not None:
+                candidates.append(self.index[rank].lookup([str(v).lower() for v in _labels(value)]))
+        if category is not None:
+            candidates.append(self.index['category'].lookup(self._categories(category)))
+        if habitats is not None:
+            candidates.append(self.index['habitats'].lookup(self._habitatCodes(habitats)))
+        if taxonids is not None:
+            positions = pandas.Index(self.index['taxonids']).get_indexer(numpy.asarray(_labels(taxonids), dtype=numpy.int64))
+            candidates.append(numpy.unique(positions[positions >= 0]))
+
+        # intersect the indexed candidates, smallest first
+        candidates.sort(key=len)
+        rows = candidates[0] if len(candidates) > 0 else numpy.arange(len(self))
+        for c in candidates[1:]:
+            rows = numpy.intersect1d(rows, c, assume_unique=True)
+
+        # column predicates, on the candidates only
+        if systems is not None:
+            for system in _labels(systems):
+                if str(system).capitalize() not in SYSTEMS:
+                    raise ValueError(f"""Supported systems are: '{"', '".join(SYSTEMS)}'""")
+                rows = rows[self.index[str(system).lower()][rows]]
+        for name, bounds in zip(LIMITS, (elevationLower, elevationUpper, depthLower, depthUpper)):
+            if bounds is None:
+                continue
+            if not isinstance(bounds, tuple) or len(bounds) != 2:
+                raise ValueError('Range predicates must be (min, max) tuples.')
+            values = self.index[name][rows]
+            mask = ~numpy.isnan(values)
+            if bounds[0] is not None:
+                mask &= values >= bounds[0]
+            if bounds[1] is not None:
+                mask &= values <= bounds[1]
+            rows = rows[mask]
+        return rows
+
+    def mask(self, **predicates):
+        """Return a boolean mask of the matching taxa (assessments table order)
+
+        Masks can be combined with &, | and ~, and passed to taxonids(mask).
+        See rows for the predicates.
+        """
+        mask = numpy.zeros(len(self), dtype=bool)
+        mask[self.rows(**predicates)] = True
+        return mask
+
+    def taxonids(self, mask = None, **predicates):
+        """Return the taxon IDs of the matching taxa (assessments table order)
+
+            Args:
+                mask: An optional boolean mask (see mask), combined AND-wise
+                    with the predicates.
+                predicates: See rows.
+
+            Returns:
+                list(int): Taxon IDs.
+        """
+        rows = self.rows(**predicates)
+        if mask is not None:
+            rows = rows[numpy.asarray(mask, dtype=bool)[rows]]
+        return self.index['taxonids'][rows].tolist()
+
+    def count(self, **predicates):
+        """Return the number of matching taxa"""
+        return len(self.rows(**predicates))
+
+    def taxa(self, fixElevation = True, fixHabitats = True, **predicates):
+        """Yield Taxon objects of the matching taxa only (see TaxonFactoryRedListBatch)"""
+        from ..factories.TaxonFactories import TaxonFactoryRedListBatch
+        for taxonid in self.taxonids(**predicates):
+            yield TaxonFactoryRedListBatch(taxonid, self.source, fixElevation, fixHabitats)
+
+
+# HIC SVNT DRACONES
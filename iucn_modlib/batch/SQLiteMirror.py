@@ -0,0 +1,198 @@
+#!/usr/bin/python3
+
+import os
+import pathlib
+import sqlite3
+
+import numpy
+import pandas
+
+
+# Tables of the mirror, with the table and column names of the KBA database:
+# name: [(column, type)], in the order of the Taxon fields
+SPECIES_COLUMNS = [
+    ('taxonid', 'INTEGER PRIMARY KEY'),
+    ('scientific_name', 'TEXT'),
+    ('kingdom', 'TEXT'),
+    ('phylum', 'TEXT'),
+    ('class', 'TEXT'),
+    ('order', 'TEXT'),
+    ('family', 'TEXT'),
+    ('genus', 'TEXT'),
+    ('main_common_name', 'TEXT'),
+    ('authority', 'TEXT'),
+    ('published_year', 'INTEGER'),
+    ('assessment_date', 'TEXT'),
+    ('category', 'TEXT'),
+    ('criteria', 'TEXT'),
+    ('population_trend', 'TEXT'),
+    ('marine_system', 'BOOLEAN'),
+    ('freshwater_system', 'BOOLEAN'),
+    ('terrestrial_system', 'BOOLEAN'),
+    ('assessor', 'TEXT'),
+    ('reviewer', 'TEXT'),
+    ('aoo_km2', 'REAL'),
+    ('eoo_km2', 'REAL'),
+    ('elevation_upper', 'INTEGER'),
+    ('elevation_lower', 'INTEGER'),
+    ('depth_upper', 'INTEGER'),
+    ('depth_lower', 'INTEGER'),
+    ('errata_flag', 'TEXT'),
+    ('errata_reason', 'TEXT'),
+    ('amended_flag', 'TEXT'),
+    ('amended_reason', 'TEXT')
+    ]
+
+HABITATS_COLUMNS = [
+    ('assid', 'INTEGER'),
+    ('taxonid', 'INTEGER NOT NULL'),
+    ('scientific_name', 'TEXT'),
+    ('code', 'TEXT'),
+    ('habitat', 'TEXT'),
+    ('majorimportance', 'TEXT'),
+    ('season', 'TEXT'),
+    ('suitability', 'TEXT')
+    ]
+
+# Fields not available in batch downloads (as in TaxonFactoryRedListBatch)
+_NOT_IN_BATCH = 'AOH modeller: not available in batch'
+
+# Elevation and depth columns: all_other_fields column
+_LIMITS = {
+    'elevation_upper': 'ElevationUpper.limit',
+    'elevation_lower': 'ElevationLower.limit',
+    'depth_upper':     'DepthUpper.limit',
+    'depth_lower':     'DepthLower.limit'
+    }
+
+
+def _first(table, columns):
+    """Internal: the first row of each taxon of a batch table, indexed by taxon ID"""
+    return table.drop_duplicates('internalTaxonId').set_index('internalTaxonId')[columns]
+
+
+def _speciesFrame(source):
+    """Internal: the iucn_species rows of a batch source
+
+    Values are those of TaxonFactoryRedListBatch (before fixes): the first
+    row of each taxon in each table, '' for taxonomy and common names
+    missing from their tables.
+    """
+    assessments = source['assessments'].drop_duplicates('internalTaxonId')
+    taxonids = assessments.internalTaxonId
+    taxonomy = _first(source['taxonomy'], ['kingdomName', 'phylumName', 'className', 'orderName', 'familyName', 'genusName', 'authority'])
+    taxonomy = taxonomy.astype(object).reindex(taxonids.to_numpy(), fill_value='')
+    commonNames = source['common_names']
+    commonNames = _first(commonNames.loc[commonNames.main == True], ['name']).astype(object).reindex(taxonids.to_numpy(), fill_value='')
+    others = _first(source['all_other_fields'], ['AOO.range', 'EOO.range'] + list(_LIMITS.values())).reindex(taxonids.to_numpy())
+    systems = assessments.systems.fillna('').astype(str)
+
+    species = pandas.DataFrame({
+        'taxonid':            taxonids.to_numpy(),
+        'scientific_name':    assessments.scientificName.to_numpy(dtype=object),
+        'kingdom':            taxonomy.kingdomName.to_numpy(),
+        'phylum':             taxonomy.phylumName.to_numpy(),
+        'class':              taxonomy.className.to_numpy(),
+        'order':              taxonomy.orderName.to_numpy(),
+        'family':             taxonomy.familyName.to_numpy(),
+        'genus':              taxonomy.genusName.to_numpy(),
+        'main_common_name':   commonNames.name.to_numpy(),
+        'authority':          taxonomy.authority.to_numpy(),
+        'published_year':     assessments.yearPublished.to_numpy(dtype=object),
+        'assessment_date':    assessments.assessmentDate.to_numpy(dtype=object),
+        'category':           assessments.redlistCategory.to_numpy(dtype=object),
+        'criteria':           assessments.redlistCriteria.to_numpy(dtype=object),
+        'population_trend':   assessments.populationTrend.to_numpy(dtype=object),
+        'marine_system':      systems.str.contains('Marine', regex=False).to_numpy(),
+        'freshwater_system':  systems.str.contains('Freshwater', regex=False).to_numpy(),
+        'terrestrial_system': systems.str.contains('Terrestrial', regex=False).to_numpy(),
+        'assessor':           _NOT_IN_BATCH,
+        'reviewer':           _NOT_IN_BATCH,
+        'aoo_km2':            others['AOO.range'].to_numpy(dtype=object),
+        'eoo_km2':            others['EOO.range'].to_numpy(dtype=object)
+        })
+    for name, column in _LIMITS.items():
+        # truncated to integers, as int() in TaxonFactoryRedListBatch
+        species[name] = numpy.trunc(pandas.to_numeric(others[column], errors='coerce').to_numpy(dtype=numpy.float64))
+        species[name] = species[name].astype('Int64')
+    for name in ('errata_flag', 'errata_reason', 'amended_flag', 'amended_reason'):
+        species[name] = _NOT_IN_BATCH
+    return species[[c for c, _ in SPECIES_COLUMNS]]
+
+
+def _quote(column):
+    return f'"{column}"'
+
+
+def _rows(frame):
+    """Internal: the rows of a frame as tuples of Python values (None for missing values)"""
+    frame = frame.astype(object)
+    return frame.where(frame.notna(), None).itertuples(index=False, name=None)
+
+
+def writeBatchSQLite(source, path):
+    """Write an indexed SQLite mirror of a batch source
+
+    The mirror has two tables, with the table and column names of the KBA
+    database: iucn_species (one row per taxon, keyed on taxonid and indexed
+    on scientific_name) and iucn_habitats (indexed on taxonid). Values are
+    those TaxonFactoryRedListBatch reads, before fixes, so that
+    TaxonFactorySQLite builds the same Taxon objects with two indexed
+    queries, without loading the batch download.
+
+    The file is written under a temporary name and then moved to path, so
+    readers never see a partial mirror.
+
+        Args:
+            source: A batch source (dict, folder or zip archive, see
+                loadBatchSource).
+            path (str): The SQLite file. An existing file is replaced.
+
+        Returns:
+            int: The number of taxa written.
+
+        Examples:
+            writeBatchSQLite('redlist_2023_1/', 'redlist_2023_1.sqlite')
+            con = openBatchSQLite('redlist_2023_1.sqlite')
+            TaxonFactorySQLite(2345, con)
+    """
+    if not isinstance(source, dict):
+        from ..factories.TaxonFactories import loadBatchSource
+        source = loadBatchSource(source)
+    species = _speciesFrame(source)
+    habitats = source['habitats'][[c for c, _ in HABITATS_COLUMNS]]
+
+    temporary = f'{path}.{os.getpid()}.tmp'
+    if os.path.exists(temporary):
+        os.remove(temporary)
+    con = sqlite3.connect(temporary)
+    try:
+        con.execute('PRAGMA journal_mode=OFF')
+        con.execute('PRAGMA synchronous=OFF')
+        with con:
+            for table, columns, frame in (('iucn_species', SPECIES_COLUMNS, species), ('iucn_habitats', HABITATS_COLUMNS, habitats)):
+                # "class" and "order" are SQL keywords: columns are quoted
+                con.execute(f'CREATE TABLE {table} ({", ".join(_quote(c) + " " + t for c, t in columns)})')
+                con.executemany(f'INSERT INTO {table} VALUES ({", ".join("?" * len(columns))})', _rows(frame))
+            # indexes are built after the inserts, in one pass
+            con.execute('CREATE INDEX iucn_species_scientific_name ON iucn_species (scientific_name)')
+            con.execute('CREATE INDEX iucn_habitats_taxonid ON iucn_habitats (taxonid)')
+        con.execute('ANALYZE')
+    finally:
+        con.close()
+    os.replace(temporary, path)
+    return len(species)
+
+
+def openBatchSQLite(path):
+    """Open a SQLite mirror (see writeBatchSQLite) read-only
+
+    The connection can be shared by threads.
+    """
+    if not os.path.exists(path):
+        raise FileNotFoundError(f'{path} does not exist.')
+    uri = pathlib.Path(path).absolute().as_uri() + '?mode=ro'
+    return sqlite3.connect(uri, uri=True, check_same_thread=False)
+
+
+# HIC SVNT DRACONES
@@ -0,0 +1,167 @@
+#!/usr/bin/python3
+
+import datetime
+import json
+import os
+import pandas
+import numpy
+
+
+# Batch download tables
+BATCH_FILES = (
+    'assessments.csv',
+    'taxonomy.csv',
+    'habitats.csv',
+    'all_other_fields.csv',
+    'common_names.csv'
+    )
+
+RANKS = ('kingdom', 'phylum', 'class', 'order', 'family', 'genus')
+
+
+def _readRaw(path, filename):
+    """Internal: read a batch table as text, so that it is written back unchanged"""
+    return pandas.read_csv(os.path.join(path, filename), dtype=str, keep_default_na=False)
+
+
+def _assignByHash(taxonids, shards):
+    return pandas.Series(
+        pandas.util.hash_array(taxonids.to_numpy(dtype=numpy.int64)) % numpy.uint64(shards),
+        index=taxonids.to_numpy(dtype=numpy.int64)
+        ).astype(int)
+
+
+def _assignByRank(taxonomy, rank, shards):
+    """Internal: assign whole taxonomic groups to shards, balancing taxa counts
+
+    Groups are assigned largest first to the least loaded shard, so the
+    assignment is deterministic for a given batch.
+    """
+    groups = taxonomy[f'{rank}Name']
+    sizes = groups.value_counts()
+    sizes = sorted(sizes.items(), key=lambda x: (-x[1], x[0]))
+    loads = [0] * shards
+    groupShard = {}
+    for group, size in sizes:
+        shard = loads.index(min(loads))
+        groupShard[group] = shard
+        loads[shard] += size
+    return pandas.Series(
+        groups.map(groupShard).to_numpy(), index=taxonomy.internalTaxonId.to_numpy(dtype=numpy.int64)
+        ), groupShard
+
+
+def shardBatchSource(path, outPath, shards, by = 'hash'):
+    """Split a batch download folder into self-contained shard folders
+
+    Each shard folder holds the five batch tables restricted to its taxa, and
+    can be loaded with loadBatchSource or TaxonFactoryRedListBatch as is.
+    A manifest (manifest.json) describing the shards is written to outPath.
+
+        Args:
+            path (str): The batch download folder.
+            outPath (str): The output folder, created if needed.
+            shards (int): The number of shards.
+            by (str): 'hash' to assign taxa by a hash of internalTaxonId, or a
+                taxonomic rank ('kingdom', 'phylum', 'class', 'order',
+                'family', 'genus') to keep whole groups in one shard.
+
+        Returns:
+            dict: The manifest.
+
+        Example:
+            shardBatchSource('redlist_2023_1/', 'redlist_2023_1_shards/', 8, by = 'order')
+    """
+    if by != 'hash' and by not in RANKS:
+        raise ValueError(f"""Supported partitions are: 'hash', '{"', '".join(RANKS)}'""")
+    if shards < 1:
+        raise ValueError('shards must be a positive integer.')
+
+    tables = {f: _readRaw(path, f) for f in BATCH_FILES}
+    groups = None
+    if by == 'hash':
+        taxonids = pandas.concat([t.internalTaxonId for t in tables.values()]).astype(numpy.int64).drop_duplicates()
+        assignment = _assignByHash(taxonids, shards)
+    else:
+        assignment, groups = _assignByRank(tables['taxonomy.csv'], by, shards)
+        # taxa without taxonomy go to the first shard
+        missing = pandas.concat([t.internalTaxonId for t in tables.values()]).astype(numpy.int64).drop_duplicates()
+        missing = missing[~missing.isin(assignment.index)]
+        assignment = pandas.concat([assignment, pandas.Series(0, index=missing.to_numpy())])
+
+    os.makedirs(outPath, exist_ok=True)
+    folders = [f'shard_{i:03d}' for i in range(shards)]
+    taxa = [0] * shards
+    for filename, table in tables.items():
+        tableShards = assignment.reindex(table.internalTaxonId.astype(numpy.int64)).to_numpy()
+        for i, folder in enumerate(folders):
+            os.makedirs(os.path.join(outPath, folder), exist_ok=True)
+            part = table.loc[tableShards == i]
+            part.to_csv(os.path.join(outPath, folder, filename), index=False)
+            if filename == 'assessments.csv':
+                taxa[i] = len(part)
+
+    manifest = {
+        'source': os.path.abspath(path),
+        'created': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        'by': by,
+        'shards': [
+            {'folder': folder, 'taxa': n}
+            for folder, n in zip(folders, taxa)
+            ]
+        }
+    if groups is not None:
+        manifest['groups'] = {str(g): folders[s] for g, s in sorted(groups.items(), key=lambda x: str(x[0]))}
+    with open(os.path.join(outPath, 'manifest.json'), 'w') as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def readShardManifest(path):
+    """Return the shard folders (full paths) listed in a shards folder's manifest
+    """
+    with open(os.path.join(path, 'manifest.json')) as f:
+        manifest = json.load(f)
+    return [os.path.join(path, s['folder']) for s in manifest['shards']]
+
+
+def _readTable(path):
+    if path.endswith('.parquet'):
+        return pandas.read_parquet(path)
+    return pandas.read_csv(path, dtype=str, keep_default_na=False)
+
+
+def mergeShardOutputs(paths, output, sortBy = ('taxonid',)):
+    """Recombine per-shard output tables in a deterministic order
+
+    Rows are sorted by the sortBy columns (stable, so rows with equal keys
+    keep their per-shard order, with shards in the order given).
+
+        Args:
+            paths (list): Per-shard output tables (.csv or .parquet).
+            output (str): The merged table (.csv or .parquet).
+            sortBy (tuple): Columns to sort on. Numeric values are sorted
+                numerically, before any non-numeric values (sorted as text).
+
+        Returns:
+            int: The number of rows written.
+    """
+    merged = pandas.concat([_readTable(p) for p in paths], ignore_index=True)
+    keys = []
+    for column in sortBy:
+        # numeric values first, in numeric order, then the others as text
+        numbers = pandas.to_numeric(merged[column], errors='coerce')
+        numeric = numbers.notna()
+        keys.append(~numeric)
+        keys.append(numbers.fillna(0))
+        keys.append(merged[column].astype(str).where(~numeric, ''))
+    order = numpy.lexsort([k.to_numpy() for k in reversed(keys)]) if len(keys) > 0 else numpy.arange(len(merged))
+    merged = merged.iloc[order]
+    if output.endswith('.parquet'):
+        merged.to_parquet(output, index=False)
+    else:
+        merged.to_csv(output, index=False)
+    return len(merged)
+
+
+# HIC SVNT DRACONES
@@ -0,0 +1,31 @@
+#!/usr/bin/python3
+
+
+def sourceIndex(source, key, tables, build):
+    """Return an index derived from tables of a batch source, built once
+
+    The index is stored in the source under key, with the table objects it
+    was built from, and is rebuilt when any of them is no longer in the
+    source: replacing a table (source['assessments'] = ...) or copying the
+    source with other tables (dict(source, assessments = ...)) does not
+    serve a stale index. Tables are treated as immutable: changes made to a
+    table in place are not detected.
+
+        Args:
+            source (dict): A batch source, as returned by loadBatchSource.
+            key (str): The name the index is stored under.
+            tables (list): The names of the tables the index is built from.
+            build (callable): Builds the index (no arguments).
+
+        Returns:
+            The index.
+    """
+    current = [source[t] for t in tables]
+    stored = source.get(key)
+    if stored is None or any(a is not b for a, b in zip(stored[0], current)):
+        stored = (current, build())
+        source[key] = stored
+    return stored[1]
+
+
+# HIC SVNT DRACONES
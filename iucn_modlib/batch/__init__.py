@@ -0,0 +1,6 @@
+
+from .Fingerprints import BatchDiff, batchFingerprints, diffBatchFingerprints, diffBatchSources, writeFingerprintManifest, readFingerprintManifest
+from .NameIndex import normaliseName, batchNameIndex, resolveNames
+from .Sharding import shardBatchSource, readShardManifest, mergeShardOutputs
+from .Query import BatchQuery, batchQueryIndex
+from .SQLiteMirror import writeBatchSQLite, openBatchSQLite
@@ -0,0 +1,73 @@
+#!/usr/bin/python3
+
+from dataclasses import dataclass, field
+from typing import Any, Dict, List
+
+
+@dataclass
+class HabitatMatrix:
+    """A species x habitat matrix dataclass.
+
+    Built by HabitatMatrixFactory. Rows are taxa, columns are IUCN habitat
+    codes, and a cell is True where the taxon has the habitat (after filters
+    and roll-up).
+
+    matrix: scipy.sparse.csr_matrix: The boolean taxa x codes matrix.
+    taxonids: list: The taxon id of each row.
+    codes: list: The IUCN habitat code (str) of each column.
+    level: int: The level codes were rolled up to, or None.
+    rows: dict: taxonid: row index.
+    columns: dict: code: column index.
+    """
+    matrix: Any
+    taxonids: List
+    codes: List
+    level: int = None
+    rows: Dict = field(init=False, repr=False)
+    columns: Dict = field(init=False, repr=False)
+
+    def __post_init__(self):
+        self.rows = {t: i for i, t in enumerate(self.taxonids)}
+        self.columns = {c: i for i, c in enumerate(self.codes)}
+
+    @property
+    def shape(self):
+        return self.matrix.shape
+
+    def habitatCodes(self, taxonid):
+        """Return the habitat codes of a taxon"""
+        row = self.matrix.getrow(self.rows[taxonid])
+        return [self.codes[i] for i in sorted(row.indices)]
+
+    def taxa(self, code):
+        """Return the taxon ids with a habitat code"""
+        column = self.matrix.getcol(self.columns[str(code)])
+        return [self.taxonids[i] for i in sorted(column.indices)]
+
+    def richness(self):
+        """Return the number of taxa per habitat code, as a dict"""
+        counts = self.matrix.sum(axis=0).A1
+        return dict(zip(self.codes, counts.tolist()))
+
+    def breadth(self):
+        """Return the number of habitat codes per taxon, as a dict"""
+        counts = self.matrix.sum(axis=1).A1
+        return dict(zip(self.taxonids, counts.tolist()))
+
+    def cooccurrence(self):
+        """Return the codes x codes matrix of shared taxa counts (sparse)"""
+        m = self.matrix.astype('int32')
+        return (m.T @ m).tocsr()
+
+    def toFrame(self):
+        """Return the matrix as a long pandas DataFrame (taxonid, code)"""
+        import numpy
+        import pandas
+        coo = self.matrix.tocoo()
+        return pandas.DataFrame({
+            'taxonid': numpy.asarray(self.taxonids)[coo.row],
+            'code': numpy.asarray(self.codes, dtype=object)[coo.col]
+            })
+
+
+# HIC SVNT DRACONES
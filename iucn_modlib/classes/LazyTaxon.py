@@ -0,0 +1,78 @@
+#!/usr/bin/python3
+
+from dataclasses import fields
+from .Taxon import Taxon
+
+
+# Taxon fields by loading group: fields of a group are loaded together, on
+# first access to any of them
+FIELD_GROUPS = {
+    'assessment': (
+        'scientific_name', 'published_year', 'assessment_date', 'category', 'criteria',
+        'population_trend', 'marine_system', 'freshwater_system', 'terrestrial_system'
+        ),
+    'taxonomy': ('kingdom', 'phylum', 'class_', 'order', 'family', 'genus', 'authority'),
+    'common_names': ('main_common_name',),
+    'other_fields': ('aoo_km2', 'eoo_km2', 'elevation_upper', 'elevation_lower', 'depth_upper', 'depth_lower'),
+    'unavailable': ('assessor', 'reviewer', 'errata_flag', 'errata_reason', 'amended_flag', 'amended_reason'),
+    'habitats': ('habitats',)
+    }
+
+_GROUP_OF = {name: group for group, names in FIELD_GROUPS.items() for name in names}
+
+
+class LazyTaxon(Taxon):
+    """A Taxon whose fields are loaded from an indexed source on first access
+
+    Only taxonid is set on creation. The other fields are loaded by group
+    (see FIELD_GROUPS) the first time one of them is read, and fixes are
+    applied at that point: the elevation fix when the elevations are
+    loaded, the habitats fix when the habitats are. Fields set before they
+    are loaded are kept. LazyTaxon objects are Taxon objects, and can be
+    used wherever a Taxon is; materialise() returns a plain Taxon.
+
+    taxonid: int: The taxon ID.
+    loader: object: The source, with a load(taxonid, group) method returning
+        a dict of field values (at least those of group).
+    fixElevation, fixHabitats: bool: Apply the fixes on load.
+
+    Examples:
+        taxon = LazyTaxonFactory(2345, source)
+        taxon.elevation_lower              # loads the other fields only
+        taxon.habitatCodes(filters)        # loads the habitats only
+    """
+
+    def __init__(self, taxonid, loader, fixElevation = True, fixHabitats = True):
+        # Taxon.__init__ is not called: fields are loaded by __getattr__
+        self.taxonid = taxonid
+        self._loader = loader
+        self._fixElevation = fixElevation
+        self._fixHabitats = fixHabitats
+
+    def __getattr__(self, name):
+        # only called for attributes that are not set yet
+        group = _GROUP_OF.get(name) if not name.startswith('_') else None
+        if group is None:
+            raise AttributeError(f"'{type(self).__name__}' object has no attribute '{name}'")
+        values = self._loader.load(self.taxonid, group)
+        for k, v in values.items():
+            self.__dict__.setdefault(k, v)
+        if self._fixElevation and 'elevation_lower' in values:
+            self.fix(fixType = 'elevation')
+        if self._fixHabitats and 'habitats' in values:
+            self.fix(fixType = 'habitats')
+        return self.__dict__[name]
+
+    def __repr__(self):
+        return f'{type(self).__name__}(taxonid={self.taxonid!r}, loaded={sorted(self.loaded())!r})'
+
+    def loaded(self):
+        """Return the names of the fields loaded (or set) so far"""
+        return {f.name for f in fields(Taxon) if f.name in self.__dict__}
+
+    def materialise(self):
+        """Load all fields and return them as a plain Taxon"""
+        return Taxon(**{f.name: getattr(self, f.name) for f in fields(Taxon)})
+
+
+# HIC SVNT DRACONES
@@ -0,0 +1,89 @@
+#!/usr/bin/python3
+
+import hashlib
+import json
+import numbers
+from dataclasses import dataclass, field
+from typing import List
+
+
+def _canonicalCode(code):
+    """Internal: a land-cover code as an int if it is integral, else as a str
+
+    Crosswalk targets are usually integer classes, possibly as numpy
+    integers or numeric strings, but registered crosswalks can use other
+    targets (e.g. class names).
+    """
+    if isinstance(code, numbers.Integral):
+        return int(code)
+    try:
+        value = float(code)
+    except (TypeError, ValueError):
+        return str(code)
+    return int(value) if value.is_integer() else str(code)
+
+
+@dataclass
+class ModelParameters:
+    """A Model Parameters dataclass.
+
+    The parameters needed to develop a habitat model for a taxon, for one set
+    of habitat filters and one land-cover translator.
+
+    habitat_filter: str: The name of the habitat filters template used.
+    translator: str: The name of the translator used.
+    habitat_codes: list: The filtered IUCN habitat codes.
+    land_cover_codes: list: The translated land-cover codes.
+    """
+    taxonid: int
+    scientific_name: str
+    habitat_filter: str
+    translator: str
+    elevation_lower: int
+    elevation_upper: int
+    habitat_codes: List = field(default_factory=lambda: [])
+    land_cover_codes: List = field(default_factory=lambda: [])
+
+    def toRow(self):
+        """Return the parameters as a flat dict
+
+        Code lists are joined with '|', so that rows can be written to
+        tabular formats.
+        """
+        return {
+            'taxonid': self.taxonid,
+            'scientific_name': self.scientific_name,
+            'habitat_filter': self.habitat_filter,
+            'translator': self.translator,
+            'elevation_lower': self.elevation_lower,
+            'elevation_upper': self.elevation_upper,
+            'habitat_codes': '|'.join(str(c) for c in self.habitat_codes),
+            'land_cover_codes': '|'.join(str(c) for c in self.land_cover_codes)
+            }
+
+    def signature(self):
+        """Return the canonical signature of the model inputs
+
+        Taxa with equal signatures (filter template, translator, translated
+        land-cover classes and elevation range) have identical models, so
+        that downstream work can run once per signature.
+
+            Returns:
+                tuple: (habitat_filter, translator, sorted land_cover_codes,
+                    elevation_lower, elevation_upper). Integral codes are
+                    ints, sorted before any other codes (as str).
+        """
+        return (
+            self.habitat_filter,
+            self.translator,
+            tuple(sorted((_canonicalCode(c) for c in self.land_cover_codes), key = lambda c: (isinstance(c, str), c))),
+            None if self.elevation_lower is None else int(self.elevation_lower),
+            None if self.elevation_upper is None else int(self.elevation_upper)
+            )
+
+    def signatureHash(self):
+        """Return a short hex digest of signature(), e.g. for file names"""
+        return hashlib.sha256(json.dumps(self.signature()).encode('utf-8')).hexdigest()[:16]
+
+
+# HIC SVNT DRACONES
@@ -0,0 +1,204 @@
+#!/usr/bin/python3
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+
+from .HabitatFilters import HabitatFilters
+
+
+# Part of every key: bump when derived parameters change for the same inputs
+# (2: NaN habitat fields fixed as missing, habitat codes read as text)
+_PARAMETER_CACHE_VERSION = 2
+
+
+def _default(o):
+    # numpy scalars and other non-JSON values
+    if hasattr(o, 'item'):
+        return o.item()
+    return str(o)
+
+
+def _hash(obj):
+    return hashlib.sha256(
+        json.dumps(obj, sort_keys=True, separators=(',', ':'), default=_default).encode('utf-8')
+        ).hexdigest()
+
+
+def taxonInputHash(taxon):
+    """Hash of the Taxon fields that model parameters are derived from
+
+    Covers the taxon id and name, elevation limits and habitat rows.
+    """
+    return _hash({
+        'taxonid': taxon.taxonid,
+        'scientific_name': taxon.scientific_name,
+        'elevation_lower': taxon.elevation_lower,
+        'elevation_upper': taxon.elevation_upper,
+        'habitats': [
+            [str(h['code']), h['season'], h['suitability'], h['majorimportance']]
+            for h in taxon.habitats
+            ]
+        })
+
+
+def parameterKey(inputHash, habitatFilters, translator, **options):
+    """Cache key of derived parameters
+
+        Args:
+            inputHash (str): A hash of the inputs, e.g. taxonInputHash(taxon)
+                or a batch fingerprint.
+            habitatFilters: A HabitatFilters object or template name (or None).
+            translator (str): The translator name (or None).
+            options: Any other option affecting the result (e.g. fix flags).
+
+        Returns:
+            str: A key, which also depends on the cache version, so that
+                entries made before a change to the derivation are not used.
+    """
+    if isinstance(habitatFilters, HabitatFilters):
+        habitatFilters = [habitatFilters.season, habitatFilters.suitability, habitatFilters.majorImportance]
+    return _hash([_PARAMETER_CACHE_VERSION, inputHash, habitatFilters, translator, options])
+
+
+class ParameterCache:
+    """A persistent, content-addressed cache of derived parameters
+
+    Values (JSON-serialisable dicts) are stored in a SQLite file under keys
+    built with parameterKey. The file can be shared by concurrent readers
+    and processes; a cache object can be shared by threads. The cache is bounded to maxEntries, evicting the least
+    recently used entries.
+
+    Lookups do not write: access times of hits are kept in memory and
+    written in batches of flushEvery (and on close), so that concurrent
+    readers are not serialised. The bound is checked every pruneEvery
+    insertions rather than on each one, so the cache can exceed maxEntries
+    by up to pruneEvery entries per writer between checks.
+
+    path: str: The cache file.
+    maxEntries: int: The maximum number of entries.
+    pruneEvery: int: Insertions between bound checks. Defaults to 1% of
+        maxEntries (at most 1000).
+    flushEvery: int: Access times kept in memory before they are written.
+
+    Examples:
+        cache = ParameterCache('parameters.sqlite')
+        ModelParametersFactory(taxon, 'kba_breeding', 'jung', cache = cache)
+        cache.hits, cache.misses
+    """
+
+    def __init__(self, path, maxEntries = 1000000, pruneEvery = None, flushEvery = 1000):
+        self.path = path
+        self.maxEntries = maxEntries
+        self.pruneEvery = pruneEvery if pruneEvery is not None else max(1, min(1000, maxEntries // 100))
+        self.flushEvery = flushEvery
+        self.hits = 0
+        self.misses = 0
+        # key: access time of hits not yet written
+        self._accessed = {}
+        # insertions since the last bound check
+        self._inserted = 0
+        # the connection and the state above are shared by threads
+        self._lock = threading.Lock()
+        self._con = sqlite3.connect(path, timeout=60, check_same_thread=False)
+        self._con.execute('PRAGMA journal_mode=WAL')
+        self._con.execute('PRAGMA synchronous=NORMAL')
+        with self._con:
+            self._con.execute('CREATE TABLE IF NOT EXISTS parameters (key TEXT PRIMARY KEY, value TEXT NOT NULL, accessed REAL NOT NULL)')
+            self._con.execute('CREATE INDEX IF NOT EXISTS parameters_accessed ON parameters (accessed)')
+
+    def get(self, key):
+        """Return the value stored under key, or None"""
+        return self.getMany([key]).get(key)
+
+    def getMany(self, keys):
+        """Return a dict of the values stored under keys (missing keys are omitted)"""
+        keys = list(keys)
+        rows = []
+        with self._lock:
+            # stay below the SQLite limit on query parameters
+            for i in range(0, len(keys), 500):
+                chunk = keys[i:i + 500]
+                rows.extend(self._con.execute(
+                    f'SELECT key, value FROM parameters WHERE key IN ({",".join("?" * len(chunk))})', chunk
+                    ).fetchall())
+            if len(rows) > 0:
+                self._accessed.update(dict.fromkeys((k for k, _ in rows), time.time()))
+                if len(self._accessed) >= self.flushEvery:
+                    self._flush()
+            self.hits += len(rows)
+            self.misses += len(keys) - len(rows)
+        return {k: json.loads(v) for k, v in rows}
+
+    def put(self, key, value):
+        """Store value under key"""
+        self.putMany({key: value})
+
+    def putMany(self, items):
+        """Store a dict of key: value items"""
+        now = time.time()
+        rows = [(k, json.dumps(v, default=_default), now) for k, v in items.items()]
+        with self._lock:
+            with self._con:
+                self._con.executemany('INSERT OR REPLACE INTO parameters (key, value, accessed) VALUES (?, ?, ?)', rows)
+            self._inserted += len(rows)
+            if self._inserted >= self.pruneEvery:
+                self._prune()
+
+    def flush(self):
+        """Write the access times of hits kept in memory"""
+        with self._lock:
+            self._flush()
+
+    def _flush(self):
+        accessed, self._accessed = self._accessed, {}
+        if len(accessed) > 0:
+            with self._con:
+                self._con.executemany(
+                    'UPDATE parameters SET accessed = max(accessed, ?) WHERE key = ?', [(t, k) for k, t in accessed.items()]
+                    )
+
+    def prune(self):
+        """Evict the least recently used entries above maxEntries"""
+        with self._lock:
+            self._prune()
+
+    def _prune(self):
+        self._flush()
+        self._inserted = 0
+        with self._con:
+            excess = self._con.execute('SELECT COUNT(*) FROM parameters').fetchone()[0] - self.maxEntries
+            if excess > 0:
+                self._con.execute(
+                    'DELETE FROM parameters WHERE key IN (SELECT key FROM parameters ORDER BY accessed LIMIT ?)', (excess,)
+                    )
+
+    def clear(self):
+        with self._lock:
+            self._accessed = {}
+            with self._con:
+                self._con.execute('DELETE FROM parameters')
+
+    def __len__(self):
+        with self._lock:
+            return self._con.execute('SELECT COUNT(*) FROM parameters').fetchone()[0]
+
+    def __contains__(self, key):
+        with self._lock:
+            return self._con.execute('SELECT 1 FROM parameters WHERE key = ?', (key,)).fetchone() is not None
+
+    def close(self):
+        with self._lock:
+            self._flush()
+            self._con.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+# HIC SVNT DRACONES
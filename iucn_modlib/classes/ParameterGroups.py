@@ -0,0 +1,86 @@
+#!/usr/bin/python3
+
+from dataclasses import dataclass, field
+from typing import List
+
+
+@dataclass
+class ParameterGroups:
+    """A ParameterGroups dataclass.
+
+    ModelParameters collapsed into groups of equal signature (see
+    ModelParameters.signature). Built by groupParameters.
+
+    signatures: list: The unique signatures, in order of first appearance.
+    representatives: list: The first ModelParameters of each signature.
+    members: list: For each signature, the indices of its ModelParameters in
+        the grouped list.
+    """
+    signatures: List = field(default_factory=lambda: [])
+    representatives: List = field(default_factory=lambda: [])
+    members: List = field(default_factory=lambda: [])
+
+    def __len__(self):
+        """The number of unique signatures"""
+        return len(self.signatures)
+
+    @property
+    def total(self):
+        """The number of grouped ModelParameters"""
+        return sum(len(m) for m in self.members)
+
+    @property
+    def ratio(self):
+        """The dedup ratio: grouped ModelParameters per unique signature"""
+        return self.total / len(self.signatures) if len(self.signatures) > 0 else 1.0
+
+    def fanOut(self, results):
+        """Map per-signature results back to the grouped ModelParameters
+
+            Args:
+                results (list): One result per signature, in signature order.
+
+            Returns:
+                list: One result per grouped ModelParameters, in input order.
+
+            Example:
+                groups = groupParameters(params)
+                areas = groups.fanOut([computeArea(p) for p in groups.representatives])
+        """
+        if len(results) != len(self.signatures):
+            raise ValueError('Expected one result per signature.')
+        output = [None] * self.total
+        for result, indices in zip(results, self.members):
+            for i in indices:
+                output[i] = result
+        return output
+
+    def report(self):
+        """Return a one-line summary of the grouping"""
+        return f'{self.total} parameter sets, {len(self)} unique signatures (dedup ratio {self.ratio:.2f})'
+
+
+def groupParameters(parameters):
+    """Collapse ModelParameters into groups of equal signature
+
+        Args:
+            parameters (list): ModelParameters objects.
+
+        Returns:
+            ParameterGroups: The groups.
+    """
+    groups = ParameterGroups()
+    index = {}
+    for i, params in enumerate(parameters):
+        signature = params.signature()
+        group = index.get(signature)
+        if group is None:
+            group = index[signature] = len(groups.signatures)
+            groups.signatures.append(signature)
+            groups.representatives.append(params)
+            groups.members.append([])
+        groups.members[group].append(i)
+    return groups
+
+
+# HIC SVNT DRACONES
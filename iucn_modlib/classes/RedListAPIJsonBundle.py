@@ -0,0 +1,209 @@
+#!/usr/bin/python3
+
+import json
+import mmap
+import os
+
+
+def _loads():
+    """Internal: the fastest available JSON parser
+
+    orjson is used if installed, falling back to the standard library.
+    """
+    try:
+        import orjson
+        return orjson.loads
+    except ImportError:
+        return json.loads
+
+
+def _indexPath(path):
+    return f'{path}.idx'
+
+
+def _fingerprint(stat):
+    """Internal: the fingerprint of a bundle file an index is valid for
+
+    Size and modification time, as for batch files in loadBatchSource, so
+    that a bundle rewritten with the same size is not read with a stale
+    index.
+    """
+    return f'{stat.st_size}-{stat.st_mtime_ns}'
+
+
+def _loadResponse(response):
+    """Internal: a saved API response, either a dict or a path to a JSON file
+    """
+    if isinstance(response, dict):
+        return response
+    with open(response) as f:
+        return json.load(f)
+
+
+def writeRedListAPIJsonBundle(path, responses):
+    """Write Red List API responses to a bundle
+
+    A bundle is a JSON Lines file with one record per taxon, holding both the
+    assessment and the habitats API responses, plus an offset index saved
+    alongside it (`<path>.idx`), valid for the size and modification time of
+    the bundle file.
+
+        Args:
+            path (str): The path of the bundle file to write.
+            responses (iterable): (assessment, habitats) pairs. Each element
+                is either a parsed API response (dict) or the path to a JSON
+                file holding one (as used by TaxonFactoryRedListAPIJsons).
+
+        Returns:
+            int: The number of records written.
+
+        Example:
+            writeRedListAPIJsonBundle('species.jsonl', [
+                ('0_assessment.json', '0_habitats.json'),
+                ('1_assessment.json', '1_habitats.json')
+                ])
+    """
+    index = {'taxonid': [], 'scientific_name': [], 'offset': [], 'length': []}
+    offset = 0
+    with open(path, 'wb') as f:
+        for assessment, habitats in responses:
+            assessment = _loadResponse(assessment)
+            habitats = _loadResponse(habitats)
+            if 'result' not in assessment or len(assessment['result']) == 0:
+                raise ValueError('assessment response does not contain a result.')
+            line = json.dumps({
+                'taxonid': assessment['result'][0]['taxonid'],
+                'scientific_name': assessment['result'][0]['scientific_name'],
+                'assessment': assessment,
+                'habitats': habitats
+                }, separators=(',', ':')).encode('utf-8') + b'\n'
+            f.write(line)
+            index['taxonid'].append(assessment['result'][0]['taxonid'])
+            index['scientific_name'].append(assessment['result'][0]['scientific_name'])
+            index['offset'].append(offset)
+            index['length'].append(len(line) - 1)
+            offset += len(line)
+    index['size'] = offset
+    index['fingerprint'] = _fingerprint(os.stat(path))
+    with open(_indexPath(path), 'w') as f:
+        json.dump(index, f)
+    return len(index['taxonid'])
+
+
+class RedListAPIJsonBundle:
+    """A reader for bundles of Red List API responses
+
+    The bundle file is memory-mapped and records are located through the
+    offset index, so looking up a taxon only parses that taxon's record.
+    If the index is missing or out of date (the bundle's size or modification
+    time changed) it is rebuilt with a single scan of the bundle.
+
+    path: str: The path of a bundle written by writeRedListAPIJsonBundle.
+    parser: callable: A JSON parser accepting bytes.
+        Defaults to orjson.loads if available, json.loads otherwise.
+
+    Examples:
+        bundle = RedListAPIJsonBundle('species.jsonl')
+        assessment, habitats = bundle.record(22823)
+        assessment, habitats = bundle.record('Ursus maritimus')
+        for assessment, habitats in bundle:
+            ...
+    """
+
+    def __init__(self, path, parser = None):
+        self.path = path
+        self.parser = _loads() if parser is None else parser
+        self._file = open(path, 'rb')
+        stat = os.fstat(self._file.fileno())
+        # mmap cannot map empty files
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if stat.st_size > 0 else b''
+        self._offsets = {}
+        self._names = {}
+        index = self._readIndex(_fingerprint(stat))
+        if index is None:
+            index = self._scan()
+        for taxonid, name, offset, length in zip(index['taxonid'], index['scientific_name'], index['offset'], index['length']):
+            self._offsets[taxonid] = (offset, length)
+            self._names[name] = taxonid
+
+    def _readIndex(self, fingerprint):
+        try:
+            with open(_indexPath(self.path)) as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if index.get('fingerprint') != fingerprint:
+            return None
+        return index
+
+    def _scan(self):
+        index = {'taxonid': [], 'scientific_name': [], 'offset': [], 'length': []}
+        offset = 0
+        size = len(self._map)
+        while offset < size:
+            end = self._map.find(b'\n', offset)
+            if end == -1:
+                end = size
+            if end > offset:
+                record = self.parser(self._map[offset:end])
+                index['taxonid'].append(record['taxonid'])
+                index['scientific_name'].append(record['scientific_name'])
+                index['offset'].append(offset)
+                index['length'].append(end - offset)
+            offset = end + 1
+        return index
+
+    def taxonid(self, species):
+        """Resolve a species numeric ID or scientific name to a taxon ID
+        """
+        if species in self._names:
+            return self._names[species]
+        try:
+            taxonid = int(species)
+        except (TypeError, ValueError):
+            raise KeyError(f'Species {species} not found in bundle {self.path}')
+        if taxonid not in self._offsets:
+            raise KeyError(f'Species {species} not found in bundle {self.path}')
+        return taxonid
+
+    def taxonids(self):
+        """Return the taxon IDs in the bundle, in file order
+        """
+        return list(self._offsets.keys())
+
+    def record(self, species):
+        """Return the (assessment, habitats) API responses for a species
+
+        species can be a numeric ID or a scientific name.
+        """
+        offset, length = self._offsets[self.taxonid(species)]
+        record = self.parser(self._map[offset:offset + length])
+        return record['assessment'], record['habitats']
+
+    def __iter__(self):
+        for taxonid in self._offsets:
+            yield self.record(taxonid)
+
+    def __len__(self):
+        return len(self._offsets)
+
+    def __contains__(self, species):
+        try:
+            self.taxonid(species)
+        except KeyError:
+            return False
+        return True
+
+    def close(self):
+        if isinstance(self._map, mmap.mmap):
+            self._map.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+# HIC SVNT DRACONES
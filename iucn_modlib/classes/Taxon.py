@@ -2,6 +2,7 @@
 
 from dataclasses import dataclass, field
 from .IUCNHabitatCodes import IUCNHabitatCodes_v3_1
+from .. import instrumentation
 from typing import List
 
 
@@ -73,6 +74,7 @@ class Taxon:
         """
         return [ h['habitat'] for h in self.habitatsRaw(habitatFilters) ]
 
+    @instrumentation.timed('taxon.fix')
     def fix(self, fixType):
         """Fixes elements in the Taxon object
 
@@ -151,18 +153,20 @@ class Taxon:
         def habitats():
             """Fix habitat parameters
 
-            If values for seson, suitability and majorimportance are set to None,
-            assume they are unknown and assign the default unknown value.
+            If values for seson, suitability and majorimportance are set to None
+            (or NaN, as missing values in batch downloads), assume they are
+            unknown and assign the default unknown value.
             """
             # if habitats are empty, exit
             if len(self.habitats) == 0:
                 return
+            # NaN is the only value not equal to itself
             for h in self.habitats:
-                if h['season'] is None:
+                if h['season'] is None or h['season'] != h['season']:
                     h['season'] = 'Seasonal Occurrence Unknown'
-                if h['suitability'] is None:
+                if h['suitability'] is None or h['suitability'] != h['suitability']:
                     h['suitability'] = 'Unknown'
-                if h['majorimportance'] is None:
+                if h['majorimportance'] is None or h['majorimportance'] != h['majorimportance']:
                     h['majorimportance'] = 'No'
 
         def habitats_unmappable(unmapList = 'jung'):
@@ -0,0 +1,213 @@
+#!/usr/bin/python3
+
+import collections
+import copy
+import os
+import sqlite3
+import threading
+import uuid
+import weakref
+
+from .. import instrumentation
+
+
+def _copy(taxon):
+    """Internal: a copy of a Taxon that shares no mutable state with it"""
+    c = copy.copy(taxon)
+    c.habitats = [dict(h) for h in taxon.habitats]
+    return c
+
+
+# Identities of batch source dicts: the ids of their tables -> (weak
+# references to the tables, identifier). The references are checked on
+# lookup, so an id reused by another table is not mistaken for the old one.
+_tableIdentities = {}
+_tableIdentitiesLock = threading.Lock()
+
+
+def _tablesIdentity(source):
+    """Internal: an identifier of the tables of a batch source dict
+
+    Dicts holding the same table objects share an identifier, so a shallow
+    copy of a source shares cached taxa with it until one of its tables is
+    replaced. Nothing is stored in the source. Values that cannot be weakly
+    referenced (e.g. derived indexes) are not part of the identity.
+    """
+    tables = []
+    for name, table in sorted(source.items(), key=lambda item: item[0]):
+        try:
+            tables.append((name, table, weakref.ref(table)))
+        except TypeError:
+            continue
+    if len(tables) == 0:
+        return None
+    key = tuple((name, id(table)) for name, table, _ in tables)
+    with _tableIdentitiesLock:
+        entry = _tableIdentities.get(key)
+        if entry is not None and all(ref() is table for (_, table, _), ref in zip(tables, entry[0])):
+            return entry[1]
+
+        def forget(ref, key = key):
+            # the entry may have been replaced since (ids are reused)
+            current = _tableIdentities.get(key)
+            if current is not None and any(r is ref for r in current[0]):
+                _tableIdentities.pop(key, None)
+        entry = ([weakref.ref(table, forget) for _, table, _ in tables], uuid.uuid4().hex)
+        _tableIdentities[key] = entry
+        return entry[1]
+
+
+def sourceIdentity(source):
+    """Return a hashable identity of a taxon source, for TaxonCache keys
+
+    Folders and files are identified by their absolute path, batch source
+    dicts by their table objects (see _tablesIdentity), bundles by their
+    path, SQLite connections by their database file and other database
+    connections by their dsn attribute. Other sources (e.g. in-memory SQLite
+    databases) have no stable identity: None is returned, and their taxa are
+    not cached. Object ids alone are never used, as they are reused once
+    objects are garbage collected.
+    """
+    if isinstance(source, (str, os.PathLike)):
+        return os.path.abspath(source)
+    if isinstance(source, dict):
+        return _tablesIdentity(source)
+    if isinstance(source, sqlite3.Connection):
+        for _, name, path in source.execute('PRAGMA database_list'):
+            if name == 'main':
+                return os.path.abspath(path) if path else None
+        return None
+    if hasattr(source, 'path'):
+        return os.path.abspath(source.path)
+    return getattr(source, 'dsn', None) or None
+
+
+class TaxonCache:
+    """A bounded, thread-safe LRU cache of Taxon objects
+
+    Taxa are keyed by the factory and source identity (see sourceIdentity),
+    the taxon ID (and the species as requested, e.g. a name) and the fix
+    flags. Cached taxa are never handed out: callers get copies, so they
+    cannot corrupt the cached entries.
+
+    maxSize: int: The maximum number of taxa. The least recently used taxa
+        are evicted first.
+
+    Examples:
+        cache = TaxonCache(10000)
+        TaxonFactoryRedListBatch(2345, source, cache = cache)
+        setTaxonCache(cache)   # used by all taxon factories by default
+        cache.hits, cache.misses, cache.stats()
+    """
+
+    def __init__(self, maxSize = 4096):
+        if maxSize < 1:
+            raise ValueError('maxSize must be a positive integer.')
+        self.maxSize = maxSize
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = collections.OrderedDict()  # key: (taxon, aliases)
+        self._aliases = {}  # alias: key
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _key(self, identity, species, fixElevation, fixHabitats):
+        key = (identity, species, bool(fixElevation), bool(fixHabitats))
+        return self._aliases.get(key, key)
+
+    def get(self, identity, species, fixElevation = True, fixHabitats = True):
+        """Return a copy of a cached taxon, or None"""
+        with self._lock:
+            key = self._key(identity, species, fixElevation, fixHabitats)
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                instrumentation.count('taxon_cache.misses')
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        instrumentation.count('taxon_cache.hits')
+        return _copy(entry[0])
+
+    def put(self, identity, species, fixElevation, fixHabitats, taxon):
+        """Store a copy of taxon, under its taxon ID and species (if different)"""
+        key = (identity, int(taxon.taxonid), bool(fixElevation), bool(fixHabitats))
+        alias = (identity, species, bool(fixElevation), bool(fixHabitats))
+        with self._lock:
+            aliases = self._entries.pop(key, (None, set()))[1]
+            if alias != key:
+                aliases.add(alias)
+                self._aliases[alias] = key
+            self._entries[key] = (_copy(taxon), aliases)
+            while len(self._entries) > self.maxSize:
+                evictedKey, (_, evicted) = self._entries.popitem(last=False)
+                for a in evicted:
+                    if self._aliases.get(a) == evictedKey:
+                        del self._aliases[a]
+                self.evictions += 1
+
+    def fetch(self, identity, species, fixElevation, fixHabitats, build):
+        """Return a copy of a cached taxon, or build, store and return it
+
+            Args:
+                identity: The factory and source identity.
+                species: The taxon ID or name, as requested.
+                build: A function returning the Taxon on a miss.
+        """
+        taxon = self.get(identity, species, fixElevation, fixHabitats)
+        if taxon is None:
+            taxon = build()
+            self.put(identity, species, fixElevation, fixHabitats, taxon)
+        return taxon
+
+    def clear(self):
+        """Remove all taxa (counters are kept)"""
+        with self._lock:
+            self._entries.clear()
+            self._aliases.clear()
+
+    def stats(self):
+        """Return the cache statistics
+
+            Returns:
+                dict: size, maxSize, hits, misses, evictions and hitRate.
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'maxSize': self.maxSize,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hitRate': self.hits / lookups if lookups > 0 else 0.0
+                }
+
+
+# Cache used by the taxon factories when none is given
+_defaultCache = None
+
+
+def setTaxonCache(cache):
+    """Set the TaxonCache used by all taxon factories by default (None to disable)
+
+    Returns the previous default cache.
+    """
+    global _defaultCache
+    previous = _defaultCache
+    _defaultCache = cache
+    return previous
+
+
+def taxonCache(cache = None):
+    """Return the cache a factory should use: cache, or the default if cache
+    is None; False disables caching."""
+    if cache is False:
+        return None
+    return _defaultCache if cache is None else cache
+
+
+# HIC SVNT DRACONES
@@ -0,0 +1,294 @@
+#!/usr/bin/python3
+
+"""Command line interface
+
+    iucn-modlib export BATCH_FOLDER --filters kba_breeding kba_nonbreeding \
+        --translator jung --output parameters.csv
+    iucn-modlib shard BATCH_FOLDER SHARDS_FOLDER --shards 8 --by order
+    iucn-modlib merge SHARD_OUTPUTS... --output parameters.csv
+    iucn-modlib sqlite BATCH_FOLDER redlist.sqlite
+"""
+
+import argparse
+import collections
+import json
+import os
+import sys
+import time
+from dataclasses import asdict
+from concurrent.futures import ProcessPoolExecutor
+
+from .factories.TaxonFactories import loadBatchSource
+from .factories.LazyTaxonFactories import LazyTaxonFactory, batchLazyIndex
+from .factories.ModelParametersFactories import ModelParametersFactory, TranslatorFactory
+from .classes.ModelParameters import ModelParameters
+from .classes.ParameterCache import ParameterCache, parameterKey
+from .factories.HabitatFiltersFactories import HabitatFiltersFactory
+from .batch.Sharding import shardBatchSource, mergeShardOutputs
+from .batch.SQLiteMirror import writeBatchSQLite
+from .translator import registerCrosswalk, crosswalkNames
+from .writers import rowWriter
+from . import instrumentation
+
+
+# Batch source of the current process. Set by the parent before the worker
+# pool is started, so that forked workers inherit it without reloading.
+_source = None
+# Parameter cache of the current process, as (pid, cache)
+_cache = None
+
+
+def _initWorker(path, instrumented = False, fingerprints = False, crosswalks = ()):
+    global _source
+    if instrumented:
+        instrumentation.enable()
+        instrumentation.reset()
+    for crosswalk in crosswalks:
+        registerCrosswalk(crosswalk)
+    if _source is None:
+        _source = loadBatchSource(path, fingerprints = fingerprints)
+
+
+def _openCache(path):
+    # SQLite connections cannot be shared with forked processes
+    global _cache
+    if _cache is None or _cache[0] != os.getpid():
+        _cache = (os.getpid(), ParameterCache(path))
+    return _cache[1]
+
+
+def _row(params, signature):
+    row = params.toRow()
+    if signature:
+        row['signature'] = params.signatureHash()
+    return row
+
+
+def exportParameters(taxa, filters, translator, fixElevation = True, fixHabitats = True, cache = None, signatures = False):
+    """Build model parameter rows for taxa in the current process' batch source
+
+    If cache (a ParameterCache path) is provided, parameters are keyed on the
+    batch fingerprints of the taxa, so that unchanged taxa are not rebuilt.
+    If signatures is True, rows include the parameter signature hash (see
+    ModelParameters.signatureHash).
+
+    Taxa are read through the lazy taxon index of the source (see
+    batchLazyIndex), so building a taxon does not scan the batch tables.
+
+    Returns a list of rows, a list of (taxonid, error message) failures and
+    the instrumentation snapshot of the work (None if not instrumented).
+    """
+    rows = []
+    failures = []
+    cached = {}
+    if cache is not None:
+        cache = _openCache(cache)
+        keys = {
+            (taxonid, habitatFilters): parameterKey(
+                _source['fingerprints'].get(taxonid), habitatFilters, translator,
+                taxonid = int(taxonid), fixElevation = fixElevation, fixHabitats = fixHabitats
+                )
+            for taxonid in taxa for habitatFilters in filters
+            }
+        found = cache.getMany(keys.values())
+        cached = {k: found[key] for k, key in keys.items() if key in found}
+        instrumentation.count('cache.hits', len(found))
+        instrumentation.count('cache.misses', len(keys) - len(found))
+    computed = {}
+    for taxonid in taxa:
+        try:
+            taxon = None
+            for habitatFilters in filters:
+                if (taxonid, habitatFilters) in cached:
+                    rows.append(_row(ModelParameters(**cached[(taxonid, habitatFilters)]), signatures))
+                    continue
+                if taxon is None:
+                    taxon = LazyTaxonFactory(taxonid, _source, fixElevation, fixHabitats)
+                params = ModelParametersFactory(taxon, habitatFilters, translator)
+                rows.append(_row(params, signatures))
+                if cache is not None:
+                    computed[keys[(taxonid, habitatFilters)]] = asdict(params)
+        except Exception as e:
+            failures.append((taxonid, f'{type(e).__name__}: {e}'))
+    if len(computed) > 0:
+        cache.putMany(computed)
+    metrics = None
+    if instrumentation.isEnabled():
+        metrics = instrumentation.snapshot()
+        instrumentation.reset()
+    return rows, failures, metrics
+
+
+def _chunks(values, size):
+    for i in range(0, len(values), size):
+        yield values[i:i + size]
+
+
+def export(args):
+    global _source
+
+    if args.metrics is not None:
+        instrumentation.enable()
+        instrumentation.reset()
+
+    # fail early on unsupported templates and translators
+    for crosswalk in args.crosswalk:
+        registerCrosswalk(crosswalk)
+    for template in args.filters:
+        HabitatFiltersFactory(template = template)
+    TranslatorFactory(args.translator)
+
+    start = time.perf_counter()
+    _source = loadBatchSource(args.batch, fingerprints = args.cache is not None)
+    # built before the worker pool starts, so that forked workers share it
+    batchLazyIndex(_source)
+    if args.taxa is not None:
+        taxa = [int(t) for t in args.taxa]
+    elif args.taxa_file is not None:
+        with open(args.taxa_file) as f:
+            taxa = [int(line) for line in f if line.strip() != '']
+    else:
+        taxa = [int(t) for t in _source['assessments'].internalTaxonId.unique()]
+    if not args.quiet:
+        print(f'Loaded {args.batch} in {time.perf_counter() - start:.1f}s, exporting {len(taxa)} taxa.', file=sys.stderr)
+
+    writer = rowWriter(args.output, args.format)
+    start = time.perf_counter()
+    done = 0
+    failures = []
+    # parameter signatures, to report how many taxa share identical models
+    signatures = set()
+    rowCount = 0
+
+    # metrics of the work units are collected separately from those of the
+    # main process, which may share them with forked workers
+    metrics = instrumentation.snapshot()
+    instrumentation.reset()
+
+    def report(rows, chunkFailures, chunkMetrics, size):
+        nonlocal done, rowCount
+        writer.write(rows)
+        rowCount += len(rows)
+        signatures.update(
+            (r['habitat_filter'], r['translator'], r['land_cover_codes'], r['elevation_lower'], r['elevation_upper'])
+            for r in rows
+            )
+        if chunkMetrics is not None:
+            instrumentation.merge(chunkMetrics)
+        failures.extend(chunkFailures)
+        done += size
+        if not args.quiet:
+            elapsed = time.perf_counter() - start
+            print(f'\r{done}/{len(taxa)} taxa, {done / elapsed:.1f} taxa/s', end='', file=sys.stderr)
+
+    try:
+        if args.workers == 1:
+            for chunk in _chunks(taxa, args.chunk_size):
+                report(*exportParameters(chunk, args.filters, args.translator, cache = args.cache, signatures = args.signatures), len(chunk))
+        else:
+            with ProcessPoolExecutor(max_workers=args.workers, initializer=_initWorker, initargs=(args.batch, args.metrics is not None, args.cache is not None, tuple(args.crosswalk))) as pool:
+                # at most 2 x workers chunks in flight, written in chunk order,
+                # so that memory does not grow with the number of taxa and
+                # the output is deterministic
+                pending = collections.deque()
+                for chunk in _chunks(taxa, args.chunk_size):
+                    pending.append((pool.submit(exportParameters, chunk, args.filters, args.translator, cache = args.cache, signatures = args.signatures), len(chunk)))
+                    if len(pending) >= 2 * args.workers:
+                        future, size = pending.popleft()
+                        report(*future.result(), size)
+                while len(pending) > 0:
+                    future, size = pending.popleft()
+                    report(*future.result(), size)
+    finally:
+        writer.close()
+
+    if not args.quiet:
+        elapsed = time.perf_counter() - start
+        print(f'\nExported {done - len(failures)} taxa in {elapsed:.1f}s ({done / max(elapsed, 1e-9):.1f} taxa/s).', file=sys.stderr)
+        print(f'{rowCount} parameter sets, {len(signatures)} unique signatures (dedup ratio {rowCount / max(len(signatures), 1):.2f}).', file=sys.stderr)
+    for taxonid, message in failures:
+        print(f'Failed {taxonid}: {message}', file=sys.stderr)
+    if args.metrics is not None:
+        instrumentation.merge(metrics)
+        with open(args.metrics, 'w') as f:
+            json.dump(instrumentation.snapshot(), f, indent=2)
+        instrumentation.disable()
+        instrumentation.reset()
+    return 1 if len(failures) > 0 else 0
+
+
+def shard(args):
+    manifest = shardBatchSource(args.batch, args.output, args.shards, by = args.by)
+    if not args.quiet:
+        for s in manifest['shards']:
+            print(f"{s['folder']}: {s['taxa']} taxa", file=sys.stderr)
+    return 0
+
+
+def merge(args):
+    rows = mergeShardOutputs(args.inputs, args.output, sortBy = args.sort_by)
+    if not args.quiet:
+        print(f'Merged {rows} rows from {len(args.inputs)} files.', file=sys.stderr)
+    return 0
+
+
+def sqlite(args):
+    start = time.perf_counter()
+    taxa = writeBatchSQLite(args.batch, args.output)
+    if not args.quiet:
+        print(f'Wrote {taxa} taxa to {args.output} in {time.perf_counter() - start:.1f}s.', file=sys.stderr)
+    return 0
+
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(prog='iucn-modlib', description='IUCN Modelling Library')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    exporter = commands.add_parser('export', help='Export model parameters from a Red List batch download.')
+    exporter.add_argument('batch', help='Red List batch download folder.')
+    exporter.add_argument('-o', '--output', default='-', help='Output file (.csv or .parquet). Defaults to stdout (csv).')
+    exporter.add_argument('--format', choices=('csv', 'parquet'), default=None, help='Output format. Defaults to the output file extension.')
+    exporter.add_argument('-f', '--filters', nargs='+', default=['kba_breeding', 'kba_nonbreeding'], help='HabitatFiltersFactory templates.')
+    exporter.add_argument('-t', '--translator', default=None, help=f"Land-cover translator: a registered crosswalk ('{', '.join(crosswalkNames())}') or one loaded with --crosswalk.")
+    exporter.add_argument('--crosswalk', nargs='+', default=[], help='Crosswalk definition files (JSON) to register, see registerCrosswalk.')
+    taxa = exporter.add_mutually_exclusive_group()
+    taxa.add_argument('--taxa', nargs='+', default=None, help='Taxon IDs to export. Defaults to all taxa.')
+    taxa.add_argument('--taxa-file', default=None, help='File with one taxon ID per line.')
+    exporter.add_argument('-w', '--workers', type=int, default=os.cpu_count(), help='Number of worker processes.')
+    exporter.add_argument('--chunk-size', type=int, default=100, help='Taxa per work unit.')
+    exporter.add_argument('--cache', default=None, help='Parameter cache file, reused across runs to skip unchanged taxa.')
+    exporter.add_argument('--signatures', action='store_true', help='Add a parameter signature column, equal for taxa with identical model inputs.')
+    exporter.add_argument('--metrics', default=None, help='Write instrumentation metrics (JSON) to this file.')
+    exporter.add_argument('-q', '--quiet', action='store_true', help='Do not report progress.')
+    exporter.set_defaults(func=export)
+
+    sharder = commands.add_parser('shard', help='Split a Red List batch download into self-contained shard folders.')
+    sharder.add_argument('batch', help='Red List batch download folder.')
+    sharder.add_argument('output', help='Output folder for the shards and their manifest.')
+    sharder.add_argument('-n', '--shards', type=int, required=True, help='Number of shards.')
+    sharder.add_argument('--by', default='hash', help="'hash' (of internalTaxonId) or a taxonomic rank, e.g. 'class' or 'order'.")
+    sharder.add_argument('-q', '--quiet', action='store_true', help='Do not report shard sizes.')
+    sharder.set_defaults(func=shard)
+
+    merger = commands.add_parser('merge', help='Merge per-shard outputs in deterministic order.')
+    merger.add_argument('inputs', nargs='+', help='Per-shard output files (.csv or .parquet).')
+    merger.add_argument('-o', '--output', required=True, help='Merged output file (.csv or .parquet).')
+    merger.add_argument('--sort-by', nargs='+', default=['taxonid', 'habitat_filter'], help='Columns to sort on.')
+    merger.add_argument('-q', '--quiet', action='store_true', help='Do not report progress.')
+    merger.set_defaults(func=merge)
+
+    mirror = commands.add_parser('sqlite', help='Write an indexed SQLite mirror of a Red List batch download.')
+    mirror.add_argument('batch', help='Red List batch download folder or zip archive.')
+    mirror.add_argument('output', help='SQLite file (replaced if it exists).')
+    mirror.add_argument('-q', '--quiet', action='store_true', help='Do not report progress.')
+    mirror.set_defaults(func=sqlite)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
+
+
+# HIC SVNT DRACONES
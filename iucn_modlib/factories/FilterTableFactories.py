@@ -0,0 +1,153 @@
+#!/usr/bin/python3
+
+import numpy
+import pandas
+
+from ..classes.HabitatFilters import HabitatFilters
+from .HabitatFiltersFactories import HabitatFiltersFactory
+from .HabitatMatrixFactories import _habitatsFrame, _fixHabitats, _filterMask, _codeOrder
+from .. import translator as translators
+from .. import instrumentation
+
+
+# Filters are evaluated as the bits of an int64 per habitat row
+MAX_FILTERS = 63
+
+# The habitat fields filters apply to
+_FILTER_FIELDS = ['season', 'suitability', 'majorimportance']
+
+
+def _namedFilters(habitatFilters):
+    """Internal: {name: HabitatFilters or None} from a dict or a list of templates and objects"""
+    if isinstance(habitatFilters, dict):
+        items = list(habitatFilters.items())
+    else:
+        if habitatFilters is None or isinstance(habitatFilters, (str, HabitatFilters)):
+            habitatFilters = [habitatFilters]
+        items = [(f if not isinstance(f, HabitatFilters) else 'custom', f) for f in habitatFilters]
+    names = [name for name, _ in items]
+    if len(set(names)) != len(names):
+        raise ValueError('Filter names must be unique: pass custom filters as a dict of name: HabitatFilters.')
+    if len(items) > MAX_FILTERS:
+        raise ValueError(f'At most {MAX_FILTERS} filters can be evaluated at once.')
+    return {
+        name: f if f is None or isinstance(f, HabitatFilters) else HabitatFiltersFactory(template = f)
+        for name, f in items
+        }
+
+
+def _split(values, counts):
+    """Internal: split values into consecutive lists of counts items"""
+    values = values.tolist()
+    stops = numpy.cumsum(counts).tolist()
+    return [values[stop - n:stop] for stop, n in zip(stops, counts.tolist())]
+
+
+@instrumentation.timed('factory.filter_table')
+def FilterTableFactory(source, habitatFilters, translator = None, fixHabitats = True):
+    """A Factory for habitat filter tables
+
+    Evaluates several habitat filters on every taxon of a batch source (or a
+    list of Taxon objects) in one pass over the habitats table. Each habitat
+    row is evaluated once: filters are applied to the distinct combinations
+    of season, suitability and majorimportance, and each row gets a bit per
+    filter it passes. The cost of the scan grows with the number of habitat
+    rows, not with rows x filters.
+
+        Args:
+            source: A batch source (dict or folder, see loadBatchSource) or a
+                list of Taxon objects.
+            habitatFilters: A list of template names, HabitatFilters objects
+                (named 'custom') or None (unfiltered), or a dict of name:
+                template or HabitatFilters. At most 63 filters.
+            translator (str): A registered crosswalk name (e.g. 'jung'), or
+                None for no translation.
+            fixHabitats (bool): Assign default values to missing season,
+                suitability and majorimportance, as Taxon.fix('habitats').
+
+        Returns:
+            pandas.DataFrame: One row per filter and taxon (filters in the
+                given order, taxa in the assessments table or list order),
+                with columns taxonid, habitat_filter, translator,
+                habitat_codes and land_cover_codes. The code columns are
+                list-valued: each cell holds the taxon's distinct codes (in
+                hierarchy order) or translated codes (sorted), an empty list
+                if no code passes the filter. Use DataFrame.explode for one
+                row per code.
+
+        Examples:
+            FilterTableFactory('redlist_2023_1/', ['kba_breeding', 'kba_nonbreeding'], 'jung')
+            FilterTableFactory(source, {'resident': HabitatFilters(season = ('Resident',))})
+    """
+    if isinstance(source, str):
+        from .TaxonFactories import loadBatchSource
+        source = loadBatchSource(source, tables = ('assessments', 'habitats'))
+    filters = _namedFilters(habitatFilters)
+    crosswalk = translators.getCrosswalk(translator) if translator is not None else None
+
+    taxonids, habitats = _habitatsFrame(source)
+    if fixHabitats:
+        habitats = _fixHabitats(habitats)
+
+    # encode taxa (habitats of taxa missing from the source rows are dropped)
+    rows = pandas.Index(taxonids).get_indexer(habitats.taxonid.to_numpy())
+    keep = rows >= 0
+    habitats = habitats.loc[keep]
+    rows = rows[keep].astype(numpy.int64)
+
+    # evaluate the filters on the distinct field combinations only
+    combo = habitats.groupby(_FILTER_FIELDS, dropna=False, sort=False).ngroup().to_numpy()
+    _, first = numpy.unique(combo, return_index=True)
+    combos = habitats[_FILTER_FIELDS].iloc[first]
+    bits = numpy.zeros(len(combos), dtype=numpy.int64)
+    for i, f in enumerate(filters.values()):
+        bits |= _filterMask(combos, f).astype(numpy.int64) << i
+    rowBits = bits[combo]
+
+    # encode codes in hierarchy order
+    codes, inverse = numpy.unique(habitats.code.to_numpy().astype(str), return_inverse=True)
+    columns = numpy.array(_codeOrder(codes.tolist()), dtype=object)
+    ranks = pandas.Index(columns).get_indexer(codes)[inverse].astype(numpy.int64)
+
+    # distinct (taxon, code) pairs, with the filters passed by any of their rows
+    keys = rows * max(len(columns), 1) + ranks
+    order = numpy.argsort(keys, kind='stable')
+    keys = keys[order]
+    starts = numpy.flatnonzero(numpy.r_[True, keys[1:] != keys[:-1]]) if len(keys) > 0 else numpy.zeros(0, dtype=numpy.int64)
+    pairBits = numpy.bitwise_or.reduceat(rowBits[order], starts) if len(keys) > 0 else numpy.zeros(0, dtype=numpy.int64)
+    pairTaxa = keys[starts] // max(len(columns), 1)
+    pairCodes = keys[starts] % max(len(columns), 1)
+
+    if crosswalk is not None:
+        # translation rows of the codes, packed as bits in uint64 words
+        packedBytes = numpy.packbits(crosswalk.table[crosswalk.encode(columns.tolist())], axis=1)
+        packed = numpy.zeros((len(columns), -(-packedBytes.shape[1] // 8) * 8), dtype=numpy.uint8)
+        packed[:, :packedBytes.shape[1]] = packedBytes
+        packed = packed.view(numpy.uint64)
+        targets = crosswalk.targets
+
+    frames = []
+    for i, name in enumerate(filters):
+        selected = ((pairBits >> i) & 1).astype(bool)
+        taxa, selectedCodes = pairTaxa[selected], pairCodes[selected]
+        counts = numpy.bincount(taxa, minlength=len(taxonids))
+        landCover = [[] for _ in range(len(taxonids))]
+        if crosswalk is not None and len(taxa) > 0:
+            # union of the translations of each taxon's codes
+            present = numpy.flatnonzero(counts)
+            translated = numpy.bitwise_or.reduceat(packed[selectedCodes], numpy.cumsum(counts)[present] - counts[present])
+            translated = numpy.unpackbits(translated.view(numpy.uint8), axis=1, count=len(targets)).view(bool)
+            r, c = numpy.nonzero(translated)
+            for taxon, values in zip(present.tolist(), _split(targets[c], numpy.bincount(r, minlength=len(present)))):
+                landCover[taxon] = values
+        frames.append(pandas.DataFrame({
+            'taxonid':          taxonids,
+            'habitat_filter':   name,
+            'translator':       translator,
+            'habitat_codes':    _split(columns[selectedCodes], counts),
+            'land_cover_codes': landCover
+            }))
+    return pandas.concat(frames, ignore_index=True)
+
+
+# HIC SVNT DRACONES
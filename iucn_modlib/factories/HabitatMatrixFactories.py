@@ -0,0 +1,153 @@
+#!/usr/bin/python3
+
+import numpy
+import pandas
+
+from ..classes.HabitatMatrix import HabitatMatrix
+from ..classes.HabitatFilters import HabitatFilters
+from ..classes.IUCNHabitatCodes import IUCNHabitatCodes_v3_1
+from .HabitatFiltersFactories import HabitatFiltersFactory
+from .. import instrumentation
+
+
+# Values assigned to missing habitat fields, as in Taxon.fix('habitats')
+HABITAT_DEFAULTS = {
+    'season': 'Seasonal Occurrence Unknown',
+    'suitability': 'Unknown',
+    'majorimportance': 'No'
+    }
+
+
+def _habitatsFrame(source):
+    """Internal: return (taxonids, habitats DataFrame) for a batch source or a list of taxa"""
+    columns = ['taxonid', 'code', 'season', 'suitability', 'majorimportance']
+    if isinstance(source, dict):
+        taxonids = source['assessments'].internalTaxonId.to_numpy()
+        habitats = source['habitats'][columns]
+    else:
+        taxonids = numpy.asarray([t.taxonid for t in source])
+        habitats = pandas.DataFrame.from_records(
+            [
+                (t.taxonid, h['code'], h['season'], h['suitability'], h['majorimportance'])
+                for t in source for h in t.habitats
+                ],
+            columns=columns
+            )
+    habitats = habitats.loc[habitats.code.notna()]
+    return taxonids, habitats.assign(code=habitats.code.astype(str))
+
+
+def _fixHabitats(habitats):
+    """Internal: assign default values to missing season, suitability and majorimportance"""
+    return habitats.fillna(HABITAT_DEFAULTS)
+
+
+def _filterMask(habitats, habitatFilters):
+    """Internal: boolean mask of the habitat rows passing habitatFilters"""
+    mask = numpy.ones(len(habitats), dtype=bool)
+    if habitatFilters is None:
+        return mask
+    if habitatFilters.season is not None:
+        mask &= habitats.season.isin(habitatFilters.season).to_numpy()
+    if habitatFilters.suitability is not None:
+        mask &= habitats.suitability.isin(habitatFilters.suitability).to_numpy()
+    if habitatFilters.majorImportance is not None:
+        mask &= habitats.majorimportance.isin(habitatFilters.majorImportance).to_numpy()
+    return mask
+
+
+def _rollUp(codes, level):
+    """Internal: map unique codes to their codes at level (as pairs of arrays)
+
+    Only the distinct codes go through IUCNHabitatCodes_v3_1.toLevel, so the
+    cost does not grow with the number of habitat rows.
+    """
+    HC = IUCNHabitatCodes_v3_1()
+    pairs = [(c, l) for c in codes for l in HC.toLevel(c, level)]
+    return numpy.array([p[0] for p in pairs], dtype=object), numpy.array([p[1] for p in pairs], dtype=object)
+
+
+def _codeOrder(codes):
+    """Internal: sort codes in hierarchy order, unknown codes last"""
+    order = {c: i for i, c in enumerate(IUCNHabitatCodes_v3_1().codes)}
+    return sorted(codes, key=lambda c: (order.get(c, len(order)), c))
+
+
+@instrumentation.timed('factory.habitat_matrix')
+def HabitatMatrixFactory(source, habitatFilters = None, level = None, fixHabitats = True):
+    """A Factory for HabitatMatrix objects
+
+    Builds the sparse taxa x habitat codes matrix of a whole batch source (or
+    of a list of Taxon objects) with vectorised operations. Requires scipy.
+
+        Args:
+            source: A batch source (dict or folder, see loadBatchSource) or a
+                list of Taxon objects. Rows follow the assessments table or
+                the list order; taxa without habitats have empty rows.
+            habitatFilters: A HabitatFilters object or template name (or None).
+            level (int): Roll codes up (or down) to level 1, 2 or 3 with
+                IUCNHabitatCodes_v3_1.toLevel. None keeps the codes as they are.
+            fixHabitats (bool): Assign default values to missing season,
+                suitability and majorimportance, as Taxon.fix('habitats').
+
+        Returns:
+            HabitatMatrix: Columns are the codes present, in hierarchy order.
+
+        Examples:
+            HabitatMatrixFactory('redlist_2023_1/', 'kba_breeding')
+            HabitatMatrixFactory(source, HabitatFilters(season = ('Resident',)), level = 1)
+            HabitatMatrixFactory([taxon1, taxon2], level = 2)
+    """
+    import scipy.sparse
+
+    if isinstance(source, str):
+        from .TaxonFactories import loadBatchSource
+        source = loadBatchSource(source, tables = ('assessments', 'habitats'))
+    if habitatFilters is not None and not isinstance(habitatFilters, HabitatFilters):
+        habitatFilters = HabitatFiltersFactory(template = habitatFilters)
+
+    taxonids, habitats = _habitatsFrame(source)
+    if fixHabitats:
+        habitats = _fixHabitats(habitats)
+    habitats = habitats.loc[_filterMask(habitats, habitatFilters)]
+
+    # encode taxa as rows (habitats of taxa missing from the rows are dropped)
+    rows = pandas.Index(taxonids).get_indexer(habitats.taxonid.to_numpy())
+    keep = rows >= 0
+    rows = rows[keep]
+    codes, inverse = numpy.unique(habitats.code.to_numpy()[keep].astype(str), return_inverse=True)
+
+    # roll up: expand each (row, code) through the code -> level code pairs
+    if level is not None:
+        if level not in (1, 2, 3):
+            raise ValueError('Invalid level')
+        fromCodes, toCodes = _rollUp(codes.tolist(), level)
+        fromIndex = pandas.Index(codes).get_indexer(fromCodes)
+        # pairs are grouped by source code, so each code owns a contiguous slice
+        starts = numpy.searchsorted(fromIndex, numpy.arange(len(codes)))
+        counts = numpy.bincount(fromIndex, minlength=len(codes))
+        repeat = counts[inverse]
+        offsets = numpy.arange(repeat.sum()) - numpy.repeat(numpy.cumsum(repeat) - repeat, repeat)
+        rows = numpy.repeat(rows, repeat)
+        codes, inverse = numpy.unique(toCodes[numpy.repeat(starts[inverse], repeat) + offsets].astype(str), return_inverse=True)
+
+    # columns in hierarchy order
+    columns = _codeOrder(codes.tolist())
+    cols = pandas.Index(columns).get_indexer(codes)[inverse]
+
+    matrix = scipy.sparse.csr_matrix(
+        (numpy.ones(len(rows), dtype=bool), (rows, cols)),
+        shape=(len(taxonids), len(columns)),
+        dtype=bool
+        )
+    # duplicate (row, column) pairs are summed on construction
+    matrix.sum_duplicates()
+    return HabitatMatrix(
+        matrix   = matrix,
+        taxonids = taxonids.tolist(),
+        codes    = columns,
+        level    = level
+        )
+
+
+# HIC SVNT DRACONES
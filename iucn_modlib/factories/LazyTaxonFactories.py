@@ -0,0 +1,260 @@
+#!/usr/bin/python3
+
+import math
+import sqlite3
+
+import numpy
+
+from ..classes.LazyTaxon import LazyTaxon, FIELD_GROUPS
+from ..batch.NameIndex import batchNameIndex
+from ..batch.SourceIndex import sourceIndex
+from .. import instrumentation
+
+
+# Taxon field: assessments column (as read by TaxonFactoryRedListBatch)
+_ASSESSMENT_COLUMNS = {
+    'scientific_name':  'scientificName',
+    'published_year':   'yearPublished',
+    'assessment_date':  'assessmentDate',
+    'category':         'redlistCategory',
+    'criteria':         'redlistCriteria',
+    'population_trend': 'populationTrend'
+    }
+
+_TAXONOMY_COLUMNS = {
+    'kingdom':   'kingdomName',
+    'phylum':    'phylumName',
+    'class_':    'className',
+    'order':     'orderName',
+    'family':    'familyName',
+    'genus':     'genusName',
+    'authority': 'authority'
+    }
+
+_RANGE_COLUMNS = {
+    'aoo_km2': 'AOO.range',
+    'eoo_km2': 'EOO.range'
+    }
+
+_LIMIT_COLUMNS = {
+    'elevation_upper': 'ElevationUpper.limit',
+    'elevation_lower': 'ElevationLower.limit',
+    'depth_upper':     'DepthUpper.limit',
+    'depth_lower':     'DepthLower.limit'
+    }
+
+
+def _firstRows(table):
+    """Internal: {taxon ID: position of its first row} of a batch table"""
+    ids, first = numpy.unique(table.internalTaxonId.to_numpy(), return_index=True)
+    return dict(zip(ids.tolist(), first.tolist()))
+
+
+def batchLazyIndex(source):
+    """Return the lazy taxon index of a batch source
+
+    The index is built once per batch source, and stored in it (see
+    sourceIndex: it is rebuilt if the source's tables are replaced). It
+    holds, for each table, the position of the first row of each taxon (the
+    row TaxonFactoryRedListBatch reads). The row positions of each taxon in
+    the habitats table are indexed on the first habitats access. Table
+    columns are converted to lists on first use, and kept in the index.
+
+        Args:
+            source (dict): A batch source, as returned by loadBatchSource.
+
+        Returns:
+            dict: The index.
+    """
+    def build():
+        commonNames = source['common_names'].loc[source['common_names'].main == True].reset_index(drop=True)
+        index = {
+            'tables': {
+                'assessments': source['assessments'],
+                'taxonomy': source['taxonomy'],
+                'all_other_fields': source['all_other_fields'],
+                'common_names': commonNames
+                },
+            'columns': {},
+            'habitats_table': source['habitats']
+            }
+        for name, table in index['tables'].items():
+            index[name] = _firstRows(table)
+        return index
+    return sourceIndex(source, 'lazy_index', ['assessments', 'taxonomy', 'all_other_fields', 'common_names', 'habitats'], build)
+
+
+def _habitatsIndex(index):
+    """Internal: the habitats part of a lazy taxon index, built on first use
+
+    Holds the (start, stop) positions of each taxon's rows in the habitats
+    table sorted by taxon ID, the sort order, and the table columns as lists.
+    """
+    if 'habitats' not in index:
+        table = index['habitats_table']
+        taxonids = table.taxonid.to_numpy()
+        order = numpy.argsort(taxonids, kind='stable')
+        ids, starts, counts = numpy.unique(taxonids[order], return_index=True, return_counts=True)
+        index['habitat_order'] = order
+        index['habitat_columns'] = {c: table[c].tolist() for c in table.columns}
+        # set last: other threads use the habitats index once it is set
+        index['habitats'] = dict(zip(ids.tolist(), zip(starts.tolist(), (starts + counts).tolist())))
+    return index
+
+
+class _BatchLoader:
+    """Internal: loads LazyTaxon field groups from a batch source"""
+
+    def __init__(self, source):
+        self.index = batchLazyIndex(source)
+
+    def _value(self, table, taxonid, column, missing = ''):
+        """A column value of a taxon's first row in table (missing if the taxon has no row)"""
+        row = self.index[table].get(taxonid)
+        if row is None:
+            return missing
+        columns = self.index['columns']
+        if (table, column) not in columns:
+            columns[(table, column)] = self.index['tables'][table][column].tolist()
+        return columns[(table, column)][row]
+
+    def load(self, taxonid, group):
+        instrumentation.count(f'lazy.{group}')
+        if group == 'assessment':
+            values = {k: self._value('assessments', taxonid, c) for k, c in _ASSESSMENT_COLUMNS.items()}
+            systems = self._value('assessments', taxonid, 'systems')
+            systems = systems if isinstance(systems, str) else ''
+            for system in ('Marine', 'Freshwater', 'Terrestrial'):
+                values[f'{system.lower()}_system'] = systems.find(system) != -1
+            return values
+        if group == 'taxonomy':
+            return {k: self._value('taxonomy', taxonid, c) for k, c in _TAXONOMY_COLUMNS.items()}
+        if group == 'common_names':
+            return {'main_common_name': self._value('common_names', taxonid, 'name')}
+        if group == 'other_fields':
+            values = {k: self._value('all_other_fields', taxonid, c) for k, c in _RANGE_COLUMNS.items()}
+            for k, c in _LIMIT_COLUMNS.items():
+                v = self._value('all_other_fields', taxonid, c, None)
+                values[k] = int(v) if v is not None and not math.isnan(v) else None
+            return values
+        if group == 'unavailable':
+            return {k: 'AOH modeller: not available in batch' for k in FIELD_GROUPS['unavailable']}
+        # habitats
+        index = _habitatsIndex(self.index)
+        start, stop = index['habitats'].get(taxonid, (0, 0))
+        rows = index['habitat_order'][start:stop].tolist()
+        columns = index['habitat_columns']
+        return {'habitats': [{c: values[r] for c, values in columns.items()} for r in rows]}
+
+
+class _SQLiteLoader:
+    """Internal: loads LazyTaxon field groups from a SQLite mirror
+
+    Scalar fields are all loaded with the first group read: a species row
+    costs one indexed query.
+    """
+
+    def __init__(self, con):
+        self.con = con
+
+    def load(self, taxonid, group):
+        instrumentation.count(f'lazy.{group}')
+        if group == 'habitats':
+            cur = self.con.execute('SELECT * FROM iucn_habitats WHERE taxonid = ? ORDER BY rowid', (taxonid,))
+            columns = [d[0] for d in cur.description]
+            return {'habitats': [dict(zip(columns, h)) for h in cur.fetchall()]}
+        cur = self.con.execute('SELECT * FROM iucn_species WHERE taxonid = ?', (taxonid,))
+        values = dict(zip([d[0] for d in cur.description], cur.fetchone()))
+        values['class_'] = values.pop('class')
+        del values['taxonid']
+        # SQLite stores booleans as integers
+        for system in ('marine_system', 'freshwater_system', 'terrestrial_system'):
+            if values[system] is not None:
+                values[system] = bool(values[system])
+        return values
+
+
+def _loader(source):
+    """Internal: the loader and taxon ID resolver of a source"""
+    if isinstance(source, sqlite3.Connection):
+        def taxonid(species):
+            try:
+                found = source.execute('SELECT taxonid FROM iucn_species WHERE taxonid = ?', (int(species),)).fetchone()
+            except (TypeError, ValueError):
+                found = source.execute('SELECT taxonid FROM iucn_species WHERE scientific_name = ? LIMIT 1', (species,)).fetchone()
+            return found[0] if found is not None else None
+        return _SQLiteLoader(source), taxonid
+
+    if not isinstance(source, dict):
+        from .TaxonFactories import loadBatchSource
+        source = loadBatchSource(source)
+    loader = _BatchLoader(source)
+
+    def taxonid(species):
+        try:
+            taxonid = int(species)
+        except (TypeError, ValueError):
+            return batchNameIndex(source).get(species)
+        return taxonid if taxonid in loader.index['assessments'] else None
+    return loader, taxonid
+
+
+def LazyTaxonFactory(species, source, fixElevation = True, fixHabitats = True):
+    """A Factory for LazyTaxon objects
+
+    Given a species numeric ID or scientific binomial, returns a LazyTaxon
+    that loads its fields from the source on first access (see LazyTaxon).
+    Field values are those of TaxonFactoryRedListBatch (or
+    TaxonFactorySQLite).
+
+        Args:
+            species: A taxon ID or scientific name.
+            source: A batch source (dict, folder or zip archive, see
+                loadBatchSource) or a SQLite mirror connection (see
+                openBatchSQLite).
+            fixElevation, fixHabitats (bool): Apply the fixes when the
+                elevations and the habitats are loaded.
+
+        Returns:
+            LazyTaxon: The taxon.
+    """
+    loader, resolve = _loader(source)
+    taxonid = resolve(species)
+    if taxonid is None:
+        raise ValueError(f"Species '{species}' not found in the source.")
+    return LazyTaxon(taxonid, loader, fixElevation, fixHabitats)
+
+
+def lazyTaxa(source, taxa = None, fixElevation = True, fixHabitats = True):
+    """Yield LazyTaxon objects of all the taxa of a source, or of taxa
+
+    Iterating over all taxa of a source only costs the fields that are read.
+
+        Args:
+            source: A batch source or SQLite mirror connection (see
+                LazyTaxonFactory).
+            taxa (list): Taxon IDs or scientific names. Defaults to all taxa
+                of the source, in assessments table (or taxon ID) order.
+
+        Examples:
+            for taxon in lazyTaxa(source):
+                if taxon.elevation_upper < 500:
+                    taxon.habitatCodes(filters)
+    """
+    loader, resolve = _loader(source)
+    if taxa is None:
+        if isinstance(loader, _SQLiteLoader):
+            taxa = [r[0] for r in loader.con.execute('SELECT taxonid FROM iucn_species ORDER BY taxonid')]
+        else:
+            taxa = loader.index['tables']['assessments'].internalTaxonId.drop_duplicates().tolist()
+        for taxonid in taxa:
+            yield LazyTaxon(taxonid, loader, fixElevation, fixHabitats)
+        return
+    for species in taxa:
+        taxonid = resolve(species)
+        if taxonid is None:
+            raise ValueError(f"Species '{species}' not found in the source.")
+        yield LazyTaxon(taxonid, loader, fixElevation, fixHabitats)
+
+
+# HIC SVNT DRACONES
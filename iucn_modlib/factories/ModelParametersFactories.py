@@ -0,0 +1,92 @@
+#!/usr/bin/python3
+
+from ..classes.ModelParameters import ModelParameters
+from ..classes.HabitatFilters import HabitatFilters
+from ..classes.ParameterCache import taxonInputHash, parameterKey
+from dataclasses import asdict
+from .HabitatFiltersFactories import HabitatFiltersFactory
+from .. import translator as translators
+from .. import instrumentation
+
+
+def TranslatorFactory(translator = None):
+    """A Factory for translator functions
+
+    'jung':   iucn_modlib.translator.toJung
+    'esacci': iucn_modlib.translator.toESACCI
+    None:     no translation, an empty list is returned
+
+    Any other crosswalk registered with iucn_modlib.translator.registerCrosswalk
+    is available by name.
+    """
+
+    def none(codes):
+        return []
+
+    def unsupported():
+        names = [k for k in switcher.keys() if k is not None]
+        names += [k for k in translators.crosswalkNames() if k not in switcher]
+        raise ValueError(f"""Supported translators are: '{"', '".join(names)}'""")
+
+    switcher={
+        'jung':   translators.toJung,
+        'esacci': translators.toESACCI,
+        None:     none
+        }
+
+    if translator not in switcher:
+        if translator in translators.crosswalkNames():
+            return translators.getCrosswalk(translator).translate
+        unsupported()
+    return switcher[translator]
+
+
+@instrumentation.timed('factory.model_parameters')
+def ModelParametersFactory(taxon, habitatFilters = None, translator = None, cache = None):
+    """A Factory for ModelParameters objects
+
+    Given a (fixed) Taxon object, a habitat filters object or template name,
+    and a translator name, extracts the taxon's model parameters.
+    If a ParameterCache is provided, parameters are looked up in it first, and
+    stored in it when computed.
+
+    Examples:
+        ModelParametersFactory(taxon, 'kba_breeding', 'jung')
+        ModelParametersFactory(taxon, HabitatFilters(season = ('Resident',)), 'esacci')
+        ModelParametersFactory(taxon, 'kba_breeding', 'jung', cache = ParameterCache('cache.sqlite'))
+    """
+
+    # look up cache
+    if cache is not None:
+        key = parameterKey(taxonInputHash(taxon), habitatFilters, translator)
+        value = cache.get(key)
+        if value is not None:
+            return ModelParameters(**value)
+
+    # resolve habitat filters
+    if habitatFilters is None or isinstance(habitatFilters, HabitatFilters):
+        filterName = 'custom' if habitatFilters is not None else None
+    else:
+        filterName = habitatFilters
+        habitatFilters = HabitatFiltersFactory(template = habitatFilters)
+
+    # extract parameters
+    codes = taxon.habitatCodes(habitatFilters = habitatFilters)
+    params = ModelParameters(
+        taxonid          = taxon.taxonid,
+        scientific_name  = taxon.scientific_name,
+        habitat_filter   = filterName,
+        translator       = translator,
+        elevation_lower  = taxon.elevation_lower,
+        elevation_upper  = taxon.elevation_upper,
+        habitat_codes    = codes,
+        land_cover_codes = sorted(TranslatorFactory(translator)(codes))
+        )
+
+    # store in cache
+    if cache is not None:
+        cache.put(key, asdict(params))
+    return params
+
+
+# HIC SVNT DRACONES
@@ -1,11 +1,22 @@
 #!/usr/bin/python3
 
 from ..classes.Taxon import Taxon
+from ..classes.RedListAPIJsonBundle import RedListAPIJsonBundle
+from ..classes.TaxonCache import taxonCache, sourceIdentity
+from ..batch.NameIndex import batchNameIndex
 from .. import redlist_api
+from .. import instrumentation
+import contextlib
+import functools
+import hashlib
+import inspect
 import json
 import pandas
 import numpy
 import os
+import sqlite3
+import threading
+import zipfile
 
 
 def unwrap(val, key):
@@ -15,6 +26,38 @@ def unwrap(val, key):
         return ""
 
 
+def cachedFactory(identity):
+    """Decorator: adds an optional TaxonCache (cache argument) to a taxon factory
+
+    identity is a function of the factory's bound arguments returning the
+    source identity and the requested species (see TaxonCache). On a hit the
+    factory is not called. cache defaults to the cache set with
+    setTaxonCache; cache = False disables caching. Sources without a stable
+    identity (see sourceIdentity) are not cached.
+    """
+    def decorator(func):
+        signature = inspect.signature(func)
+
+        @functools.wraps(func)
+        def wrapper(*args, cache = None, **kwargs):
+            cache = taxonCache(cache)
+            if cache is None:
+                return func(*args, **kwargs)
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            source, species = identity(bound.arguments)
+            if any(part is None for part in source):
+                return func(*args, **kwargs)
+            return cache.fetch(
+                source, species, bound.arguments['fixElevation'], bound.arguments['fixHabitats'],
+                lambda: func(*args, **kwargs)
+                )
+        return wrapper
+    return decorator
+
+
+@cachedFactory(lambda a: (('api', redlist_api.v3.BASE_URL), a['sp']))
+@instrumentation.timed('factory.api')
 def TaxonFactoryRedListAPI(
         sp, token,
         fixElevation = True, fixHabitats = True
@@ -36,66 +79,13 @@ def TaxonFactoryRedListAPI(
         tax_hab = redlist_api.v3.name_to_habitats(sp, token)
     else:
         raise TypeError('sp must be a string or integer')
-    
-    # Validate api call results
-    if 'message' in tax_ass:
-        raise ValueError(tax_ass['message'])
-    if 'message' in tax_hab:
-        raise ValueError(tax_hab['message'])
-    if 'result' not in tax_ass:
-        raise ValueError('assessment api call did not return a result.')
-    elif len(tax_ass['result']) == 0:
-        raise ValueError('assessment api call returned an empty result.')
-    if 'result' not in tax_hab:
-        raise ValueError('habitats api call did not return a result.')
-    elif len(tax_hab['result']) == 0:
-        raise ValueError('habitats api call returned an empty result.')
-
-    # Compile Taxon Object
-    tax = Taxon(
-        taxonid            = tax_ass['result'][0]['taxonid'],
-        scientific_name    = tax_ass['result'][0]['scientific_name'],
-        kingdom            = tax_ass['result'][0]['kingdom'],
-        phylum             = tax_ass['result'][0]['phylum'],
-        class_             = tax_ass['result'][0]['class'],
-        order              = tax_ass['result'][0]['order'],
-        family             = tax_ass['result'][0]['family'],
-        genus              = tax_ass['result'][0]['genus'],
-        main_common_name   = tax_ass['result'][0]['main_common_name'],
-        authority          = tax_ass['result'][0]['authority'],
-        published_year     = tax_ass['result'][0]['published_year'],
-        assessment_date    = tax_ass['result'][0]['assessment_date'],
-        category           = tax_ass['result'][0]['category'],
-        criteria           = tax_ass['result'][0]['criteria'],
-        population_trend   = tax_ass['result'][0]['population_trend'],
-        marine_system      = tax_ass['result'][0]['marine_system'],
-        freshwater_system  = tax_ass['result'][0]['freshwater_system'],
-        terrestrial_system = tax_ass['result'][0]['terrestrial_system'],
-        assessor           = tax_ass['result'][0]['assessor'],
-        reviewer           = tax_ass['result'][0]['reviewer'],
-        aoo_km2            = tax_ass['result'][0]['aoo_km2'],
-        eoo_km2            = tax_ass['result'][0]['eoo_km2'],
-        elevation_upper    = tax_ass['result'][0]['elevation_upper'],
-        elevation_lower    = tax_ass['result'][0]['elevation_lower'],
-        depth_upper        = tax_ass['result'][0]['depth_upper'],
-        depth_lower        = tax_ass['result'][0]['depth_lower'],
-        errata_flag        = tax_ass['result'][0]['errata_flag'],
-        errata_reason      = tax_ass['result'][0]['errata_reason'],
-        amended_flag       = tax_ass['result'][0]['amended_flag'],
-        amended_reason     = tax_ass['result'][0]['amended_reason'],
-        habitats           = tax_hab['result']
-    )
-    
-    # fix
-    if fixElevation:
-        tax.fix(fixType = 'elevation')
-    if fixHabitats:
-        tax.fix(fixType = 'habitats')
 
     # return
-    return tax
+    return taxonFromAPIResults(tax_ass, tax_hab, fixElevation, fixHabitats)
 
 
+@cachedFactory(lambda a: (('jsons', sourceIdentity(a['assessmentJSON']), sourceIdentity(a['habitatsJSON'])), None))
+@instrumentation.timed('factory.api_jsons')
 def TaxonFactoryRedListAPIJsons(
         assessmentJSON, habitatsJSON,
         fixElevation = True, fixHabitats = True
@@ -112,7 +102,37 @@ def TaxonFactoryRedListAPIJsons(
     with open(habitatsJSON) as f:
         tax_hab = json.load(f)
 
-    # Validate api call results (from saved jsons)
+    # return
+    return taxonFromAPIResults(tax_ass, tax_hab, fixElevation, fixHabitats)
+
+
+@cachedFactory(lambda a: (('bundle', sourceIdentity(a['bundle'])), a['species']))
+@instrumentation.timed('factory.api_json_bundle')
+def TaxonFactoryRedListAPIJsonBundle(
+        species, bundle,
+        fixElevation = True, fixHabitats = True
+        ):
+    """A Factory for Taxon objects from a bundle of Red List API responses
+
+    Given a species numeric ID or scientific binomial and a bundle (a path or
+    an open RedListAPIJsonBundle), constructs a Taxon object. Only the
+    requested record is parsed.
+    """
+
+    # determine bundle type
+    if isinstance(bundle, RedListAPIJsonBundle):
+        tax_ass, tax_hab = bundle.record(species)
+    else:
+        with RedListAPIJsonBundle(bundle) as b:
+            tax_ass, tax_hab = b.record(species)
+
+    # return
+    return taxonFromAPIResults(tax_ass, tax_hab, fixElevation, fixHabitats)
+
+
+def validateAPIResults(tax_ass, tax_hab):
+    '''Helper function to validate assessment and habitats API responses
+    '''
     if 'message' in tax_ass:
         raise ValueError(tax_ass['message'])
     if 'message' in tax_hab:
@@ -126,6 +146,17 @@ def TaxonFactoryRedListAPIJsons(
     elif len(tax_hab['result']) == 0:
         raise ValueError('habitats api call returned an empty result.')
 
+
+def taxonFromAPIResults(tax_ass, tax_hab, fixElevation = True, fixHabitats = True):
+    '''Helper function for the Red List API factories
+
+    Validates the assessment and habitats API responses (live or saved) and
+    compiles them into a Taxon object.
+    '''
+
+    # Validate api call results
+    validateAPIResults(tax_ass, tax_hab)
+
     # Compile Taxon Object
     tax = Taxon(
         taxonid            = tax_ass['result'][0]['taxonid'],
@@ -171,23 +202,27 @@ def TaxonFactoryRedListAPIJsons(
     return tax
 
 
-def loadBatchSource(path):
-    '''Helper function for TaxonFactoryRedListBatch
-    '''
+# Batch download tables: name: (file, read_csv options)
+# habitat codes are read as text: parsed as numbers, '5.10' would become 5.1
+BATCH_TABLES = {
+    'assessments':      ('assessments.csv', {}),
+    'taxonomy':         ('taxonomy.csv', {}),
+    'habitats':         ('habitats.csv', {'dtype': {'code': str}}),
+    'all_other_fields': ('all_other_fields.csv', {}),
+    'common_names':     ('common_names.csv', {})
+    }
 
-    # load assessment table
-    assessments = pandas.read_csv(os.path.join(path,'assessments.csv'), low_memory = False)
-    # load taxonomy table
-    taxonomy = pandas.read_csv(os.path.join(path,'taxonomy.csv'), low_memory = False)
-    
-    # load and fix habitats table
+
+def _fixBatchHabitats(habitats):
+    """Internal: normalise a batch habitats table to the API vocabulary"""
     # the batch downwlod files are not as clean as API data, so ad-hoc fixes are needed
-    habitats = pandas.read_csv(os.path.join(path,'habitats.csv'), low_memory = False)
-    habitats.loc[habitats.season == 'passage', 'season'] = 'Passage'
-    habitats.loc[habitats.season == 'resident', 'season'] = 'Resident'
-    habitats.loc[habitats.season == 'breeding', 'season'] = 'Breeding Season'
-    habitats.loc[habitats.season == 'non-breeding', 'season'] = 'Non-Breeding Season'
-    habitats.loc[habitats.season == 'unknown', 'season'] = 'Seasonal Occurrence Unknown'
+    habitats['season'] = habitats.season.replace({
+        'passage': 'Passage',
+        'resident': 'Resident',
+        'breeding': 'Breeding Season',
+        'non-breeding': 'Non-Breeding Season',
+        'unknown': 'Seasonal Occurrence Unknown'
+        })
     habitats.rename(columns={
         'assessmentId': 'assid',
         'internalTaxonId': 'taxonid',
@@ -199,43 +234,202 @@ def loadBatchSource(path):
         'suitability': 'suitability'},
         inplace=True
         )
+    return habitats
 
-    # load all_other_fields table
-    all_other_fields = pandas.read_csv(os.path.join(path,'all_other_fields.csv'), low_memory = False)
 
-    # load common_names table
-    common_names = pandas.read_csv(os.path.join(path,'common_names.csv'), low_memory = False)
-    
-    # Return
-    return {
-        'assessments': assessments,
-        'taxonomy': taxonomy,
-        'habitats': habitats,
-        'all_other_fields': all_other_fields,
-        'common_names': common_names
+# Post-processing of each table, run as soon as the table is parsed
+_BATCH_FIXES = {
+    'habitats': _fixBatchHabitats
+    }
+
+
+def _csvEngine(engine):
+    """Internal: resolve the read_csv engine ('auto' uses pyarrow if installed)"""
+    def auto():
+        try:
+            import pyarrow  # noqa: F401
+            return 'pyarrow'
+        except ImportError:
+            return 'c'
+
+    def unsupported():
+        raise ValueError(f"""Supported engines are: '{"', '".join(switcher.keys())}'""")
+
+    switcher = {
+        'auto':    auto,
+        'c':       lambda: 'c',
+        'pyarrow': lambda: 'pyarrow'
         }
+    return switcher.get(engine, unsupported)()
+
+
+# Version of the parsed table cache format; changes invalidate cached tables
+_TABLE_CACHE_VERSION = 1
+
+
+def _batchFiles(path, tables):
+    """Internal: {table: (zip member, fingerprint, size)} of a batch folder or zip archive
+
+    Zip members are found by file name, at any depth, and fingerprinted by
+    their CRC-32 and size, read from the archive's central directory. Folder
+    files (member None) are fingerprinted by their size and modification time.
+    """
+    files = {}
+    if zipfile.is_zipfile(path):
+        with zipfile.ZipFile(path) as z:
+            members = {os.path.basename(i.filename): i for i in z.infolist() if not i.is_dir()}
+        for name in tables:
+            filename = BATCH_TABLES[name][0]
+            if filename not in members:
+                raise FileNotFoundError(f'{path} has no {filename} member.')
+            info = members[filename]
+            files[name] = (info.filename, f'{info.CRC:08x}-{info.file_size}', info.file_size)
+    else:
+        for name in tables:
+            try:
+                stat = os.stat(os.path.join(path, BATCH_TABLES[name][0]))
+                files[name] = (None, f'{stat.st_size}-{stat.st_mtime_ns}', stat.st_size)
+            except OSError:
+                # read_csv raises the error
+                files[name] = (None, None, 0)
+    return files
+
+
+def _tableCachePath(cacheDir, name, fingerprint, engine):
+    # the key covers everything the parsed table depends on: the parser
+    # (engines can infer different dtypes) and the pandas version (pickles
+    # are not portable across versions), as caches can be shared by nodes
+    parser = [engine, pandas.__version__]
+    if engine == 'pyarrow':
+        import pyarrow
+        parser.append(pyarrow.__version__)
+    key = hashlib.sha256(json.dumps([_TABLE_CACHE_VERSION, name, BATCH_TABLES[name][0], fingerprint, parser]).encode()).hexdigest()
+    return os.path.join(cacheDir, f'{name}-{key[:24]}.pkl')
+
+
+def _readBatchTable(path, name, engine, member = None, fingerprint = None, cacheDir = None):
+    """Internal: parse and post-process one batch table
+
+    If path is a zip archive, member is the table's member, which is
+    streamed into the parser. With a cacheDir, the parsed table is read
+    from, or written to, the cache under its fingerprint.
+    """
+    cachePath = _tableCachePath(cacheDir, name, fingerprint, engine) if cacheDir is not None and fingerprint is not None else None
+    if cachePath is not None and os.path.exists(cachePath):
+        with instrumentation.stage(f'batch.cache.{name}'):
+            return pandas.read_pickle(cachePath)
+
+    filename, options = BATCH_TABLES[name]
+    options = dict(options, engine = engine)
+    if engine == 'c':
+        options['low_memory'] = False
+    with instrumentation.stage(f'batch.read.{name}'):
+        if member is not None:
+            with zipfile.ZipFile(path) as z, z.open(member) as f:
+                table = pandas.read_csv(f, **options)
+        else:
+            table = pandas.read_csv(os.path.join(path, filename), **options)
+    if name in _BATCH_FIXES:
+        table = _BATCH_FIXES[name](table)
 
+    if cachePath is not None:
+        os.makedirs(cacheDir, exist_ok=True)
+        # written under a temporary name, so that concurrent readers never see partial files
+        temporary = f'{cachePath}.{os.getpid()}.{threading.get_ident()}.tmp'
+        table.to_pickle(temporary)
+        os.replace(temporary, cachePath)
+    return table
 
-def TaxonFactoryRedListBatch(species, source, fixElevation = True, fixHabitats = True):
+
+@instrumentation.timed('batch.load')
+def loadBatchSource(path, fingerprints = False, workers = None, engine = 'c', tables = None, cacheDir = None):
+    '''Helper function for TaxonFactoryRedListBatch
+
+    path is a batch download folder, or the zip archive of a batch download:
+    members are then streamed from the archive into the parser, without
+    extracting them, and only the members of the needed tables are read.
+
+    The batch tables are parsed concurrently, on up to workers threads
+    (default: one per table; 1 parses them in turn), and each table is
+    post-processed as soon as it is parsed. engine is the pandas read_csv
+    engine: 'c', 'pyarrow' (multithreaded, requires pyarrow) or 'auto'
+    (pyarrow if installed).
+
+    tables restricts the source to some of the tables (names as in
+    BATCH_TABLES); TaxonFactoryRedListBatch needs all of them.
+
+    With a cacheDir, parsed tables are cached there (as pickle files, so
+    only use trusted folders), keyed by a fingerprint of their file: the
+    CRC-32 and size of zip members, or the size and modification time of
+    files, and by the parser engine and pandas version. A cache shared
+    between nodes makes cold starts from the same archive much faster.
+
+    If fingerprints is True, per-taxon content fingerprints are computed
+    and stored in the source, under 'fingerprints' (see batchFingerprints).
+    '''
+    engine = _csvEngine(engine)
+    tables = list(BATCH_TABLES) if tables is None else [t for t in BATCH_TABLES if t in tables]
+    if len(tables) == 0:
+        raise ValueError(f"""Supported tables are: '{"', '".join(BATCH_TABLES)}'""")
+    files = _batchFiles(path, tables)
+    workers = len(tables) if workers is None else max(1, min(workers, len(tables)))
+
+    def read(name):
+        return _readBatchTable(path, name, engine, files[name][0], files[name][1], cacheDir)
+
+    source = {}
+    if workers == 1:
+        for name in tables:
+            source[name] = read(name)
+    else:
+        from concurrent.futures import ThreadPoolExecutor, as_completed
+        # the largest tables are submitted first
+        names = sorted(tables, key=lambda n: -files[n][2])
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='batch-read') as pool:
+            futures = {pool.submit(read, name): name for name in names}
+            for future in as_completed(futures):
+                source[futures[future]] = future.result()
+    # keep the table order of the source dict
+    source = {name: source[name] for name in tables}
+
+    # compute fingerprints
+    if fingerprints:
+        from ..batch.Fingerprints import batchFingerprints
+        with instrumentation.stage('batch.fingerprints'):
+            source['fingerprints'] = batchFingerprints(source)
+
+    # Return
+    return source
+
+
+@cachedFactory(lambda a: (('batch', sourceIdentity(a['source'])), a['species']))
+@instrumentation.timed('factory.batch')
+def TaxonFactoryRedListBatch(species, source, fixElevation = True, fixHabitats = True, cacheDir = None):
     """A Factory for Taxon objects
 
     Given a species numeric ID or scientific binomial,
     pulls data from a Red List batch download folder.
+    If source is a folder or zip archive rather than a loaded source, it is
+    loaded on each call: cacheDir (see loadBatchSource) makes that cheaper.
     """
     # determine source type
     if type(source) != dict:
-        source = loadBatchSource(source)
+        source = loadBatchSource(source, cacheDir = cacheDir)
     # defind ids
     try:
         taxid = int(species)
-    except:
-        taxid = source['assessments'].loc[source['assessments'].scientificName == species, 'internalTaxonId'].values[0]
+    except (TypeError, ValueError):
+        taxid = batchNameIndex(source).get(species)
+        if taxid is None:
+            raise ValueError(f"Species '{species}' not found in the batch source.")
     # filter tables
-    assessments = source['assessments'].loc[source['assessments'].internalTaxonId == taxid]
-    taxonomy = source['taxonomy'].loc[source['taxonomy'].internalTaxonId == taxid]
-    habitats = source['habitats'].loc[source['habitats'].taxonid == taxid]
-    all_other_fields = source['all_other_fields'].loc[source['all_other_fields'].internalTaxonId == taxid]
-    common_names = source['common_names'].loc[source['common_names'].internalTaxonId == taxid].loc[source['common_names'].main == True]
+    instrumentation.count('taxa.batch')
+    with instrumentation.stage('batch.filter'):
+        assessments = source['assessments'].loc[source['assessments'].internalTaxonId == taxid]
+        taxonomy = source['taxonomy'].loc[source['taxonomy'].internalTaxonId == taxid]
+        habitats = source['habitats'].loc[source['habitats'].taxonid == taxid]
+        all_other_fields = source['all_other_fields'].loc[source['all_other_fields'].internalTaxonId == taxid]
+        common_names = source['common_names'].loc[source['common_names'].internalTaxonId == taxid].loc[source['common_names'].main == True]
     # create taxon object
     tax = Taxon(
         taxonid            = assessments['internalTaxonId'].values[0],
@@ -285,6 +479,8 @@ def TaxonFactoryRedListBatch(species, source, fixElevation = True, fixHabitats =
     return tax
 
 
+@cachedFactory(lambda a: (('kbadb', sourceIdentity(a['con'])), a['species']))
+@instrumentation.timed('factory.kbadb')
 def TaxonFactoryKBADB(species, con, fixElevation = True, fixHabitats = True):
     """A Factory for Taxon objects
 
@@ -309,38 +505,96 @@ def TaxonFactoryKBADB(species, con, fixElevation = True, fixHabitats = True):
         habitats = cur.fetchall()
     
     # create taxon object
+    return taxonFromDBRecords(assessment[0], [dict(h) for h in habitats], fixElevation, fixHabitats)
+
+
+@cachedFactory(lambda a: (('sqlite', sourceIdentity(a['con'])), a['species']))
+@instrumentation.timed('factory.sqlite')
+def TaxonFactorySQLite(species, con, fixElevation = True, fixHabitats = True):
+    """A Factory for Taxon objects
+
+    Given a species numeric ID or scientific binomial, pulls data from a
+    SQLite mirror of a batch download (see writeBatchSQLite), or from any
+    SQLite database with the iucn_species and iucn_habitats tables of the
+    KBA database. con is the path of the file, or an open connection (see
+    openBatchSQLite), which is faster when building many taxa.
+    """
+    if isinstance(con, sqlite3.Connection):
+        return _taxonFromSQLite(species, con, fixElevation, fixHabitats)
+    from ..batch.SQLiteMirror import openBatchSQLite
+    with contextlib.closing(openBatchSQLite(con)) as c:
+        return _taxonFromSQLite(species, c, fixElevation, fixHabitats)
+
+
+def _taxonFromSQLite(species, con, fixElevation, fixHabitats):
+    """Internal: TaxonFactorySQLite on an open connection"""
+    # define id
+    try:
+        id = int(species)
+    except (TypeError, ValueError):
+        found = con.execute('SELECT taxonid FROM iucn_species WHERE scientific_name = ? LIMIT 1', (species,)).fetchone()
+        if found is None:
+            raise ValueError(f"Species '{species}' not found in the SQLite source.")
+        id = found[0]
+
+    # collate species record
+    instrumentation.count('taxa.sqlite')
+    with instrumentation.stage('sqlite.query'):
+        cur = con.execute('SELECT * FROM iucn_species WHERE taxonid = ?', (id,))
+        row = cur.fetchone()
+        if row is None:
+            raise ValueError(f"Species '{species}' not found in the SQLite source.")
+        assessment = dict(zip([d[0] for d in cur.description], row))
+        cur = con.execute('SELECT * FROM iucn_habitats WHERE taxonid = ? ORDER BY rowid', (id,))
+        columns = [d[0] for d in cur.description]
+        habitats = [dict(zip(columns, h)) for h in cur.fetchall()]
+    # SQLite stores booleans as integers
+    for system in ('marine_system', 'freshwater_system', 'terrestrial_system'):
+        if assessment[system] is not None:
+            assessment[system] = bool(assessment[system])
+
+    # create taxon object
+    return taxonFromDBRecords(assessment, habitats, fixElevation, fixHabitats)
+
+
+def taxonFromDBRecords(assessment, habitats, fixElevation = True, fixHabitats = True):
+    '''Helper function for the database factories
+
+    Compiles an iucn_species record and its iucn_habitats records (dicts
+    keyed by column name) into a Taxon object.
+    '''
     tax = Taxon(
-        taxonid            = assessment[0]['taxonid'],
-        scientific_name    = assessment[0]['scientific_name'],
-        kingdom            = assessment[0]['kingdom'],
-        phylum             = assessment[0]['phylum'],
-        class_             = assessment[0]['class'],
-        order              = assessment[0]['order'],
-        family             = assessment[0]['family'],
-        genus              = assessment[0]['genus'],
-        main_common_name   = assessment[0]['main_common_name'],
-        authority          = assessment[0]['authority'],
-        published_year     = assessment[0]['published_year'],
-        assessment_date    = assessment[0]['assessment_date'],
-        category           = assessment[0]['category'],
-        criteria           = assessment[0]['criteria'],
-        population_trend   = assessment[0]['population_trend'],
-        marine_system      = assessment[0]['marine_system'],
-        freshwater_system  = assessment[0]['freshwater_system'],
-        terrestrial_system = assessment[0]['terrestrial_system'],
-        assessor           = assessment[0]['assessor'],
-        reviewer           = assessment[0]['reviewer'],
-        aoo_km2            = assessment[0]['aoo_km2'],
-        eoo_km2            = assessment[0]['eoo_km2'],
-        elevation_upper    = assessment[0]['elevation_upper'],
-        elevation_lower    = assessment[0]['elevation_lower'],
-        depth_upper        = assessment[0]['depth_upper'],
-        depth_lower        = assessment[0]['depth_lower'],
-        errata_flag        = assessment[0]['errata_flag'],
-        errata_reason      = assessment[0]['errata_reason'],
-        amended_flag       = assessment[0]['amended_flag'],
-        amended_reason     = assessment[0]['amended_reason'],
-        habitats           = [dict(h) for h in habitats]
+        taxonid            = assessment['taxonid'],
+        scientific_name    = assessment['scientific_name'],
+        kingdom            = assessment['kingdom'],
+        phylum             = assessment['phylum'],
+        class_             = assessment['class'],
+        order              = assessment['order'],
+        family             = assessment['family'],
+        genus              = assessment['genus'],
+        main_common_name   = assessment['main_common_name'],
+        authority          = assessment['authority'],
+        published_year     = assessment['published_year'],
+        assessment_date    = assessment['assessment_date'],
+        category           = assessment['category'],
+        criteria           = assessment['criteria'],
+        population_trend   = assessment['population_trend'],
+        marine_system      = assessment['marine_system'],
+        freshwater_system  = assessment['freshwater_system'],
+        terrestrial_system = assessment['terrestrial_system'],
+        assessor           = assessment['assessor'],
+        reviewer           = assessment['reviewer'],
+        aoo_km2            = assessment['aoo_km2'],
+        eoo_km2            = assessment['eoo_km2'],
+        elevation_upper    = assessment['elevation_upper'],
+        elevation_lower    = assessment['elevation_lower'],
+        depth_upper        = assessment['depth_upper'],
+        depth_lower        = assessment['depth_lower'],
+        errata_flag        = assessment['errata_flag'],
+        errata_reason      = assessment['errata_reason'],
+        amended_flag       = assessment['amended_flag'],
+        amended_reason     = assessment['amended_reason'],
+        habitats           = habitats
     )
     
     # apply fixes
@@ -0,0 +1,214 @@
+#!/usr/bin/python3
+
+"""Opt-in instrumentation
+
+Named stage timers, counters and HTTP request histograms for the factories,
+translators and the Red List API client. Instrumentation is disabled by
+default, and when disabled each instrumented call costs a single flag check.
+
+Enable it with enable(), or by setting the IUCN_MODLIB_INSTRUMENTATION
+environment variable to 1 (useful for worker processes).
+
+Examples:
+    from iucn_modlib import instrumentation
+    instrumentation.enable()
+    ...
+    instrumentation.snapshot()  -> {'stages': {...}, 'counters': {...}, 'requests': {...}}
+    instrumentation.toJSON()
+    instrumentation.reset()
+"""
+
+import functools
+import json
+import os
+import threading
+import time
+
+
+# Upper bounds (seconds) of the HTTP latency histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, float('inf'))
+
+_enabled = os.environ.get('IUCN_MODLIB_INSTRUMENTATION', '0') not in ('', '0')
+_lock = threading.Lock()
+_stages = {}
+_counters = {}
+_requests = {}
+
+
+def enable():
+    global _enabled
+    _enabled = True
+
+
+def disable():
+    global _enabled
+    _enabled = False
+
+
+def isEnabled():
+    return _enabled
+
+
+def reset():
+    """Discard all recorded data"""
+    with _lock:
+        _stages.clear()
+        _counters.clear()
+        _requests.clear()
+
+
+def _recordStage(name, seconds):
+    with _lock:
+        s = _stages.get(name)
+        if s is None:
+            _stages[name] = {'count': 1, 'seconds': seconds, 'min': seconds, 'max': seconds}
+        else:
+            s['count'] += 1
+            s['seconds'] += seconds
+            s['min'] = min(s['min'], seconds)
+            s['max'] = max(s['max'], seconds)
+
+
+class _Stage:
+    __slots__ = ('name', 'start')
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *args):
+        _recordStage(self.name, time.perf_counter() - self.start)
+
+
+class _NoStage:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return None
+
+
+_noStage = _NoStage()
+
+
+def stage(name):
+    """Time a block of code as a named stage
+
+    Example:
+        with instrumentation.stage('batch.read.habitats'):
+            ...
+    """
+    if not _enabled:
+        return _noStage
+    return _Stage(name)
+
+
+def timed(name):
+    """Decorator timing every call of a function as a named stage"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                _recordStage(name, time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+
+def count(name, n = 1):
+    """Increment a named counter"""
+    if not _enabled:
+        return
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + n
+
+
+def observeRequest(endpoint, seconds, status):
+    """Record the latency (seconds) and status of an HTTP request
+
+    status is the HTTP status code, or the exception name if the request
+    failed without a response.
+    """
+    if not _enabled:
+        return
+    with _lock:
+        r = _requests.get(endpoint)
+        if r is None:
+            r = _requests[endpoint] = {
+                'count': 0, 'seconds': 0.0, 'min': seconds, 'max': seconds,
+                'latency': [0] * len(LATENCY_BUCKETS), 'status': {}
+                }
+        r['count'] += 1
+        r['seconds'] += seconds
+        r['min'] = min(r['min'], seconds)
+        r['max'] = max(r['max'], seconds)
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if seconds <= bound:
+                r['latency'][i] += 1
+                break
+        status = str(status)
+        r['status'][status] = r['status'].get(status, 0) + 1
+
+
+def snapshot():
+    """Return a copy of all recorded data as a JSON-serialisable dict
+
+    Request latency histograms are keyed by bucket upper bound (seconds).
+    """
+    with _lock:
+        return {
+            'stages': {k: dict(v) for k, v in _stages.items()},
+            'counters': dict(_counters),
+            'requests': {
+                k: dict(v, latency={str(b): c for b, c in zip(LATENCY_BUCKETS, v['latency'])}, status=dict(v['status']))
+                for k, v in _requests.items()
+                }
+            }
+
+
+def merge(other):
+    """Add a snapshot (e.g. from a worker process) to the recorded data"""
+    with _lock:
+        for name, o in other.get('stages', {}).items():
+            s = _stages.get(name)
+            if s is None:
+                _stages[name] = dict(o)
+            else:
+                s['count'] += o['count']
+                s['seconds'] += o['seconds']
+                s['min'] = min(s['min'], o['min'])
+                s['max'] = max(s['max'], o['max'])
+        for name, n in other.get('counters', {}).items():
+            _counters[name] = _counters.get(name, 0) + n
+        for endpoint, o in other.get('requests', {}).items():
+            r = _requests.get(endpoint)
+            if r is None:
+                r = _requests[endpoint] = {
+                    'count': 0, 'seconds': 0.0, 'min': o['min'], 'max': o['max'],
+                    'latency': [0] * len(LATENCY_BUCKETS), 'status': {}
+                    }
+            r['count'] += o['count']
+            r['seconds'] += o['seconds']
+            r['min'] = min(r['min'], o['min'])
+            r['max'] = max(r['max'], o['max'])
+            for i, b in enumerate(LATENCY_BUCKETS):
+                r['latency'][i] += o['latency'].get(str(b), 0)
+            for status, n in o['status'].items():
+                r['status'][status] = r['status'].get(status, 0) + n
+
+
+def toJSON(indent = None):
+    """Return snapshot() as a JSON string"""
+    return json.dumps(snapshot(), indent=indent)
+
+
+# HIC SVNT DRACONES
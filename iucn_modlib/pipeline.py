@@ -0,0 +1,413 @@
+#!/usr/bin/python3
+
+"""Streaming pipelines
+
+A pipeline connects a source (any iterable, e.g. taxon ids or names), a
+sequence of stages and an optional sink with bounded queues. Each stage runs
+its function on every item with an inline, thread-pool or process-pool
+executor, so that I/O and CPU work overlap while only a bounded number of
+items is held in memory. Results keep the source order.
+
+Examples:
+    from iucn_modlib import pipeline
+    pipeline.initBatchSource('redlist_2023_1/')
+    stats = pipeline.Pipeline(
+        taxa,
+        [
+            pipeline.Stage(pipeline.batchTaxon, executor = 'process', workers = 8,
+                initializer = pipeline.initBatchSource, initargs = ('redlist_2023_1/',)),
+            pipeline.Stage(pipeline.modelParameters(('kba_breeding', 'kba_nonbreeding'), 'jung'), flat = True),
+            ],
+        sink = pipeline.RowSink('parameters.csv')
+        ).run()
+
+    # or consume the results as a generator
+    for taxon in pipeline.Pipeline(names, [pipeline.Stage(pipeline.apiTaxon(token), executor = 'thread', workers = 16)]):
+        ...
+
+    # all species of the API, from its paged listing (habitats only are requested per species)
+    for taxon in pipeline.apiPagedTaxa(token, region = 'europe'):
+        ...
+"""
+
+import collections
+import functools
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Callable, Tuple
+
+
+# Queue markers
+_END = object()
+
+
+@dataclass
+class Stage:
+    """A pipeline Stage dataclass.
+
+    func: callable: Applied to every item. Items for which it returns None
+        are dropped.
+    executor: str: 'inline' (in the stage thread), 'thread' or 'process'.
+        Process stages need a picklable (module-level) func.
+    workers: int: The number of threads or processes.
+    flat: bool: func returns an iterable of items, which are passed on one
+        by one.
+    name: str: The stage name in statistics. Defaults to func's name.
+    initializer: callable: Run once in each worker process.
+    initargs: tuple: Arguments of initializer.
+    """
+    func: Callable
+    executor: str = 'inline'
+    workers: int = 1
+    flat: bool = False
+    name: str = None
+    initializer: Callable = None
+    initargs: Tuple = ()
+
+    def __post_init__(self):
+        if self.executor not in ('inline', 'thread', 'process'):
+            raise ValueError("Supported executors are: 'inline', 'thread', 'process'")
+        if self.name is None:
+            func = self.func.func if isinstance(self.func, functools.partial) else self.func
+            self.name = getattr(func, '__name__', type(func).__name__)
+
+
+class _Inline:
+    """Internal: an executor running calls in the calling thread"""
+
+    class _Done:
+        def __init__(self, func, args):
+            try:
+                self.value, self.error = func(*args), None
+            except Exception as e:
+                self.value, self.error = None, e
+
+        def result(self):
+            if self.error is not None:
+                raise self.error
+            return self.value
+
+    def submit(self, func, *args):
+        return self._Done(func, args)
+
+    def shutdown(self, wait = True, cancel_futures = False):
+        pass
+
+
+def _executor(stage):
+    if stage.executor == 'thread':
+        return ThreadPoolExecutor(max_workers=stage.workers, thread_name_prefix=f'pipeline-{stage.name}')
+    if stage.executor == 'process':
+        return ProcessPoolExecutor(max_workers=stage.workers, initializer=stage.initializer, initargs=stage.initargs)
+    return _Inline()
+
+
+class Pipeline:
+    """A streaming pipeline: source -> stages -> sink
+
+    source: iterable: The input items.
+    stages: list: Stage objects, applied in order.
+    sink: callable or object: Receives every output item, either as a
+        callable or through write(item); close() is called at the end if
+        present. Without a sink, iterate over the pipeline to get the outputs.
+    maxsize: int: The capacity of the queues between stages. Each stage also
+        holds at most 2 x workers items in flight.
+    errors: str: 'raise' to stop at the first failing item (the error is
+        raised by run or the iteration), or 'collect' to skip failing items
+        and record them in failures as (stage name, item, error message).
+    """
+
+    def __init__(self, source, stages, sink = None, maxsize = 64, errors = 'raise'):
+        if errors not in ('raise', 'collect'):
+            raise ValueError("Supported error modes are: 'raise', 'collect'")
+        self.source = source
+        self.stages = list(stages)
+        names = [s.name for s in self.stages]
+        if len(set(names)) != len(names):
+            raise ValueError('Stage names must be unique.')
+        self.sink = sink
+        self.maxsize = maxsize
+        self.errors = errors
+        self.failures = []
+        self.stats = {}
+        self._stop = threading.Event()
+        self._error = None
+        self._lock = threading.Lock()
+
+    def _put(self, q, item):
+        # blocks while the queue is full (backpressure), unless stopped
+        while not self._stop.is_set():
+            try:
+                q.put(item, timeout=0.05)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _get(self, q):
+        # blocks while the queue is empty, returns _END if stopped
+        while not self._stop.is_set():
+            try:
+                return q.get(timeout=0.05)
+            except queue.Empty:
+                continue
+        return _END
+
+    def _fail(self, error):
+        with self._lock:
+            if self._error is None:
+                self._error = error
+        self._stop.set()
+
+    def _feed(self, out):
+        stats = self.stats['source'] = {'items': 0}
+        try:
+            for item in self.source:
+                if not self._put(out, item):
+                    return
+                stats['items'] += 1
+        except Exception as e:
+            self._fail(e)
+        finally:
+            self._put(out, _END)
+
+    def _run(self, stage, inq, out):
+        stats = self.stats[stage.name] = {'items': 0, 'outputs': 0, 'failures': 0, 'seconds': 0.0}
+        executor = _executor(stage)
+        pending = collections.deque()
+        limit = 2 * stage.workers
+
+        def emit(item, future):
+            try:
+                result = future.result()
+            except Exception as e:
+                if self.errors == 'raise':
+                    raise
+                stats['failures'] += 1
+                with self._lock:
+                    self.failures.append((stage.name, item, f'{type(e).__name__}: {e}'))
+                return True
+            results = result if stage.flat else (result,)
+            for r in results if results is not None else ():
+                if r is None:
+                    continue
+                if not self._put(out, r):
+                    return False
+                stats['outputs'] += 1
+            return True
+
+        start = time.perf_counter()
+        try:
+            while True:
+                item = self._get(inq)
+                if item is _END:
+                    break
+                stats['items'] += 1
+                pending.append((item, executor.submit(stage.func, item)))
+                while len(pending) >= limit:
+                    if not emit(*pending.popleft()):
+                        return
+            while len(pending) > 0 and not self._stop.is_set():
+                if not emit(*pending.popleft()):
+                    return
+        except Exception as e:
+            self._fail(e)
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+            stats['seconds'] = time.perf_counter() - start
+            self._put(out, _END)
+
+    def __iter__(self):
+        queues = [queue.Queue(maxsize=self.maxsize) for _ in range(len(self.stages) + 1)]
+        threads = [threading.Thread(target=self._feed, args=(queues[0],), daemon=True)]
+        threads += [
+            threading.Thread(target=self._run, args=(stage, queues[i], queues[i + 1]), daemon=True)
+            for i, stage in enumerate(self.stages)
+            ]
+        for t in threads:
+            t.start()
+        try:
+            while True:
+                item = self._get(queues[-1])
+                if item is _END:
+                    break
+                yield item
+        finally:
+            # stops the threads if the consumer stopped early
+            self._stop.set()
+            for t in threads:
+                t.join()
+        if self._error is not None:
+            raise self._error
+
+    def run(self):
+        """Run the pipeline into the sink
+
+            Returns:
+                dict: Per-stage statistics ('source' items, and for each
+                    stage items, outputs, failures and seconds) and the
+                    number of items written to the sink ('sink').
+        """
+        write = self.sink if callable(self.sink) else getattr(self.sink, 'write', None)
+        written = 0
+        try:
+            for item in self:
+                if write is not None:
+                    write(item)
+                written += 1
+        finally:
+            if hasattr(self.sink, 'close'):
+                self.sink.close()
+        self.stats['sink'] = {'items': written}
+        return self.stats
+
+
+# Batch source of the current process, for batchTaxon
+_batchSource = None
+
+
+def initBatchSource(source):
+    """Set the batch source (dict or folder) used by batchTaxon in this process
+
+    Use as the initializer of process stages; sources set in the parent
+    process are inherited by forked workers.
+    """
+    global _batchSource
+    if not isinstance(source, dict):
+        from .factories.TaxonFactories import loadBatchSource
+        source = loadBatchSource(source)
+    _batchSource = source
+
+
+def batchTaxon(taxonid, fixElevation = True, fixHabitats = True):
+    """Stage function: Taxon object from the process' batch source (see initBatchSource)"""
+    from .factories.TaxonFactories import TaxonFactoryRedListBatch
+    if _batchSource is None:
+        raise RuntimeError('No batch source: call initBatchSource first.')
+    return TaxonFactoryRedListBatch(taxonid, _batchSource, fixElevation, fixHabitats)
+
+
+def bundleTaxa(bundle, species = None, fixElevation = True, fixHabitats = True):
+    """Source: Taxon objects from a RedListAPIJsonBundle (path or object)
+
+    Yields all taxa in the bundle, or those in species (ids or names).
+    """
+    from .classes.RedListAPIJsonBundle import RedListAPIJsonBundle
+    from .factories.TaxonFactories import TaxonFactoryRedListAPIJsonBundle
+    if not isinstance(bundle, RedListAPIJsonBundle):
+        bundle = RedListAPIJsonBundle(bundle)
+    for s in (species if species is not None else bundle.taxonids()):
+        yield TaxonFactoryRedListAPIJsonBundle(s, bundle, fixElevation, fixHabitats)
+
+
+def apiTaxon(token, fixElevation = True, fixHabitats = True):
+    """Stage function factory: Taxon objects from the Red List API
+
+    Returns a function of a species id or name, best run on a thread stage.
+    """
+    from .factories.TaxonFactories import TaxonFactoryRedListAPI
+    return functools.partial(TaxonFactoryRedListAPI, token = token, fixElevation = fixElevation, fixHabitats = fixHabitats)
+
+
+def apiPagedTaxa(token, region = None, prefetch = 2, workers = 8, fixElevation = True, fixHabitats = True, fullAssessment = False, failures = None):
+    """Source: Taxon objects of all species of the Red List API paged listing
+
+    Species come from the paged species listing (see
+    redlist_api.v3.iterSpeciesPages; region restricts it to a region), so
+    that only the habitats are requested per species, on workers threads.
+    Page listings only carry the taxonomy, category and main common name:
+    the other assessment fields (e.g. elevations and systems) are left None,
+    and the elevation fix (on by default, as for the other taxon sources)
+    replaces the missing elevations with its defaults. These taxa must not
+    be used to build models (e.g. with ModelParametersFactory): with
+    fullAssessment, the assessment of each species is also requested, and
+    the taxa are complete.
+
+    Species without habitats are skipped. A species that fails (e.g. network
+    errors or API error messages) stops the listing with its error, as
+    Pipeline does by default, unless a failures list is given: failed species
+    are then skipped and reported in it.
+
+        Args:
+            fixElevation (bool): Apply the elevation fix. Pass False to keep
+                the missing elevations of page records as None.
+            fullAssessment (bool): Request the assessment of each species.
+            failures (list): If given, failed species are skipped and
+                (taxonid, error message) tuples are appended to it, instead
+                of the first error being raised.
+    """
+    from .redlist_api import v3
+    from .factories.TaxonFactories import taxonFromAPIResults
+
+    def build(record):
+        try:
+            if fullAssessment:
+                assessment = v3.id_to_assessment(record['taxonid'], token)
+            else:
+                assessment = v3.pageRecordToAssessment(record)
+            habitats = v3.id_to_habitats(record['taxonid'], token)
+            if len(habitats.get('result', [])) == 0 and 'message' not in habitats:
+                return None
+            return taxonFromAPIResults(assessment, habitats, fixElevation, fixHabitats)
+        except Exception as e:
+            return e
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='pipeline-habitats') as pool:
+        for records in v3.iterSpeciesPages(token, region, prefetch):
+            for record, taxon in zip(records, pool.map(build, records)):
+                if isinstance(taxon, Exception):
+                    if failures is None:
+                        raise taxon
+                    failures.append((record['taxonid'], f'{type(taxon).__name__}: {taxon}'))
+                    continue
+                if taxon is not None:
+                    yield taxon
+
+
+def kbadbTaxon(con, fixElevation = True, fixHabitats = True):
+    """Stage function factory: Taxon objects from the KBA database (inline or thread stages)"""
+    from .factories.TaxonFactories import TaxonFactoryKBADB
+    return functools.partial(TaxonFactoryKBADB, con = con, fixElevation = fixElevation, fixHabitats = fixHabitats)
+
+
+def _modelParameters(taxon, filters, translator):
+    from .factories.ModelParametersFactories import ModelParametersFactory
+    return [ModelParametersFactory(taxon, f, translator) for f in filters]
+
+
+def modelParameters(filters, translator = None):
+    """Stage function factory: the ModelParameters of a taxon for each filter
+
+    Use on a flat stage. The returned function is picklable.
+    """
+    return functools.partial(_modelParameters, filters = tuple(filters), translator = translator)
+
+
+class RowSink:
+    """Sink: write ModelParameters (or dicts) as rows to a .csv or .parquet file
+
+    Rows are written in chunks of chunkSize.
+    """
+
+    def __init__(self, path, format = None, chunkSize = 1000):
+        from .writers import rowWriter
+        self.writer = rowWriter(path, format)
+        self.chunkSize = chunkSize
+        self.rows = []
+
+    def write(self, item):
+        self.rows.append(item if isinstance(item, dict) else item.toRow())
+        if len(self.rows) >= self.chunkSize:
+            self.writer.write(self.rows)
+            self.rows = []
+
+    def close(self):
+        self.writer.write(self.rows)
+        self.rows = []
+        self.writer.close()
+
+
+# HIC SVNT DRACONES
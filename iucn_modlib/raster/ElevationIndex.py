@@ -0,0 +1,261 @@
+#!/usr/bin/python3
+
+import json
+import os
+import numpy
+
+
+# Partially covered tiles are thresholded (when the DEM is available) rather
+# than resolved from the sorted positions, if more than 1 / SCATTER_RATIO of
+# their pixels are in range: random writes cost several times a comparison.
+SCATTER_RATIO = 16
+
+
+def openRaster(raster):
+    """Return a raster array, memory-mapping .npy files
+
+        Args:
+            raster: A 2D numpy array (or array-like), or the path to a .npy file.
+    """
+    if isinstance(raster, str):
+        return numpy.load(raster, mmap_mode='r')
+    return raster
+
+
+def tileWindows(shape, tileSize):
+    """Yield (tile, (row slice, column slice)) for a row-major tile grid"""
+    th, tw = tileSize
+    tile = 0
+    for r in range(0, shape[0], th):
+        for c in range(0, shape[1], tw):
+            yield tile, (slice(r, min(r + th, shape[0])), slice(c, min(c + tw, shape[1])))
+            tile += 1
+
+
+def castBounds(bounds, dtype, rounding):
+    """Cast elevation bounds (scalar or array) to a DEM dtype
+
+    Comparisons and searchsorted would otherwise cast the whole DEM to a
+    common type. Integer bounds are rounded (numpy.ceil for lower bounds,
+    numpy.floor for upper bounds) and clipped to the dtype range.
+    """
+    dtype = numpy.dtype(dtype)
+    if dtype.kind in 'iu':
+        info = numpy.iinfo(dtype)
+        return rounding(numpy.clip(bounds, info.min, info.max)).astype(dtype)[()]
+    return numpy.asarray(bounds).astype(dtype)[()]
+
+
+def _valid(values, nodata):
+    """Internal: mask of the valid (not nodata, not NaN) values"""
+    valid = numpy.ones(values.shape, dtype=bool)
+    if nodata is not None:
+        valid &= values != nodata
+    if values.dtype.kind == 'f':
+        valid &= ~numpy.isnan(values)
+    return valid
+
+
+def writeElevationIndex(path, dem, tileSize = 512, nodata = None):
+    """Build the elevation index of a DEM and write it to a folder
+
+    For each tile of the DEM the index stores its minimum and maximum value,
+    and the tile's valid pixels sorted by elevation (values and positions
+    within the tile). The arrays are written as .npy files, directly to disk,
+    so that DEMs larger than memory can be indexed one tile at a time.
+
+        Args:
+            path (str): The index folder, created if needed.
+            dem: A 2D numpy array, or the path to a .npy file (memory-mapped).
+            tileSize (int or tuple): Tile height and width in pixels.
+            nodata: The DEM nodata value (NaN is always nodata).
+
+        Returns:
+            ElevationIndex: The index.
+
+        Example:
+            writeElevationIndex('dem_index/', 'dem.npy', tileSize = 1024, nodata = -32768)
+    """
+    demPath = dem if isinstance(dem, str) else None
+    dem = openRaster(dem)
+    if dem.ndim != 2:
+        raise ValueError('The DEM must be a 2D array.')
+    if isinstance(tileSize, int):
+        tileSize = (tileSize, tileSize)
+    if tileSize[0] * tileSize[1] > 2**32:
+        raise ValueError('Tiles must have less than 2**32 pixels.')
+    os.makedirs(path, exist_ok=True)
+
+    windows = list(tileWindows(dem.shape, tileSize))
+    tileMin = numpy.zeros(len(windows), dtype=dem.dtype)
+    tileMax = numpy.zeros(len(windows), dtype=dem.dtype)
+    offsets = numpy.zeros(len(windows) + 1, dtype=numpy.int64)
+    # upper bound of the sorted arrays; trimmed when written
+    values = numpy.lib.format.open_memmap(os.path.join(path, 'values.tmp.npy'), mode='w+', dtype=dem.dtype, shape=(dem.size,))
+    order = numpy.lib.format.open_memmap(os.path.join(path, 'order.tmp.npy'), mode='w+', dtype=numpy.uint32, shape=(dem.size,))
+    for tile, window in windows:
+        block = numpy.asarray(dem[window]).ravel()
+        positions = numpy.flatnonzero(_valid(block, nodata)).astype(numpy.uint32)
+        block = block[positions]
+        sort = numpy.argsort(block, kind='stable')
+        start = offsets[tile]
+        offsets[tile + 1] = start + len(block)
+        values[start:offsets[tile + 1]] = block[sort]
+        order[start:offsets[tile + 1]] = positions[sort]
+        if len(block) > 0:
+            tileMin[tile] = block[sort[0]]
+            tileMax[tile] = block[sort[-1]]
+
+    # trim to the valid pixels
+    n = int(offsets[-1])
+    for name, array in (('values', values), ('order', order)):
+        trimmed = numpy.lib.format.open_memmap(os.path.join(path, f'{name}.npy'), mode='w+', dtype=array.dtype, shape=(n,))
+        trimmed[:] = array[:n]
+        trimmed.flush()
+        del trimmed
+    del values, order
+    os.remove(os.path.join(path, 'values.tmp.npy'))
+    os.remove(os.path.join(path, 'order.tmp.npy'))
+    numpy.save(os.path.join(path, 'tile_min.npy'), tileMin)
+    numpy.save(os.path.join(path, 'tile_max.npy'), tileMax)
+    numpy.save(os.path.join(path, 'offsets.npy'), offsets)
+    with open(os.path.join(path, 'index.json'), 'w') as f:
+        json.dump({
+            'shape': list(dem.shape),
+            'tile_size': list(tileSize),
+            'dtype': str(dem.dtype),
+            'nodata': nodata.item() if hasattr(nodata, 'item') else nodata,
+            'dem': os.path.abspath(demPath) if demPath is not None else None
+            }, f, indent=2)
+    return ElevationIndex(path, dem = None if demPath is not None else dem)
+
+
+class ElevationIndex:
+    """A sorted elevation index over a DEM
+
+    Answers elevation range queries (lower <= DEM <= upper) without
+    thresholding the DEM: tiles entirely outside the range are skipped,
+    tiles entirely inside it are filled, and the others are resolved by
+    binary search in the tile's sorted values. Nodata pixels never match.
+    Index arrays are memory-mapped. If the DEM is available, tiles with many
+    pixels in range are thresholded directly, which is faster.
+
+    path: str: An index folder written by writeElevationIndex.
+    dem: The DEM (array or .npy path). Defaults to the .npy file the index
+        was built from, if it still exists.
+
+    Examples:
+        index = ElevationIndex('dem_index/')
+        mask = index.mask(taxon.elevation_lower, taxon.elevation_upper)
+        index.count(200, 1500)
+    """
+
+    def __init__(self, path, dem = None):
+        self.path = path
+        with open(os.path.join(path, 'index.json')) as f:
+            meta = json.load(f)
+        if dem is None and meta.get('dem') is not None and os.path.exists(meta['dem']):
+            dem = meta['dem']
+        self.dem = openRaster(dem) if dem is not None else None
+        if self.dem is not None and tuple(self.dem.shape) != tuple(meta['shape']):
+            raise ValueError('The DEM does not match the index shape.')
+        self.shape = tuple(meta['shape'])
+        self.tileSize = tuple(meta['tile_size'])
+        self.dtype = numpy.dtype(meta['dtype'])
+        self.nodata = meta['nodata']
+        self.values = numpy.load(os.path.join(path, 'values.npy'), mmap_mode='r')
+        self.order = numpy.load(os.path.join(path, 'order.npy'), mmap_mode='r')
+        self.offsets = numpy.load(os.path.join(path, 'offsets.npy'))
+        self.tileMin = numpy.load(os.path.join(path, 'tile_min.npy'))
+        self.tileMax = numpy.load(os.path.join(path, 'tile_max.npy'))
+        self.windows = [w for _, w in tileWindows(self.shape, self.tileSize)]
+        self.tileShapes = [(w[0].stop - w[0].start, w[1].stop - w[1].start) for w in self.windows]
+
+    def __len__(self):
+        """The number of tiles"""
+        return len(self.windows)
+
+    def _bounds(self, lower, upper):
+        lower = -numpy.inf if lower is None else lower
+        upper = numpy.inf if upper is None else upper
+        return lower, upper
+
+    def tiles(self, lower, upper):
+        """Return the tiles that may hold pixels in the range
+
+            Returns:
+                numpy array: Tile indices (row-major).
+        """
+        lower, upper = self._bounds(lower, upper)
+        counts = numpy.diff(self.offsets)
+        return numpy.flatnonzero((counts > 0) & (self.tileMax >= lower) & (self.tileMin <= upper))
+
+    def _range(self, tile, lower, upper):
+        """Internal: (start, stop) of the tile's sorted values in the range"""
+        start, stop = self.offsets[tile], self.offsets[tile + 1]
+        if self.tileMin[tile] >= lower and self.tileMax[tile] <= upper:
+            return start, stop
+        values = self.values[start:stop]
+        return start + numpy.searchsorted(values, castBounds(lower, self.dtype, numpy.ceil), 'left'), \
+            start + numpy.searchsorted(values, castBounds(upper, self.dtype, numpy.floor), 'right')
+
+    def _fillTile(self, tile, lower, upper, out):
+        """Internal: write the mask of one tile into out (a cleared tile-shaped array)"""
+        if self.offsets[tile + 1] == self.offsets[tile] or self.tileMax[tile] < lower or self.tileMin[tile] > upper:
+            return
+        start, stop = self._range(tile, lower, upper)
+        size = out.shape[0] * out.shape[1]
+        if stop - start == size:
+            # every pixel is in range
+            out[...] = True
+        elif self.dem is not None and (stop - start) * SCATTER_RATIO > size:
+            # scattering many pixels costs more than thresholding the tile
+            block = self.dem[self.windows[tile]]
+            numpy.greater_equal(block, lower, out=out)
+            out &= block <= upper
+            if self.nodata is not None and lower <= self.nodata <= upper:
+                out &= block != self.nodata
+        else:
+            flat = numpy.zeros(size, dtype=bool)
+            flat[self.order[start:stop]] = True
+            out[...] = flat.reshape(out.shape)
+
+    def tileMask(self, tile, lower, upper):
+        """Return the boolean mask of one tile (tile shape)"""
+        lower, upper = self._bounds(lower, upper)
+        mask = numpy.zeros(self.tileShapes[tile], dtype=bool)
+        self._fillTile(tile, lower, upper, mask)
+        return mask
+
+    def mask(self, lower, upper, out = None):
+        """Return the boolean mask of DEM pixels in lower <= DEM <= upper
+
+            Args:
+                lower: The lower elevation (None for no lower bound).
+                upper: The upper elevation (None for no upper bound).
+                out: An optional boolean array (e.g. a memmap) of the DEM
+                    shape to write the mask into.
+
+            Returns:
+                numpy array: The mask (DEM shape).
+        """
+        if out is None:
+            out = numpy.zeros(self.shape, dtype=bool)
+        else:
+            out[...] = False
+        lower, upper = self._bounds(lower, upper)
+        for tile in self.tiles(lower, upper):
+            self._fillTile(tile, lower, upper, out[self.windows[tile]])
+        return out
+
+    def count(self, lower, upper):
+        """Return the number of DEM pixels in lower <= DEM <= upper"""
+        lower, upper = self._bounds(lower, upper)
+        n = 0
+        for tile in self.tiles(lower, upper):
+            start, stop = self._range(tile, lower, upper)
+            n += int(stop - start)
+        return n
+
+
+# HIC SVNT DRACONES
@@ -0,0 +1,239 @@
+#!/usr/bin/python3
+
+import os
+import shutil
+import numpy
+
+from .ElevationIndex import openRaster, tileWindows
+from ..classes.ModelParameters import _canonicalCode
+from ..classes.ParameterGroups import groupParameters
+
+
+def _checkCodes(species):
+    """Internal: raise a ValueError if a land-cover code is not an integer class
+
+    Raster classes are integers, but registered crosswalks can translate to
+    other targets (e.g. class names), which cannot be matched to pixels.
+    """
+    for p in species:
+        invalid = [c for c in p.land_cover_codes if not isinstance(_canonicalCode(c), int)]
+        if len(invalid) > 0:
+            raise ValueError(
+                f'Land-cover codes of taxon {p.taxonid} ({p.translator} translator) are not integer raster classes: {invalid}'
+                )
+
+
+def _lookupTable(species):
+    """Internal: (classes, table) with table[s, i] True if species s uses classes[i]"""
+    classes = numpy.array(sorted(set(_canonicalCode(c) for p in species for c in p.land_cover_codes)), dtype=numpy.int64)
+    table = numpy.zeros((len(species), len(classes)), dtype=bool)
+    for s, p in enumerate(species):
+        if len(p.land_cover_codes) > 0:
+            table[s, numpy.searchsorted(classes, [_canonicalCode(c) for c in p.land_cover_codes])] = True
+    return classes, table
+
+
+def _elevationEdges(species, dtype):
+    """Internal: elevation bin edges of a batch, and each species' range as edge indices
+
+    Edges are the species' lower bounds and the values just above their upper
+    bounds, so that every species' range is a union of whole bins: a value
+    in bin b (b edges at or below it) is in a range iff low < b <= high.
+    """
+    lower = numpy.array([-numpy.inf if p.elevation_lower is None else p.elevation_lower for p in species], dtype=numpy.float64)
+    upper = numpy.array([numpy.inf if p.elevation_upper is None else p.elevation_upper for p in species], dtype=numpy.float64)
+    if numpy.dtype(dtype).kind in 'iu':
+        lower = numpy.ceil(lower)
+        upper = numpy.floor(upper) + 1
+    else:
+        upper = numpy.nextafter(upper, numpy.inf)
+    edges = numpy.unique(numpy.concatenate([lower, upper]))
+    return edges, numpy.searchsorted(edges, lower), numpy.searchsorted(edges, upper)
+
+
+def maskKey(params):
+    """Return the key of a species mask: '<taxonid>_<signature hash>'
+
+    Masks are keyed by taxon and parameter signature (see
+    ModelParameters.signatureHash), so that masks of the same taxon for
+    other filters or translators do not overwrite each other.
+    """
+    return f'{params.taxonid}_{params.signatureHash()}'
+
+
+def _maxOpenFiles(margin = 128):
+    """Internal: the number of mask files a batch can keep open (None if unlimited)
+
+    Each memory-mapped output holds a file descriptor: batches stay below
+    the process limit, with a margin for the rasters and other files.
+    """
+    try:
+        import resource
+    except ImportError:
+        return None
+    soft, _ = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft == resource.RLIM_INFINITY:
+        return None
+    return max(1, soft - margin)
+
+
+def _link(source, destination):
+    """Internal: hard link a file, or copy it where links are not supported"""
+    if os.path.exists(destination):
+        os.remove(destination)
+    try:
+        os.link(source, destination)
+    except OSError:
+        shutil.copyfile(source, destination)
+
+
+def scheduleTiles(species, landCover, dem, output = None, tileSize = 512, nodata = None, maxMemory = 256 * 2**20, maxSpecies = 4096, deduplicate = False):
+    """Compute the habitat masks of many species, reading each raster tile once
+
+    The loop over species is inverted: each tile of the land-cover and DEM
+    rasters is read once and all species of the batch are evaluated on it.
+    Pixels are keyed by land-cover class and elevation bin (bins split at
+    the species' elevation limits), and species are evaluated once per
+    distinct key with a lookup table of their translated classes, so that
+    per-pixel work does not grow with the number of species unless masks
+    are written. Species without suitable pixels in a tile are skipped.
+
+    Memory is capped in two ways: at most maxSpecies output files are open
+    at once (the rasters are read once per batch of maxSpecies species), and
+    the species masks built together on a tile use about maxMemory bytes.
+    When masks are written, batches are also kept below the open files
+    limit of the process.
+
+    Masks and pixel counts are keyed by maskKey (taxon ID and parameter
+    signature hash), so that several parameter sets of a taxon (e.g.
+    breeding and non-breeding) can be scheduled together. Land-cover codes
+    must be integer raster classes; other codes raise a ValueError before
+    any raster is read.
+
+        Args:
+            species (list): ModelParameters objects (land_cover_codes and
+                elevation_lower, elevation_upper are used).
+            landCover: A 2D integer array, or the path to a .npy file.
+            dem: A 2D array of the same shape, or the path to a .npy file.
+            output (str): A folder for per-species masks, written
+                incrementally as `<maskKey>.npy` (bool) files. If None,
+                only pixel counts are computed.
+            tileSize (int or tuple): Tile height and width in pixels.
+            nodata: The DEM nodata value (NaN is always nodata).
+            maxMemory (int): Approximate bytes used by per-tile masks.
+            maxSpecies (int): The maximum number of species per batch.
+            deduplicate (bool): Evaluate species with identical parameter
+                signatures (see ModelParameters.signature) once. Masks of
+                the other species of a group are hard links to the first.
+
+        Returns:
+            dict: 'pixels' (maskKey: suitable pixels), 'tiles_read',
+                'bytes_read', 'batches', 'evaluations' (species x tiles
+                with suitable pixels) and 'skipped' (species x tiles
+                without). With deduplicate, also 'signatures' and
+                'dedup_ratio'.
+
+        Example:
+            params = [ModelParametersFactory(t, 'kba_breeding', 'jung') for t in taxa]
+            scheduleTiles(params, 'jung_l2.npy', 'dem.npy', output = 'masks/', nodata = -32768)
+    """
+    _checkCodes(species)
+    if deduplicate:
+        groups = groupParameters(species)
+        stats = scheduleTiles(
+            groups.representatives, landCover, dem, output = output, tileSize = tileSize,
+            nodata = nodata, maxMemory = maxMemory, maxSpecies = maxSpecies
+            )
+        for representative, indices in zip(groups.representatives, groups.members):
+            first = maskKey(representative)
+            for i in indices:
+                key = maskKey(species[i])
+                stats['pixels'][key] = stats['pixels'][first]
+                if output is not None and key != first:
+                    _link(os.path.join(output, f'{first}.npy'), os.path.join(output, f'{key}.npy'))
+        stats['signatures'] = len(groups)
+        stats['dedup_ratio'] = groups.ratio
+        return stats
+
+    landCover = openRaster(landCover)
+    dem = openRaster(dem)
+    if landCover.shape != dem.shape or landCover.ndim != 2:
+        raise ValueError('The land-cover and DEM rasters must be 2D arrays of the same shape.')
+    if isinstance(tileSize, int):
+        tileSize = (tileSize, tileSize)
+    # parameter sets with the same key have identical masks
+    species = list({maskKey(p): p for p in species}.values())
+    if output is not None:
+        os.makedirs(output, exist_ok=True)
+        limit = _maxOpenFiles()
+        if limit is not None:
+            maxSpecies = min(maxSpecies, limit)
+    windows = list(tileWindows(dem.shape, tileSize))
+    stats = {'pixels': {}, 'tiles_read': 0, 'bytes_read': 0, 'batches': 0, 'evaluations': 0, 'skipped': 0}
+
+    for first in range(0, len(species), maxSpecies):
+        batch = species[first:first + maxSpecies]
+        stats['batches'] += 1
+        classes, table = _lookupTable(batch)
+        edges, low, high = _elevationEdges(batch, dem.dtype)
+        bins = len(edges) + 1
+        pixels = numpy.zeros(len(batch), dtype=numpy.int64)
+        outputs = [
+            numpy.lib.format.open_memmap(os.path.join(output, f'{maskKey(p)}.npy'), mode='w+', dtype=bool, shape=dem.shape)
+            for p in batch
+            ] if output is not None else None
+
+        for _, window in windows:
+            lc = numpy.asarray(landCover[window])
+            elevation = numpy.asarray(dem[window])
+            stats['tiles_read'] += 1
+            stats['bytes_read'] += lc.nbytes + elevation.nbytes
+            shape = lc.shape
+            lc = lc.ravel()
+            elevation = elevation.ravel()
+
+            # the tile's classes, as columns of the lookup table; the last
+            # column (never suitable) holds nodata pixels
+            tileClasses, inverse = numpy.unique(lc, return_inverse=True)
+            columns = numpy.searchsorted(classes, tileClasses).clip(0, max(len(classes) - 1, 0))
+            known = (classes[columns] == tileClasses) if len(classes) > 0 else numpy.zeros(len(tileClasses), dtype=bool)
+            tileTable = numpy.zeros((len(batch), len(tileClasses) + 1), dtype=bool)
+            tileTable[:, :-1][:, known] = table[:, columns[known]]
+            invalid = numpy.zeros(elevation.shape, dtype=bool)
+            if nodata is not None:
+                invalid |= elevation == nodata
+            if elevation.dtype.kind == 'f':
+                invalid |= numpy.isnan(elevation)
+            inverse[invalid] = len(tileClasses)
+
+            # each pixel is keyed by (class, elevation bin): species are
+            # evaluated once per distinct key, not once per pixel
+            keys = inverse.astype(numpy.int64) * bins + numpy.searchsorted(edges, elevation, 'right')
+            keys, keyInverse, keyCounts = numpy.unique(keys, return_inverse=True, return_counts=True)
+            keyBins = keys % bins
+            suitable = tileTable[:, keys // bins] & (low[:, None] < keyBins) & (keyBins <= high[:, None])
+            pixels += suitable.astype(numpy.int64) @ keyCounts
+
+            active = numpy.flatnonzero(suitable.any(axis=1))
+            stats['evaluations'] += len(active)
+            stats['skipped'] += len(batch) - len(active)
+            if outputs is None:
+                continue
+            # species masks written together, within the memory cap
+            chunk = max(1, maxMemory // len(lc))
+            for i in range(0, len(active), chunk):
+                rows = active[i:i + chunk]
+                masks = suitable[rows][:, keyInverse]
+                for row, mask in zip(rows, masks):
+                    outputs[row][window] = mask.reshape(shape)
+
+        for p, n in zip(batch, pixels.tolist()):
+            stats['pixels'][maskKey(p)] = n
+        if outputs is not None:
+            for out in outputs:
+                out.flush()
+            del outputs
+    return stats
+
+
+# HIC SVNT DRACONES
@@ -0,0 +1,3 @@
+
+from .ElevationIndex import ElevationIndex, writeElevationIndex, openRaster, tileWindows
+from .TileScheduler import scheduleTiles, maskKey
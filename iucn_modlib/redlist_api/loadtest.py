@@ -0,0 +1,192 @@
+#!/usr/bin/python3
+
+"""Load tests of Red List API clients
+
+loadTest drives a client function (e.g. TaxonFactoryRedListAPI, a bulk
+function of many species, or an async client) over a list of items with a
+given concurrency, and reports throughput, latency percentiles and errors.
+Run against a MockRedListServer to tune concurrency, retries and caching.
+
+Examples:
+    from iucn_modlib.redlist_api import loadtest, mock, v3
+    with mock.MockRedListServer(1000, latency = 0.05, rateLimit = 200) as server:
+        with v3.useBaseURL(server.url):
+            report = loadtest.loadTest(lambda t: iucn_modlib.TaxonFactoryRedListAPI(t, 'token'), server.taxonids(), concurrency = 16, server = server)
+    print(report.summary())
+
+    # or from the command line
+    python -m iucn_modlib.redlist_api.loadtest --taxa 1000 --concurrency 16 --latency 0.05 --rate-limit 200
+"""
+
+import argparse
+import asyncio
+import collections
+import inspect
+import json
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, asdict, field
+
+
+# Reported latency percentiles
+PERCENTILES = (50, 90, 95, 99)
+
+
+def _percentile(values, q):
+    """Internal: the q-th percentile (nearest rank) of sorted values"""
+    if len(values) == 0:
+        return None
+    return values[min(len(values) - 1, max(0, -(-q * len(values) // 100) - 1))]
+
+
+@dataclass
+class LoadTestReport:
+    """A load test report dataclass
+
+    calls: int: Client calls made (one per item, or per batch).
+    items: int: Items processed.
+    errors: int: Calls that raised.
+    seconds: float: Wall-clock duration.
+    throughput: float: Items per second.
+    latency: dict: Call latency percentiles ('p50', 'p90', 'p95', 'p99',
+        'max' and 'mean'), in seconds.
+    errorTypes: dict: Exception type name: count.
+    server: dict: Server-side statistics (status codes, endpoints), if a
+        MockRedListServer was given.
+    """
+    calls: int
+    items: int
+    errors: int
+    seconds: float
+    throughput: float
+    latency: dict
+    errorTypes: dict = field(default_factory=dict)
+    server: dict = None
+
+    def summary(self):
+        """Return a human-readable summary"""
+        lines = [
+            f'{self.items} items in {self.calls} calls, {self.seconds:.2f}s: {self.throughput:.1f} items/s',
+            'latency: ' + ', '.join(f'{k} {v * 1000:.1f}ms' for k, v in self.latency.items() if v is not None),
+            f'errors: {self.errors}' + (f' ({", ".join(f"{k}: {v}" for k, v in self.errorTypes.items())})' if self.errors else '')
+            ]
+        if self.server is not None:
+            lines.append('server status: ' + ', '.join(f'{k}: {v}' for k, v in sorted(self.server['status'].items())))
+        return '\n'.join(lines)
+
+
+def _timed(func, item):
+    start = time.perf_counter()
+    try:
+        func(item)
+        error = None
+    except Exception as e:
+        error = type(e).__name__
+    return time.perf_counter() - start, error
+
+
+async def _timedAsync(func, item, semaphore):
+    async with semaphore:
+        start = time.perf_counter()
+        try:
+            await func(item)
+            error = None
+        except Exception as e:
+            error = type(e).__name__
+        return time.perf_counter() - start, error
+
+
+async def _runAsync(func, calls, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+    return await asyncio.gather(*[_timedAsync(func, c, semaphore) for c in calls])
+
+
+def loadTest(func, items, concurrency = 8, batchSize = None, server = None):
+    """Run a load test of an API client function
+
+        Args:
+            func: A function of one item (e.g. a taxon id), or of a list of
+                items if batchSize is set. Coroutine functions are run on an
+                asyncio event loop, others on a thread pool.
+            items (list): The items.
+            concurrency (int): Calls in flight at once.
+            batchSize (int): Call func with lists of batchSize items (bulk
+                clients). None calls it once per item.
+            server (MockRedListServer): If given, its statistics are reset
+                at the start and included in the report.
+
+        Returns:
+            LoadTestReport: The report.
+    """
+    items = list(items)
+    calls = items if batchSize is None else [items[i:i + batchSize] for i in range(0, len(items), batchSize)]
+    if server is not None:
+        server.reset()
+
+    start = time.perf_counter()
+    if inspect.iscoroutinefunction(func):
+        results = asyncio.run(_runAsync(func, calls, concurrency))
+    else:
+        with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='loadtest') as pool:
+            results = list(pool.map(lambda c: _timed(func, c), calls))
+    seconds = time.perf_counter() - start
+
+    latencies = sorted(r[0] for r in results)
+    errorTypes = collections.Counter(r[1] for r in results if r[1] is not None)
+    latency = {f'p{q}': _percentile(latencies, q) for q in PERCENTILES}
+    latency['max'] = latencies[-1] if len(latencies) > 0 else None
+    latency['mean'] = sum(latencies) / len(latencies) if len(latencies) > 0 else None
+    return LoadTestReport(
+        calls      = len(calls),
+        items      = len(items),
+        errors     = sum(errorTypes.values()),
+        seconds    = seconds,
+        throughput = len(items) / seconds if seconds > 0 else 0.0,
+        latency    = latency,
+        errorTypes = dict(errorTypes),
+        server     = {
+            'requests': server.stats['requests'],
+            'status': dict(server.stats['status']),
+            'endpoints': dict(server.stats['endpoints'])
+            } if server is not None else None
+        )
+
+
+def main(argv = None):
+    """Load test TaxonFactoryRedListAPI against a local mock server"""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--taxa', type=int, default=500, help='synthetic taxa served (default: 500)')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 8, 32], help='concurrency levels (default: 1 8 32)')
+    parser.add_argument('--latency', type=float, default=0.02, help='server latency in seconds (default: 0.02)')
+    parser.add_argument('--jitter', type=float, default=0.0, help='extra random server latency in seconds')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fraction of 500 responses')
+    parser.add_argument('--rate-limit', type=float, default=None, help='requests per second before 429 responses')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', action='store_true', help='print the reports as JSON')
+    args = parser.parse_args(argv)
+
+    from . import mock, v3
+    from ..factories.TaxonFactories import TaxonFactoryRedListAPI
+
+    reports = []
+    with mock.MockRedListServer(
+            args.taxa, seed = args.seed, latency = args.latency, jitter = args.jitter,
+            errorRate = args.error_rate, rateLimit = args.rate_limit
+            ) as server:
+        with v3.useBaseURL(server.url):
+            for concurrency in args.concurrency:
+                report = loadTest(lambda t: TaxonFactoryRedListAPI(t, 'token'), server.taxonids(), concurrency, server = server)
+                reports.append((concurrency, report))
+                if not args.json:
+                    print(f'concurrency {concurrency}:\n{report.summary()}\n', file=sys.stderr)
+    if args.json:
+        print(json.dumps([dict(asdict(r), concurrency=c) for c, r in reports], indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
+
+
+# HIC SVNT DRACONES
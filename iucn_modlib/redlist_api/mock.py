@@ -0,0 +1,303 @@
+#!/usr/bin/python3
+
+"""A local stand-in for the Red List API v3
+
+MockRedListServer serves the species, habitats and weblink endpoints used by
+iucn_modlib.redlist_api.v3 from synthetic (or given) API responses, with
+configurable latency, errors and 429 throttling, so that API clients can be
+tested and tuned without the live service.
+
+Examples:
+    from iucn_modlib.redlist_api import mock, v3
+    with mock.MockRedListServer(1000, latency = 0.05, rateLimit = 100) as server:
+        with v3.useBaseURL(server.url):
+            taxon = iucn_modlib.TaxonFactoryRedListAPI(12345, 'token')
+        server.stats
+"""
+
+import collections
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs, unquote
+
+from .. import synthetic
+
+
+# Region identifiers of the paged regional listings
+REGIONS = ('europe', 'mediterranean', 'pan-africa', 'gulf_of_mexico', 'persian_gulf')
+
+
+class _TokenBucket:
+    """Internal: a thread-safe token bucket (rate tokens per second, up to burst)"""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.last = time.monotonic()
+        self.lock = threading.Lock()
+
+    def take(self):
+        """Take a token: returns 0 if one is available, else the seconds until one is"""
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.last) * self.rate)
+            self.last = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0
+            return (1 - self.tokens) / self.rate
+
+
+class _Handler(BaseHTTPRequestHandler):
+    """Internal: routes requests to the MockRedListServer of the http server"""
+
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self.server.mock._handle(self)
+
+
+class _Server(ThreadingHTTPServer):
+    """Internal: a threading http server with a listen backlog for load tests"""
+
+    daemon_threads = True
+    request_queue_size = 256
+
+
+class MockRedListServer:
+    """A local mock Red List API v3 server
+
+    Serves, under `<url>/`:
+        species/id/{id}, species/{name},
+        habitats/species/id/{id}, habitats/species/name/{name},
+        weblink/{name},
+        species/page/{page}, species/region/{region}/page/{page},
+        region/list
+    in the live API format. Unknown species (and pages past the last one)
+    return an empty result. The server runs on background threads (one per
+    connection) until stop().
+
+    taxa: int or list: The number of synthetic taxa to serve (see
+        iucn_modlib.synthetic), or a list of (assessment, habitats) API
+        response pairs.
+    seed: int: The seed of the synthetic taxa, latency jitter and errors.
+    latency: float: Seconds added to every response.
+    jitter: float: Extra random latency, uniform in [0, jitter] seconds.
+    errorRate: float: The fraction of requests answered with a 500 error.
+    rateLimit: float: Requests per second above which requests are
+        throttled with 429 responses (None for no limit).
+    burst: int: Requests allowed at once before throttling. Defaults to
+        rateLimit (one second of requests).
+    token: str: If set, requests with another token get the API's invalid
+        token message.
+    host, port: The address to listen on. Port 0 picks a free port.
+    pageSize: int: Species per page of the paged listings.
+    regions: list: Region identifiers. Taxa are assigned to the regions in
+        turn, in taxon order.
+    """
+
+    def __init__(
+            self, taxa = 100, seed = 0, latency = 0.0, jitter = 0.0, errorRate = 0.0,
+            rateLimit = None, burst = None, token = None, host = '127.0.0.1', port = 0,
+            pageSize = 10000, regions = REGIONS
+            ):
+        self.latency = latency
+        self.jitter = jitter
+        self.errorRate = errorRate
+        self.token = token
+        self.pageSize = pageSize
+        self.regions = list(regions)
+        self._random = random.Random(seed)
+        self._randomLock = threading.Lock()
+        self._bucket = _TokenBucket(rateLimit, burst or max(1, rateLimit)) if rateLimit is not None else None
+        self._statsLock = threading.Lock()
+        self.reset()
+
+        # index responses by taxon id and lower-case name
+        self._assessmentIds = {}
+        if isinstance(taxa, int):
+            generated = list(synthetic.syntheticTaxa(taxa, seed))
+            self._assessmentIds = {t['assessment']['internalTaxonId']: t['assessment']['assessmentId'] for t in generated}
+            taxa = [synthetic.toAPIResponses(t) for t in generated]
+        self._byId = {}
+        self._byName = {}
+        for assessment, habitats in taxa:
+            record = assessment['result'][0]
+            self._byId[int(record['taxonid'])] = (assessment, habitats)
+            self._byName[record['scientific_name'].lower()] = (assessment, habitats)
+        self._regionOf = {taxonid: self.regions[i % len(self.regions)] for i, taxonid in enumerate(self._byId)}
+
+        # (pattern, endpoint name, handler); first match wins
+        self._routes = [
+            (re.compile(r'species/id/(\d+)'), 'species/id', self._speciesById),
+            (re.compile(r'species/page/(\d+)'), 'species/page', self._speciesPage),
+            (re.compile(r'species/region/([^/]+)/page/(\d+)'), 'species/region/page', self._regionSpeciesPage),
+            (re.compile(r'region/list'), 'region/list', self._regionList),
+            (re.compile(r'species/([^/]+)'), 'species/name', self._speciesByName),
+            (re.compile(r'habitats/species/id/(\d+)'), 'habitats/species/id', self._habitatsById),
+            (re.compile(r'habitats/species/name/([^/]+)'), 'habitats/species/name', self._habitatsByName),
+            (re.compile(r'weblink/([^/]+)'), 'weblink', self._weblink)
+            ]
+        self._server = _Server((host, port), _Handler)
+        self._server.mock = self
+        self._thread = None
+
+    @property
+    def url(self):
+        """The base url of the server's API, for redlist_api.v3.setBaseURL"""
+        host, port = self._server.server_address[:2]
+        return f'http://{host}:{port}/api/v3'
+
+    def taxonids(self, region = None):
+        """The taxon ids served (in a region, if given)"""
+        return [t for t in self._byId if region is None or self._regionOf[t] == region]
+
+    def reset(self):
+        """Reset the request statistics"""
+        with self._statsLock:
+            self.stats = {'requests': 0, 'status': collections.Counter(), 'endpoints': collections.Counter()}
+
+    def start(self):
+        """Start serving on a background thread"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._server.serve_forever, name='mock-redlist', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop serving and close the socket"""
+        if self._thread is not None:
+            self._server.shutdown()
+            self._thread.join()
+            self._thread = None
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+    # endpoints
+
+    def _speciesById(self, taxonid):
+        found = self._byId.get(int(taxonid))
+        return found[0] if found is not None else {'name': '0', 'result': []}
+
+    def _speciesByName(self, name):
+        found = self._byName.get(name.lower())
+        return found[0] if found is not None else {'name': name, 'result': []}
+
+    def _habitatsById(self, taxonid):
+        found = self._byId.get(int(taxonid))
+        return found[1] if found is not None else {'id': str(taxonid), 'result': []}
+
+    def _habitatsByName(self, name):
+        found = self._byName.get(name.lower())
+        return found[1] if found is not None else {'name': name, 'result': []}
+
+    def _weblink(self, name):
+        found = self._byName.get(name.lower())
+        if found is None:
+            return {'value': '0', 'species': name, 'rlurl': None}
+        record = found[0]['result'][0]
+        taxonid = record['taxonid']
+        return {
+            'species': record['scientific_name'],
+            'rlurl': f'https://www.iucnredlist.org/species/{taxonid}/{self._assessmentIds.get(taxonid, taxonid)}'
+            }
+
+    def _pageRecords(self, taxonids, page):
+        page = int(page)
+        records = []
+        for taxonid in taxonids[page * self.pageSize:(page + 1) * self.pageSize]:
+            a = self._byId[taxonid][0]['result'][0]
+            records.append({
+                'taxonid': a['taxonid'],
+                'kingdom_name': a['kingdom'],
+                'phylum_name': a['phylum'],
+                'class_name': a['class'],
+                'order_name': a['order'],
+                'family_name': a['family'],
+                'genus_name': a['genus'],
+                'scientific_name': a['scientific_name'],
+                'taxonomic_authority': a['authority'],
+                'infra_rank': None,
+                'infra_name': None,
+                'population': None,
+                'category': a['category'],
+                'main_common_name': a['main_common_name']
+                })
+        return records
+
+    def _speciesPage(self, page):
+        records = self._pageRecords(self.taxonids(), page)
+        return {'count': len(records), 'page': page, 'result': records}
+
+    def _regionSpeciesPage(self, region, page):
+        records = self._pageRecords(self.taxonids(region), page)
+        return {'count': len(records), 'region_identifier': region, 'page': page, 'result': records}
+
+    def _regionList(self):
+        return {'count': len(self.regions), 'results': [{'name': r.replace('_', ' ').title(), 'identifier': r} for r in self.regions]}
+
+    # request handling
+
+    def _count(self, endpoint, status):
+        with self._statsLock:
+            self.stats['requests'] += 1
+            self.stats['status'][status] += 1
+            self.stats['endpoints'][endpoint] += 1
+
+    def _respond(self, handler, endpoint, status, body, headers = ()):
+        self._count(endpoint, status)
+        data = json.dumps(body).encode('utf-8')
+        handler.send_response(status)
+        handler.send_header('Content-Type', 'application/json')
+        handler.send_header('Content-Length', str(len(data)))
+        for k, v in headers:
+            handler.send_header(k, v)
+        handler.end_headers()
+        handler.wfile.write(data)
+
+    def _handle(self, handler):
+        url = urlsplit(handler.path)
+        path = unquote(url.path)
+        path = path[len('/api/v3/'):] if path.startswith('/api/v3/') else path.lstrip('/')
+        query = parse_qs(url.query)
+
+        for pattern, endpoint, func in self._routes:
+            match = pattern.fullmatch(path)
+            if match is not None:
+                break
+        else:
+            return self._respond(handler, 'unknown', 404, {'message': 'Not found'})
+
+        with self._randomLock:
+            delay = self.latency + (self._random.uniform(0, self.jitter) if self.jitter > 0 else 0)
+            failed = self._random.random() < self.errorRate
+        if delay > 0:
+            time.sleep(delay)
+        if self._bucket is not None:
+            wait = self._bucket.take()
+            if wait > 0:
+                return self._respond(
+                    handler, endpoint, 429, {'message': 'Too many requests'},
+                    headers=[('Retry-After', str(max(1, round(wait))))]
+                    )
+        if failed:
+            return self._respond(handler, endpoint, 500, {'message': 'Internal server error'})
+        if endpoint != 'weblink' and self.token is not None and query.get('token', [None])[0] != self.token:
+            return self._respond(handler, endpoint, 200, {'message': 'Token not valid!'})
+        return self._respond(handler, endpoint, 200, func(*match.groups()))
+
+
+# HIC SVNT DRACONES
@@ -1,43 +1,107 @@
 #!/usr/bin/python3
 
 
+import collections
+import contextlib
+import os
 import requests
+import time
+from concurrent.futures import ThreadPoolExecutor
+from .. import instrumentation
+
+
+# Base url of the API, e.g. a local MockRedListServer for testing
+DEFAULT_BASE_URL = 'https://apiv3.iucnredlist.org/api/v3'
+BASE_URL = os.environ.get('IUCN_REDLIST_API_URL', DEFAULT_BASE_URL).rstrip('/')
+
+
+def setBaseURL(url = None):
+    '''Set the base url of all API calls (None restores the default)
+
+    Returns the previous base url.
+    '''
+    global BASE_URL
+    previous = BASE_URL
+    BASE_URL = (url or DEFAULT_BASE_URL).rstrip('/')
+    return previous
+
+
+@contextlib.contextmanager
+def useBaseURL(url):
+    '''Context manager: API calls use the base url url within the block'''
+    previous = setBaseURL(url)
+    try:
+        yield url
+    finally:
+        setBaseURL(previous)
+
+
+# http requests
+
+def _get(endpoint, url, params = None):
+    '''Internal: GET a url and return the parsed JSON response
+
+    endpoint names the call in the request instrumentation.
+    '''
+    if not instrumentation.isEnabled():
+        return requests.get(url, params=params).json()
+    start = time.perf_counter()
+    try:
+        r = requests.get(url, params=params)
+    except requests.RequestException as e:
+        instrumentation.observeRequest(endpoint, time.perf_counter() - start, type(e).__name__)
+        raise
+    instrumentation.observeRequest(endpoint, time.perf_counter() - start, r.status_code)
+    return r.json()
 
 
 # api calls
 
 def id_to_assessment(id, token):
-    url = 'http://apiv3.iucnredlist.org/api/v3/species/id/{}'.format(str(id))
+    url = '{}/species/id/{}'.format(BASE_URL, str(id))
     payload = {'token':token}
-    r = requests.get(url, params=payload)
-    return r.json()
+    return _get('species/id', url, payload)
 
 
 def name_to_assessment(name, token):
-    url = 'http://apiv3.iucnredlist.org/api/v3/species/{}'.format(str(name))
+    url = '{}/species/{}'.format(BASE_URL, str(name))
     payload = {'token':token}
-    r = requests.get(url, params=payload)
-    return r.json()
+    return _get('species/name', url, payload)
 
 
 def id_to_habitats(id, token):
-    url = 'http://apiv3.iucnredlist.org/api/v3/habitats/species/id/{}'.format(str(id))
+    url = '{}/habitats/species/id/{}'.format(BASE_URL, str(id))
     payload = {'token':token}
-    r = requests.get(url, params=payload)
-    return r.json()
+    return _get('habitats/species/id', url, payload)
 
 
 def name_to_habitats(name, token):
-    url = 'http://apiv3.iucnredlist.org/api/v3/habitats/species/name/{}'.format(str(name))
+    url = '{}/habitats/species/name/{}'.format(BASE_URL, str(name))
     payload = {'token':token}
-    r = requests.get(url, params=payload)
-    return r.json()
+    return _get('habitats/species/name', url, payload)
 
 
 def name_to_weblink(name):
-    url = 'https://apiv3.iucnredlist.org/api/v3/weblink/{}'.format(str(name))
-    r = requests.get(url)
-    return r.json()
+    url = '{}/weblink/{}'.format(BASE_URL, str(name))
+    return _get('weblink', url)
+
+
+def species_page(page, token):
+    url = '{}/species/page/{}'.format(BASE_URL, str(page))
+    payload = {'token':token}
+    return _get('species/page', url, payload)
+
+
+def region_species_page(region, page, token):
+    url = '{}/species/region/{}/page/{}'.format(BASE_URL, str(region), str(page))
+    payload = {'token':token}
+    return _get('species/region/page', url, payload)
+
+
+def region_list(token):
+    url = '{}/region/list'.format(BASE_URL)
+    payload = {'token':token}
+    return _get('region/list', url, payload)
 
 
 # custom call manipulations
@@ -60,3 +124,81 @@ def id_to_assessmentID(id, token):
     aID = name_to_assessmentID(name)
     return aID
 
+
+# paged listings
+
+# Species page listing field: assessment field
+PAGE_FIELDS = {
+    'taxonid':             'taxonid',
+    'scientific_name':     'scientific_name',
+    'kingdom_name':        'kingdom',
+    'phylum_name':         'phylum',
+    'class_name':          'class',
+    'order_name':          'order',
+    'family_name':         'family',
+    'genus_name':          'genus',
+    'main_common_name':    'main_common_name',
+    'taxonomic_authority': 'authority',
+    'category':            'category'
+    }
+
+# Fields of species/id assessment records
+ASSESSMENT_FIELDS = (
+    'taxonid', 'scientific_name', 'kingdom', 'phylum', 'class', 'order', 'family', 'genus',
+    'main_common_name', 'authority', 'published_year', 'assessment_date', 'category', 'criteria',
+    'population_trend', 'marine_system', 'freshwater_system', 'terrestrial_system', 'assessor',
+    'reviewer', 'aoo_km2', 'eoo_km2', 'elevation_upper', 'elevation_lower', 'depth_upper',
+    'depth_lower', 'errata_flag', 'errata_reason', 'amended_flag', 'amended_reason'
+    )
+
+
+def iterSpeciesPages(token, region = None, prefetch = 2, start = 0):
+    '''Yield the species records of the paged species listing, page by page
+
+    Pages (of up to 10,000 species) are requested in order, with up to
+    prefetch pages in flight, until an empty page. region restricts the
+    listing to a region identifier (see region_list).
+
+    Raises ValueError if the API returns an error message.
+    '''
+    def fetch(page):
+        return species_page(page, token) if region is None else region_species_page(region, page, token)
+
+    with ThreadPoolExecutor(max_workers=max(1, prefetch), thread_name_prefix='redlist-pages') as pool:
+        inflight = collections.deque(pool.submit(fetch, p) for p in range(start, start + max(1, prefetch)))
+        page = start + len(inflight)
+        try:
+            while True:
+                response = inflight.popleft().result()
+                if 'message' in response:
+                    raise ValueError(response['message'])
+                if len(response.get('result', [])) == 0:
+                    return
+                inflight.append(pool.submit(fetch, page))
+                page += 1
+                yield response['result']
+        finally:
+            for future in inflight:
+                future.cancel()
+
+
+def pageRecordToAssessment(record):
+    '''Convert a species page record into a species/id assessment response
+
+    The response can be passed to taxonFromAPIResults. Page listings only
+    carry the taxonomy, category and main common name: other fields (e.g.
+    elevations and systems) are None.
+    '''
+    result = dict.fromkeys(ASSESSMENT_FIELDS)
+    for field, key in PAGE_FIELDS.items():
+        result[key] = record.get(field)
+    return {'name': record.get('scientific_name'), 'result': [result]}
+
+
+def iterAssessments(token, region = None, prefetch = 2):
+    '''Yield assessment responses (see pageRecordToAssessment) of all species
+    of the paged species listing (see iterSpeciesPages)'''
+    for records in iterSpeciesPages(token, region, prefetch):
+        for record in records:
+            yield pageRecordToAssessment(record)
+
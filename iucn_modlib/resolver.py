@@ -0,0 +1,378 @@
+#!/usr/bin/python3
+
+"""Tiered taxon resolution
+
+A TaxonResolver resolves a list of taxa (ids or names) over an ordered list
+of tiers, e.g. cache -> batch download -> JSON bundle -> SQLite mirror ->
+KBA database -> Red List API. Each taxon is built by the first (cheapest)
+tier that holds it: a tier receives all the taxa the tiers before it did
+not resolve, in one call, so that it can check them in bulk, and passes its
+misses on to the next tier. Taxa resolved by later tiers are stored in
+earlier tiers that accept them (e.g. the cache). Tier hit rates are
+reported, so that runs only make API calls for data not held locally.
+
+Examples:
+    from iucn_modlib import resolver
+    taxonResolver = resolver.TaxonResolver([
+        ('cache', iucn_modlib.TaxonCache(10000)),
+        ('batch', 'redlist_2023_1/'),
+        ('bundle', 'species.jsonl'),
+        ('api', token, {'workers': 8})
+        ])
+    resolution = taxonResolver.resolve([22823, 'Panthera leo', 2345])
+    resolution.taxa, resolution.missing
+    print(resolution.summary())
+    taxonResolver.stats()   # cumulative over resolve calls
+"""
+
+import collections
+import numbers
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Callable
+
+from . import instrumentation
+
+
+@dataclass
+class Tier:
+    """A resolver Tier dataclass.
+
+    name: str: The tier name in statistics.
+    fetch: callable: A function of (species, fixElevation, fixHabitats),
+        where species is a list of taxon ids or names, returning a dict of
+        species: Taxon for the species the tier holds. Species the tier
+        holds but failed to build (e.g. a network error) can be given an
+        Exception value instead: they are counted as errors and passed on
+        to the next tier.
+    store: callable: An optional function of (taxa, fixElevation,
+        fixHabitats), receiving a dict of species: Taxon resolved by later
+        tiers (e.g. to fill a cache).
+    identity: hashable: The identity of the tier's source (see
+        sourceIdentity), or None if it has no stable identity.
+    bind: callable: An optional function of the list of the tiers after
+        this one, called by TaxonResolver, returning the Tier to use (e.g.
+        a cache tier keyed on the sources of the later tiers).
+    """
+    name: str
+    fetch: Callable
+    store: Callable = None
+    identity: object = None
+    bind: Callable = None
+
+
+def _build(factory, species, workers = 1, isMiss = None):
+    """Internal: {species: Taxon or Exception} of factory(species), for species held by a tier
+
+    Errors for which isMiss is true (default: any ValueError, as raised for
+    species not found) are misses, and are left out.
+    """
+    def build(s):
+        try:
+            return s, factory(s)
+        except Exception as e:
+            if isMiss(e) if isMiss is not None else isinstance(e, ValueError):
+                return s, None
+            return s, e
+    if workers > 1 and len(species) > 1:
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='resolver') as pool:
+            results = list(pool.map(build, species))
+    else:
+        results = [build(s) for s in species]
+    return {s: t for s, t in results if t is not None}
+
+
+def _chunks(values, size = 500):
+    # stay below the SQLite limit on query parameters
+    for i in range(0, len(values), size):
+        yield values[i:i + size]
+
+
+def cacheTier(cache = None, name = 'cache', identity = None):
+    """A Tier of a TaxonCache (the default taxon cache if None)
+
+    Taxa resolved by later tiers are stored in the cache, keyed on identity.
+    By default, the identity is that of the sources of the later tiers, set
+    when the tier is added to a TaxonResolver, so that resolvers over other
+    sources (e.g. another batch release) sharing the cache do not serve each
+    other's taxa. Pass an identity (e.g. a name) to share cached taxa
+    between resolvers deliberately, or when later tiers have no stable
+    identity.
+    """
+    from .classes.TaxonCache import taxonCache
+    cache = taxonCache(cache)
+    if cache is None:
+        raise ValueError('No taxon cache: pass a TaxonCache, or set one with setTaxonCache.')
+
+    def tier(key):
+        def fetch(species, fixElevation, fixHabitats):
+            if key is None:
+                raise ValueError(f"Cache tier '{name}' has no identity: add it to a TaxonResolver, or pass an identity.")
+            found = {}
+            for s in species:
+                taxon = cache.get(key, s, fixElevation, fixHabitats)
+                if taxon is not None:
+                    found[s] = taxon
+            return found
+
+        def store(taxa, fixElevation, fixHabitats):
+            for s, taxon in taxa.items():
+                cache.put(key, s, fixElevation, fixHabitats, taxon)
+
+        def bind(later):
+            if identity is not None:
+                return tier(('resolver', identity))
+            identities = tuple(t.identity for t in later)
+            if any(i is None for i in identities):
+                raise ValueError(f"The tiers after '{name}' have no stable identity: pass an identity to cacheTier.")
+            return tier(('resolver',) + identities)
+        return Tier(name, fetch, store, key, bind)
+    return tier(None if identity is None else ('resolver', identity))
+
+
+def batchTier(source, name = 'batch'):
+    """A Tier of a batch source (dict, folder or zip archive, see loadBatchSource)"""
+    from .factories.TaxonFactories import loadBatchSource, TaxonFactoryRedListBatch
+    from .batch.NameIndex import batchNameIndex
+    from .classes.TaxonCache import sourceIdentity
+    identity = ('batch', sourceIdentity(source))
+    if not isinstance(source, dict):
+        source = loadBatchSource(source)
+    taxonids = set(source['assessments'].internalTaxonId.tolist())
+    names = batchNameIndex(source)
+
+    def fetch(species, fixElevation, fixHabitats):
+        held = [s for s in species if (s in taxonids if isinstance(s, int) else s in names)]
+        return _build(lambda s: TaxonFactoryRedListBatch(s, source, fixElevation, fixHabitats, cache = False), held)
+    return Tier(name, fetch, identity = identity)
+
+
+def bundleTier(bundle, name = 'bundle'):
+    """A Tier of a RedListAPIJsonBundle (path or object)"""
+    from .classes.RedListAPIJsonBundle import RedListAPIJsonBundle
+    from .factories.TaxonFactories import TaxonFactoryRedListAPIJsonBundle
+    from .classes.TaxonCache import sourceIdentity
+    if not isinstance(bundle, RedListAPIJsonBundle):
+        bundle = RedListAPIJsonBundle(bundle)
+
+    def fetch(species, fixElevation, fixHabitats):
+        held = [s for s in species if s in bundle]
+        return _build(lambda s: TaxonFactoryRedListAPIJsonBundle(s, bundle, fixElevation, fixHabitats, cache = False), held)
+    return Tier(name, fetch, identity = ('bundle', sourceIdentity(bundle)))
+
+
+def sqliteTier(con, name = 'sqlite'):
+    """A Tier of a SQLite mirror (path or connection, see writeBatchSQLite)
+
+    The taxa held are found with one indexed query per 500 species.
+    """
+    import sqlite3
+    from .factories.TaxonFactories import TaxonFactorySQLite
+    from .classes.TaxonCache import sourceIdentity
+    if not isinstance(con, sqlite3.Connection):
+        from .batch.SQLiteMirror import openBatchSQLite
+        con = openBatchSQLite(con)
+
+    def fetch(species, fixElevation, fixHabitats):
+        held = set()
+        for column, values in (('taxonid', [s for s in species if isinstance(s, int)]), ('scientific_name', [s for s in species if not isinstance(s, int)])):
+            for chunk in _chunks(values):
+                held.update(r[0] for r in con.execute(
+                    f'SELECT {column} FROM iucn_species WHERE {column} IN ({",".join("?" * len(chunk))})', chunk
+                    ))
+        return _build(lambda s: TaxonFactorySQLite(s, con, fixElevation, fixHabitats, cache = False), [s for s in species if s in held])
+    identity = sourceIdentity(con)
+    return Tier(name, fetch, identity = ('sqlite', identity) if identity is not None else None)
+
+
+def kbaTier(con, name = 'kbadb'):
+    """A Tier of the KBA database (a psycopg2 connection)
+
+    The taxa held are found with one query.
+    """
+    from .factories.TaxonFactories import TaxonFactoryKBADB
+    from .classes.TaxonCache import sourceIdentity
+
+    def fetch(species, fixElevation, fixHabitats):
+        ids = [s for s in species if isinstance(s, int)]
+        names = [s for s in species if not isinstance(s, int)]
+        with con.cursor() as cur:
+            cur.execute(
+                'SELECT taxonid, scientific_name FROM iucn_species WHERE taxonid = ANY(%s) OR scientific_name = ANY(%s)',
+                (ids, names)
+                )
+            held = set()
+            for taxonid, scientificName in cur.fetchall():
+                held.update((taxonid, scientificName))
+        return _build(lambda s: TaxonFactoryKBADB(s, con, fixElevation, fixHabitats, cache = False), [s for s in species if s in held])
+    identity = sourceIdentity(con)
+    return Tier(name, fetch, identity = ('kbadb', identity) if identity is not None else None)
+
+
+def apiTier(token, workers = 8, name = 'api'):
+    """A Tier of the Red List API, with workers concurrent requests
+
+    Species the API does not return (or returns without habitats) are
+    misses; other failures (e.g. API error messages, network errors) are
+    counted as errors. The tier is identified by the API base URL when it is
+    made.
+    """
+    from .factories.TaxonFactories import TaxonFactoryRedListAPI
+    from .redlist_api import v3
+
+    def isMiss(e):
+        return isinstance(e, ValueError) and str(e).endswith('returned an empty result.')
+
+    def fetch(species, fixElevation, fixHabitats):
+        return _build(lambda s: TaxonFactoryRedListAPI(s, token, fixElevation, fixHabitats, cache = False), species, workers, isMiss)
+    return Tier(name, fetch, identity = ('api', v3.BASE_URL))
+
+
+def makeTier(kind, source, options = None):
+    """Make a Tier from a configuration: a kind ('cache', 'batch', 'bundle',
+    'sqlite', 'kbadb' or 'api'), its source (e.g. a path, connection or API
+    token) and a dict of options of the tier function (e.g. name, workers)."""
+    switcher = {
+        'cache':  cacheTier,
+        'batch':  batchTier,
+        'bundle': bundleTier,
+        'sqlite': sqliteTier,
+        'kbadb':  kbaTier,
+        'api':    apiTier
+        }
+
+    def unsupported(*args, **kwargs):
+        raise ValueError(f"""Supported tiers are: '{"', '".join(switcher)}'""")
+
+    return switcher.get(kind, unsupported)(source, **(options or {}))
+
+
+def _key(species):
+    """Internal: taxon ids as int (e.g. from numpy), names as given"""
+    if isinstance(species, numbers.Integral) and not isinstance(species, bool):
+        return int(species)
+    return species
+
+
+@dataclass
+class Resolution:
+    """A resolution result dataclass
+
+    taxa: dict: species (as requested, ids as int): Taxon, in request order.
+    tiers: dict: species: the name of the tier that resolved it.
+    missing: list: The species no tier resolved.
+    errors: dict: species: [(tier name, error message)] of tier failures.
+    stats: dict: tier name: {'requested', 'hits', 'errors', 'hitRate',
+        'seconds'}, where hitRate is hits / requested.
+    """
+    taxa: dict = field(default_factory=dict)
+    tiers: dict = field(default_factory=dict)
+    missing: list = field(default_factory=list)
+    errors: dict = field(default_factory=dict)
+    stats: dict = field(default_factory=dict)
+
+    def summary(self):
+        """Return a human-readable summary"""
+        lines = [f'{len(self.taxa)} resolved, {len(self.missing)} missing']
+        for name, s in self.stats.items():
+            lines.append(
+                f"{name}: {s['hits']}/{s['requested']} hits ({s['hitRate']:.1%})"
+                + (f", {s['errors']} errors" if s['errors'] else '') + f", {s['seconds']:.2f}s"
+                )
+        return '\n'.join(lines)
+
+
+def _tierStats(requested, hits, errors, seconds):
+    return {
+        'requested': requested,
+        'hits': hits,
+        'errors': errors,
+        'hitRate': hits / requested if requested > 0 else 0.0,
+        'seconds': seconds
+        }
+
+
+class TaxonResolver:
+    """Resolve taxa over an ordered list of tiers (see the module documentation)
+
+    tiers: list: Tier objects, or (kind, source) / (kind, source, options)
+        configurations (see makeTier), cheapest first.
+    fixElevation, fixHabitats: bool: Passed to the factories.
+
+    Examples:
+        taxonResolver = TaxonResolver([('batch', source), ('api', token)])
+        resolution = taxonResolver.resolve(taxonids)
+    """
+
+    def __init__(self, tiers, fixElevation = True, fixHabitats = True):
+        self.tiers = [t if isinstance(t, Tier) else makeTier(*t) for t in tiers]
+        # last first, so that tiers are bound to bound later tiers
+        for i in reversed(range(len(self.tiers))):
+            if self.tiers[i].bind is not None:
+                self.tiers[i] = self.tiers[i].bind(self.tiers[i + 1:])
+        names = [t.name for t in self.tiers]
+        if len(set(names)) != len(names):
+            raise ValueError('Tier names must be unique.')
+        self.fixElevation = fixElevation
+        self.fixHabitats = fixHabitats
+        self._totals = {n: collections.Counter() for n in names}
+
+    def resolve(self, taxa):
+        """Resolve taxa (ids or names; duplicates are resolved once)
+
+            Returns:
+                Resolution: The taxa, the tier of each, misses, errors and
+                    the tier statistics of this call.
+        """
+        requested = list(dict.fromkeys(_key(s) for s in taxa))
+        pending = requested
+        resolution = Resolution()
+        resolvedBy = {}
+        for tier in self.tiers:
+            asked = len(pending)
+            found = {}
+            start = time.perf_counter()
+            if asked > 0:
+                with instrumentation.stage(f'resolver.{tier.name}'):
+                    found = tier.fetch(pending, self.fixElevation, self.fixHabitats)
+            seconds = time.perf_counter() - start
+            errors = 0
+            for s, taxon in found.items():
+                if isinstance(taxon, Exception):
+                    resolution.errors.setdefault(s, []).append((tier.name, f'{type(taxon).__name__}: {taxon}'))
+                    errors += 1
+                else:
+                    resolvedBy[s] = (tier.name, taxon)
+            hits = len(found) - errors
+            pending = [s for s in pending if s not in resolvedBy]
+            resolution.stats[tier.name] = _tierStats(asked, hits, errors, seconds)
+            instrumentation.count(f'resolver.{tier.name}.hits', hits)
+            totals = self._totals[tier.name]
+            totals.update({'requested': asked, 'hits': hits, 'errors': errors})
+            totals['seconds'] += seconds
+
+        # store the taxa resolved by later tiers in earlier tiers
+        for i, tier in enumerate(self.tiers):
+            if tier.store is not None:
+                later = {t.name for t in self.tiers[i + 1:]}
+                stored = {s: taxon for s, (name, taxon) in resolvedBy.items() if name in later}
+                if len(stored) > 0:
+                    tier.store(stored, self.fixElevation, self.fixHabitats)
+
+        for s in requested:
+            if s in resolvedBy:
+                resolution.tiers[s], resolution.taxa[s] = resolvedBy[s]
+            else:
+                resolution.missing.append(s)
+        return resolution
+
+    def stats(self):
+        """Return the tier statistics of all resolve calls so far (see Resolution.stats)"""
+        return {
+            name: _tierStats(t['requested'], t['hits'], t['errors'], t['seconds'])
+            for name, t in self._totals.items()
+            }
+
+
+# HIC SVNT DRACONES
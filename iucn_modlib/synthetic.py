@@ -0,0 +1,405 @@
+#!/usr/bin/python3
+
+"""Synthetic Red List data
+
+Generators of realistic, reproducible synthetic Red List batch downloads and
+API responses, at any scale. Used for benchmarks and tests; the generated
+taxa are not real species.
+"""
+
+import csv
+import json
+import os
+import random
+
+from .classes.IUCNHabitatCodes import IUCNHabitatCodes_v3_1
+
+
+# ((className, phylumName, kingdomName), relative frequency)
+CLASSES = (
+    (('AVES', 'CHORDATA', 'ANIMALIA'), 11),
+    (('MAMMALIA', 'CHORDATA', 'ANIMALIA'), 6),
+    (('AMPHIBIA', 'CHORDATA', 'ANIMALIA'), 7),
+    (('REPTILIA', 'CHORDATA', 'ANIMALIA'), 10),
+    (('ACTINOPTERYGII', 'CHORDATA', 'ANIMALIA'), 22),
+    (('INSECTA', 'ARTHROPODA', 'ANIMALIA'), 12),
+    (('GASTROPODA', 'MOLLUSCA', 'ANIMALIA'), 7),
+    (('MAGNOLIOPSIDA', 'TRACHEOPHYTA', 'PLANTAE'), 25),
+    )
+
+# (redlistCategory, relative frequency)
+CATEGORIES = (
+    ('Least Concern', 52), ('Near Threatened', 7), ('Vulnerable', 11),
+    ('Endangered', 11), ('Critically Endangered', 7), ('Data Deficient', 11),
+    ('Extinct', 1),
+    )
+
+# (systems, relative frequency)
+SYSTEMS = (
+    ('Terrestrial', 60), ('Freshwater (=Inland waters)', 10), ('Marine', 12),
+    ('Terrestrial|Freshwater (=Inland waters)', 12), ('Terrestrial|Marine', 3),
+    ('Freshwater (=Inland waters)|Marine', 2),
+    ('Terrestrial|Freshwater (=Inland waters)|Marine', 1),
+    )
+
+# Batch download seasons, as found in habitats.csv
+SEASONS = (
+    ('resident', 70), ('breeding', 8), ('non-breeding', 8), ('passage', 2),
+    ('unknown', 7), ('', 5),
+    )
+
+SUITABILITIES = (('Suitable', 85), ('Marginal', 10), ('Unknown', 5))
+
+MAJOR_IMPORTANCE = (('Yes', 35), ('No', 45), ('', 20))
+
+# Relative frequency of level-1 habitats; sub-codes share their level's weight
+HABITAT_WEIGHTS = {
+    '1': 30, '2': 4, '3': 10, '4': 6, '5': 12, '6': 3, '7': 1, '8': 2,
+    '9': 6, '10': 2, '11': 1, '12': 2, '13': 1, '14': 10, '15': 2, '16': 1,
+    '17': 1, '18': 1,
+    }
+
+SEASON_NAMES = {
+    'resident': 'Resident', 'breeding': 'Breeding Season',
+    'non-breeding': 'Non-Breeding Season', 'passage': 'Passage',
+    'unknown': 'Seasonal Occurrence Unknown', '': None,
+    }
+
+ASSESSMENT_COLUMNS = (
+    'assessmentId', 'internalTaxonId', 'scientificName', 'redlistCategory',
+    'redlistCriteria', 'yearPublished', 'assessmentDate', 'criteriaVersion',
+    'language', 'rationale', 'habitat', 'threats', 'population',
+    'populationTrend', 'range', 'useTrade', 'systems', 'conservationActions',
+    'realm', 'yearLastSeen', 'possiblyExtinct', 'possiblyExtinctInTheWild',
+    'scopes'
+    )
+
+TAXONOMY_COLUMNS = (
+    'internalTaxonId', 'scientificName', 'kingdomName', 'phylumName',
+    'className', 'orderName', 'familyName', 'genusName', 'speciesName',
+    'infraType', 'infraName', 'infraAuthority', 'subpopulationName',
+    'authority', 'taxonomicNotes'
+    )
+
+HABITAT_COLUMNS = (
+    'assessmentId', 'internalTaxonId', 'scientificName', 'code', 'name',
+    'majorImportance', 'season', 'suitability'
+    )
+
+ALL_OTHER_FIELDS_COLUMNS = (
+    'assessmentId', 'scientificName', 'internalTaxonId', 'AOO.range',
+    'EOO.range', 'DepthLower.limit', 'DepthUpper.limit',
+    'ElevationLower.limit', 'ElevationUpper.limit', 'GenerationLength.range',
+    'MovementPatterns.pattern'
+    )
+
+COMMON_NAMES_COLUMNS = (
+    'internalTaxonId', 'scientificName', 'name', 'language', 'main'
+    )
+
+
+def _choice(rng, table):
+    values = [t[0] for t in table]
+    weights = [t[1] for t in table]
+    return rng.choices(values, weights)[0]
+
+
+def _word(rng, syllables):
+    return ''.join(rng.choice(('ba', 'ce', 'di', 'fo', 'gu', 'la', 'me', 'ni', 'po', 'ru', 'sa', 'te', 'vi', 'xo', 'za')) for _ in range(syllables))
+
+
+def _habitatCount(rng):
+    """Internal: number of habitats of a species
+
+    Roughly geometric, as in the Red List: most species have 1-5 habitats,
+    few have more than 15, and about 5% have none.
+    """
+    if rng.random() < 0.05:
+        return 0
+    return min(1 + int(rng.expovariate(1 / 3.5)), 40)
+
+
+def syntheticTaxa(n, seed = 0):
+    """Generate synthetic taxa
+
+        Args:
+            n (int): The number of taxa.
+            seed (int): The random seed. The same seed yields the same taxa.
+
+        Yields:
+            dict: A taxon with 'assessment', 'taxonomy', 'other',
+                'common_names' and 'habitats' (list of dict) entries, using
+                batch download column names.
+    """
+    rng = random.Random(seed)
+    HC = IUCNHabitatCodes_v3_1()
+    codes = HC.levelCodes()
+    codeWeights = [HABITAT_WEIGHTS[c.split('.')[0]] / len(HC.toLevel(c.split('.')[0], 3)) for c in codes]
+    names = set()
+
+    for i in range(n):
+        taxonid = 1000 + i * 7 + rng.randrange(7)
+        assessmentid = 100000000 + i
+        className, phylum, kingdom = _choice(rng, CLASSES)
+        order = f'{className[:3]}ORDER{rng.randrange(max(1, n // 2000) + 3)}'
+        family = f'{order}IDAE{rng.randrange(5)}'
+        # scientific names are unique, as in the Red List
+        name = None
+        while name is None or name in names:
+            genus = _word(rng, 3).capitalize()
+            species = _word(rng, 3)
+            name = f'{genus} {species}'
+        names.add(name)
+        systems = _choice(rng, SYSTEMS)
+        # elevations are often missing, sometimes inverted or out of bounds
+        lower = rng.choice((None, None, 0, rng.randrange(-600, 3000, 10)))
+        upper = rng.choice((None, (lower or 0) + rng.randrange(0, 4000, 10), rng.randrange(0, 9500, 10)))
+        marine = 'Marine' in systems
+        habitats = []
+        for code in sorted(set(rng.choices(codes, codeWeights, k=_habitatCount(rng))), key=codes.index):
+            habitats.append({
+                'assessmentId': assessmentid,
+                'internalTaxonId': taxonid,
+                'scientificName': name,
+                'code': code,
+                'name': HC.codeName(code),
+                'majorImportance': _choice(rng, MAJOR_IMPORTANCE),
+                'season': _choice(rng, SEASONS),
+                'suitability': _choice(rng, SUITABILITIES)
+                })
+        yield {
+            'assessment': {
+                'assessmentId': assessmentid,
+                'internalTaxonId': taxonid,
+                'scientificName': name,
+                'redlistCategory': _choice(rng, CATEGORIES),
+                'redlistCriteria': rng.choice(('', 'B1ab(iii)', 'A2c', 'D2')),
+                'yearPublished': rng.randrange(1996, 2024),
+                'assessmentDate': f'{rng.randrange(1995, 2023)}-{rng.randrange(1, 13):02d}-{rng.randrange(1, 29):02d} 00:00:00 UTC',
+                'criteriaVersion': '3.1',
+                'language': 'English',
+                'rationale': 'Synthetic assessment.',
+                'habitat': 'Synthetic habitat description.',
+                'threats': '',
+                'population': '',
+                'populationTrend': rng.choice(('Stable', 'Decreasing', 'Increasing', 'Unknown')),
+                'range': '',
+                'useTrade': '',
+                'systems': systems,
+                'conservationActions': '',
+                'realm': rng.choice(('Neotropical', 'Palearctic', 'Afrotropical', 'Indomalayan', 'Australasian', 'Nearctic')),
+                'yearLastSeen': '',
+                'possiblyExtinct': 'false',
+                'possiblyExtinctInTheWild': 'false',
+                'scopes': 'Global'
+                },
+            'taxonomy': {
+                'internalTaxonId': taxonid,
+                'scientificName': name,
+                'kingdomName': kingdom,
+                'phylumName': phylum,
+                'className': className,
+                'orderName': order,
+                'familyName': family,
+                'genusName': genus,
+                'speciesName': species,
+                'infraType': '',
+                'infraName': '',
+                'infraAuthority': '',
+                'subpopulationName': '',
+                'authority': f'{_word(rng, 2).capitalize()}, {rng.randrange(1758, 2023)}',
+                'taxonomicNotes': ''
+                },
+            'other': {
+                'assessmentId': assessmentid,
+                'scientificName': name,
+                'internalTaxonId': taxonid,
+                'AOO.range': rng.choice(('', rng.randrange(4, 100000))),
+                'EOO.range': rng.choice(('', rng.randrange(4, 10000000))),
+                'DepthLower.limit': rng.randrange(0, 3000) if marine and rng.random() < 0.5 else '',
+                'DepthUpper.limit': rng.randrange(0, 200) if marine and rng.random() < 0.5 else '',
+                'ElevationLower.limit': '' if lower is None else lower,
+                'ElevationUpper.limit': '' if upper is None else upper,
+                'GenerationLength.range': rng.choice(('', round(rng.uniform(0.5, 30), 1))),
+                'MovementPatterns.pattern': rng.choice(('Not a Migrant', 'Full Migrant', 'Nomadic', ''))
+                },
+            'common_names': [
+                {
+                    'internalTaxonId': taxonid,
+                    'scientificName': name,
+                    'name': f'{_word(rng, 2).capitalize()} {className.lower()}',
+                    'language': 'English',
+                    'main': 'true' if j == 0 else 'false'
+                }
+                for j in range(rng.choice((0, 1, 1, 2, 3)))
+                ],
+            'habitats': habitats
+            }
+
+
+def writeSyntheticBatch(path, n, seed = 0):
+    """Write a synthetic Red List batch download folder
+
+    The folder holds the five tables read by loadBatchSource
+    (assessments.csv, taxonomy.csv, habitats.csv, all_other_fields.csv,
+    common_names.csv).
+
+        Args:
+            path (str): The output folder, created if needed.
+            n (int): The number of taxa.
+            seed (int): The random seed.
+
+        Returns:
+            str: The output folder.
+    """
+    os.makedirs(path, exist_ok=True)
+    files = {
+        'assessment': ('assessments.csv', ASSESSMENT_COLUMNS, csv.QUOTE_ALL),
+        'taxonomy': ('taxonomy.csv', TAXONOMY_COLUMNS, csv.QUOTE_ALL),
+        'habitats': ('habitats.csv', HABITAT_COLUMNS, csv.QUOTE_ALL),
+        'other': ('all_other_fields.csv', ALL_OTHER_FIELDS_COLUMNS, csv.QUOTE_MINIMAL),
+        'common_names': ('common_names.csv', COMMON_NAMES_COLUMNS, csv.QUOTE_ALL),
+        }
+    handles = {}
+    writers = {}
+    try:
+        for key, (filename, columns, quoting) in files.items():
+            handles[key] = open(os.path.join(path, filename), 'w', newline='')
+            writers[key] = csv.DictWriter(handles[key], fieldnames=columns, quoting=quoting)
+            writers[key].writeheader()
+        for taxon in syntheticTaxa(n, seed):
+            writers['assessment'].writerow(taxon['assessment'])
+            writers['taxonomy'].writerow(taxon['taxonomy'])
+            writers['other'].writerow(taxon['other'])
+            writers['common_names'].writerows(taxon['common_names'])
+            writers['habitats'].writerows(taxon['habitats'])
+    finally:
+        for handle in handles.values():
+            handle.close()
+    return path
+
+
+def toAPIResponses(taxon):
+    """Convert a synthetic taxon into (assessment, habitats) API responses
+    """
+    a = taxon['assessment']
+    t = taxon['taxonomy']
+    o = taxon['other']
+    mainNames = [c['name'] for c in taxon['common_names'] if c['main'] == 'true']
+
+    def number(value):
+        return None if value == '' else value
+
+    assessment = {
+        'name': a['scientificName'],
+        'result': [{
+            'taxonid': a['internalTaxonId'],
+            'scientific_name': a['scientificName'],
+            'kingdom': t['kingdomName'],
+            'phylum': t['phylumName'],
+            'class': t['className'],
+            'order': t['orderName'],
+            'family': t['familyName'],
+            'genus': t['genusName'],
+            'main_common_name': mainNames[0] if len(mainNames) > 0 else None,
+            'authority': t['authority'],
+            'published_year': a['yearPublished'],
+            'assessment_date': a['assessmentDate'][:10],
+            'category': a['redlistCategory'],
+            'criteria': a['redlistCriteria'] or None,
+            'population_trend': a['populationTrend'],
+            'marine_system': 'Marine' in a['systems'],
+            'freshwater_system': 'Freshwater' in a['systems'],
+            'terrestrial_system': 'Terrestrial' in a['systems'],
+            'assessor': 'Synthetic, A.',
+            'reviewer': 'Synthetic, R.',
+            'aoo_km2': number(o['AOO.range']),
+            'eoo_km2': number(o['EOO.range']),
+            'elevation_upper': number(o['ElevationUpper.limit']),
+            'elevation_lower': number(o['ElevationLower.limit']),
+            'depth_upper': number(o['DepthUpper.limit']),
+            'depth_lower': number(o['DepthLower.limit']),
+            'errata_flag': None,
+            'errata_reason': None,
+            'amended_flag': None,
+            'amended_reason': None
+            }]
+        }
+    habitats = {
+        'id': str(a['internalTaxonId']),
+        'result': [
+            {
+                'code': h['code'],
+                'habitat': h['name'],
+                'suitability': h['suitability'],
+                'season': SEASON_NAMES[h['season']],
+                'majorimportance': h['majorImportance'] or None
+            }
+            for h in taxon['habitats']
+            ]
+        }
+    return assessment, habitats
+
+
+def writeSyntheticAPIJsons(path, n, seed = 0):
+    """Write synthetic Red List API responses as JSON files
+
+    Writes `<taxonid>_assessment.json` and `<taxonid>_habitats.json` pairs,
+    as read by TaxonFactoryRedListAPIJsons.
+
+        Returns:
+            list: (assessment path, habitats path) pairs.
+    """
+    os.makedirs(path, exist_ok=True)
+    pairs = []
+    for taxon in syntheticTaxa(n, seed):
+        assessment, habitats = toAPIResponses(taxon)
+        taxonid = taxon['assessment']['internalTaxonId']
+        pair = (
+            os.path.join(path, f'{taxonid}_assessment.json'),
+            os.path.join(path, f'{taxonid}_habitats.json')
+            )
+        for p, response in zip(pair, (assessment, habitats)):
+            with open(p, 'w') as f:
+                json.dump(response, f)
+        pairs.append(pair)
+    return pairs
+
+
+def syntheticDEM(shape, seed = 0, nodata = -32768, ocean = 0.6):
+    """Return a synthetic DEM (int16 numpy array)
+
+    Smooth continents with relief between about -400 and 6000 m plus noise.
+    About `ocean` of the pixels are nodata, as in global DEMs.
+    """
+    import numpy
+    rng = numpy.random.default_rng(seed)
+    y, x = numpy.mgrid[0:shape[0], 0:shape[1]].astype(numpy.float32)
+    continents = (
+        numpy.sin(x / max(shape[1] / 7, 1) + rng.uniform(0, 6)) * numpy.cos(y / max(shape[0] / 5, 1) + rng.uniform(0, 6))
+        + 0.5 * numpy.sin((x + y) / max(shape[1] / 11, 1) + rng.uniform(0, 6))
+        )
+    land = continents > numpy.quantile(continents, ocean)
+    height = (continents - continents[land].min()) / (continents.max() - continents[land].min()) if land.any() else continents
+    dem = (6400 * height ** 2 - 400 + rng.normal(0, 60, shape)).clip(-400, 6000).astype(numpy.int16)
+    dem[~land] = nodata
+    return dem
+
+
+def syntheticLandCover(shape, classes, seed = 0, patch = 32):
+    """Return a synthetic land-cover raster (numpy array of classes)
+
+    Square patches of patch pixels with a random class each, and 10% of the
+    pixels reassigned at random.
+    """
+    import numpy
+    rng = numpy.random.default_rng(seed)
+    classes = numpy.asarray(classes)
+    coarse = rng.integers(0, len(classes), size=(-(-shape[0] // patch), -(-shape[1] // patch)))
+    lc = numpy.repeat(numpy.repeat(coarse, patch, axis=0), patch, axis=1)[:shape[0], :shape[1]]
+    noise = rng.random(shape) < 0.1
+    lc[noise] = rng.integers(0, len(classes), size=int(noise.sum()))
+    return classes[lc]
+
+
+# HIC SVNT DRACONES
@@ -0,0 +1,216 @@
+#!/usr/bin/python3
+
+import json
+import os
+import threading
+
+from ..classes.IUCNHabitatCodes import IUCNHabitatCodes_v3_1
+
+
+# Folder of the built-in crosswalk definitions
+CROSSWALKS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'crosswalks')
+
+
+class Crosswalk:
+    """A crosswalk from IUCN habitat codes to land-cover classes
+
+    A crosswalk is defined by a mapping of IUCN habitat codes to target
+    classes, the levels at which codes are looked up and a list of unmappable
+    codes. Each input code is cast to every level with
+    IUCNHabitatCodes_v3_1.toLevel, and the mapped classes of the resulting
+    codes (unless unmappable) are returned.
+
+    On first use the definition is compiled into a dense boolean table over
+    all IUCN habitat codes (rows, in hierarchy order) and the target classes
+    (columns), so that translating is a row lookup.
+
+    name: str: The crosswalk name.
+    mapping: dict: IUCN habitat code (str): list of target classes.
+    levels: tuple: The levels codes are looked up at (1, 2 or 3).
+    unmappable: tuple: IUCN habitat codes that do not map to any class.
+    description: str: A free text description.
+
+    Examples:
+        cw = Crosswalk('custom', {'1': [10], '1.1': [11]}, levels = (1, 2))
+        cw.translate(['1.1'])  -> [10, 11]
+    """
+
+    def __init__(self, name, mapping, levels = (1,), unmappable = (), description = None):
+        HC = IUCNHabitatCodes_v3_1()
+        for level in levels:
+            if level not in (1, 2, 3):
+                raise ValueError('Invalid level')
+        for c in list(mapping) + list(unmappable):
+            if not HC.isValid(c):
+                raise ValueError(f'Invalid habitat code {c}')
+        self.name = name
+        self.mapping = {str(k): list(v) for k, v in mapping.items()}
+        self.levels = tuple(levels)
+        self.unmappable = tuple(str(c) for c in unmappable)
+        self.description = description
+        self._table = None
+        self._lock = threading.Lock()
+
+    def _compile(self):
+        """Internal: compile the definition into the code index and lookup table"""
+        import numpy
+        HC = IUCNHabitatCodes_v3_1()
+        codes = list(HC.codes)
+        unmappable = set(self.unmappable)
+        targets = sorted(set(t for v in self.mapping.values() for t in v))
+        targetIndex = {t: i for i, t in enumerate(targets)}
+        table = numpy.zeros((len(codes), len(targets)), dtype=bool)
+        for i, c in enumerate(codes):
+            for level in self.levels:
+                for lc in HC.toLevel(c, level):
+                    if lc in unmappable:
+                        continue
+                    for t in self.mapping.get(lc, []):
+                        table[i, targetIndex[t]] = True
+        self._index = {c: i for i, c in enumerate(codes)}
+        self._targets = numpy.array(targets)
+        self._table = table
+
+    def _compiled(self):
+        if self._table is None:
+            with self._lock:
+                if self._table is None:
+                    self._compile()
+
+    @property
+    def codes(self):
+        """IUCN habitat codes of the lookup table rows"""
+        self._compiled()
+        return list(self._index)
+
+    @property
+    def targets(self):
+        """Target classes of the lookup table columns (numpy array)"""
+        self._compiled()
+        return self._targets
+
+    @property
+    def table(self):
+        """The codes x targets boolean lookup table (numpy array)"""
+        self._compiled()
+        return self._table
+
+    def encode(self, codes):
+        """Return the lookup table rows of IUCN habitat codes
+
+            Args:
+                codes: An IUCN habitat code (str or str-castable), or a list
+                    or tuple of codes.
+
+            Returns:
+                list(int): Row indices.
+        """
+        self._compiled()
+        if type(codes) not in (list, tuple):
+            codes = [codes]
+        try:
+            return [self._index[str(c)] for c in codes]
+        except KeyError as e:
+            raise ValueError(f'Invalid habitat code {e.args[0]}') from None
+
+    def translate(self, codes):
+        """Translate IUCN habitat codes to target classes
+
+            Args:
+                codes: An IUCN habitat code (str or str-castable), or a list
+                    or tuple of codes.
+
+            Returns:
+                list: The target classes, sorted.
+        """
+        rows = self.encode(codes)
+        if len(rows) == 0:
+            return []
+        return self._targets[self._table[rows].any(axis=0)].tolist()
+
+    def translateMatrix(self, habitatMatrix):
+        """Translate a HabitatMatrix into a sparse taxa x targets matrix
+
+            Returns:
+                tuple: (scipy.sparse.csr_matrix (bool), targets numpy array)
+        """
+        import scipy.sparse
+        rows = self.encode(list(habitatMatrix.codes))
+        table = scipy.sparse.csr_matrix(self.table[rows].astype('int32'))
+        translated = habitatMatrix.matrix.astype('int32') @ table
+        return (translated > 0).tocsr(), self._targets
+
+    def toDict(self):
+        """Return the definition as a JSON-serialisable dict"""
+        return {
+            'name': self.name,
+            'description': self.description,
+            'levels': list(self.levels),
+            'map': self.mapping,
+            'unmappable': list(self.unmappable)
+            }
+
+
+def loadCrosswalk(path):
+    """Load a crosswalk definition from a JSON file
+
+    The file holds an object with keys 'name', 'map' (IUCN habitat code:
+    list of target classes), and optionally 'levels' (default [1]),
+    'unmappable' and 'description'.
+    """
+    with open(path, encoding='utf-8') as f:
+        definition = json.load(f)
+    return Crosswalk(
+        name        = definition['name'],
+        mapping     = definition['map'],
+        levels      = definition.get('levels', [1]),
+        unmappable  = definition.get('unmappable', []),
+        description = definition.get('description')
+        )
+
+
+_registry = {}
+_registryLock = threading.Lock()
+
+
+def _loadBuiltins():
+    with _registryLock:
+        if len(_registry) == 0:
+            for filename in sorted(os.listdir(CROSSWALKS_PATH)):
+                if filename.endswith('.json'):
+                    cw = loadCrosswalk(os.path.join(CROSSWALKS_PATH, filename))
+                    _registry[cw.name] = cw
+
+
+def registerCrosswalk(crosswalk):
+    """Register a crosswalk, by Crosswalk object or definition file path
+
+    A registered crosswalk can be used as a translator by name, e.g. in
+    ModelParametersFactory. Registering a name again replaces it.
+
+        Returns:
+            Crosswalk: The registered crosswalk.
+    """
+    _loadBuiltins()
+    if not isinstance(crosswalk, Crosswalk):
+        crosswalk = loadCrosswalk(crosswalk)
+    with _registryLock:
+        _registry[crosswalk.name] = crosswalk
+    return crosswalk
+
+
+def getCrosswalk(name):
+    """Return a registered crosswalk by name"""
+    _loadBuiltins()
+    if name not in _registry:
+        raise ValueError(f"""Supported crosswalks are: '{"', '".join(_registry.keys())}'""")
+    return _registry[name]
+
+
+def crosswalkNames():
+    """Return the names of the registered crosswalks"""
+    _loadBuiltins()
+    return list(_registry.keys())
+
+
+# HIC SVNT DRACONES
@@ -1,3 +1,4 @@
 
 from .toJung import toJung
-from .toESACCI import toESACCI
\ No newline at end of file
+from .toESACCI import toESACCI
+from .Crosswalk import Crosswalk, loadCrosswalk, registerCrosswalk, getCrosswalk, crosswalkNames
\ No newline at end of file
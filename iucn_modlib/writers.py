@@ -0,0 +1,68 @@
+#!/usr/bin/python3
+
+import csv
+import sys
+
+
+class CSVWriter:
+    """Write rows (dicts) to a CSV file, or to stdout if path is '-'"""
+
+    def __init__(self, path):
+        self.file = sys.stdout if path == '-' else open(path, 'w', newline='')
+        self.writer = None
+
+    def write(self, rows):
+        if len(rows) == 0:
+            return
+        if self.writer is None:
+            self.writer = csv.DictWriter(self.file, fieldnames=list(rows[0].keys()))
+            self.writer.writeheader()
+        self.writer.writerows(rows)
+
+    def close(self):
+        if self.file is not sys.stdout:
+            self.file.close()
+
+
+class ParquetWriter:
+    """Write rows (dicts) to a Parquet file (requires pyarrow)"""
+
+    def __init__(self, path):
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise RuntimeError('Writing Parquet files requires pyarrow.')
+        self.pyarrow = pyarrow
+        self.path = path
+        self.writer = None
+
+    def write(self, rows):
+        if len(rows) == 0:
+            return
+        table = self.pyarrow.Table.from_pylist(rows)
+        if self.writer is None:
+            self.writer = self.pyarrow.parquet.ParquetWriter(self.path, table.schema)
+        self.writer.write_table(table.cast(self.writer.schema))
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+
+def rowWriter(path, format = None):
+    """Return a CSVWriter or ParquetWriter
+
+    The format ('csv' or 'parquet') defaults to the path extension. Writers
+    have write(rows) and close() methods.
+    """
+    if format is None:
+        format = 'parquet' if path.endswith('.parquet') else 'csv'
+    switcher = {
+        'csv': CSVWriter,
+        'parquet': ParquetWriter
+        }
+    return switcher[format](path)
+
+
+# HIC SVNT DRACONES
@@ -16,6 +16,7 @@ setuptools.setup(
     long_description_content_type="text/markdown",
     url="https://gitlab.com/daniele.baisero/iucn-modlib",
     packages=setuptools.find_packages(),
+    package_data={'iucn_modlib.translator': ['crosswalks/*.json']},
     license=license,
     license_files = ('LICENSE.txt',),
     classifiers=[
@@ -24,5 +25,9 @@ setuptools.setup(
         "Operating System :: OS Independent",
         ],
     python_requires='>=3.8',
-    install_requires=['requests', 'pandas', 'numpy']
+    install_requires=['requests', 'pandas', 'numpy'],
+    extras_require={'parquet': ['pyarrow'], 'sparse': ['scipy']},
+    entry_points={
+        'console_scripts': ['iucn-modlib=iucn_modlib.cli:main']
+        }
     )
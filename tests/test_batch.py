@@ -0,0 +1,195 @@
+import shutil
+import pytest
+import pandas
+import iucn_modlib
+from iucn_modlib import batch, instrumentation, synthetic
+
+
+def test_fingerprints_are_stable(tmp_path):
+    a = iucn_modlib.loadBatchSource('tests/data/red_list_batch_dummy/', fingerprints=True)
+    b = iucn_modlib.loadBatchSource('tests/data/red_list_batch_dummy/')
+    assert a['fingerprints'].equals(batch.batchFingerprints(b))
+    assert list(a['fingerprints'].index) == [2345]
+
+
+def test_diff_batch_sources(tmp_path):
+    old = str(tmp_path / 'old')
+    new = str(tmp_path / 'new')
+    synthetic.writeSyntheticBatch(old, 30)
+    shutil.copytree(old, new)
+    # reorder rows and change one habitat
+    habitats = pandas.read_csv(f'{new}/habitats.csv', dtype=str, keep_default_na=False)
+    habitats = habitats.iloc[::-1]
+    habitats.iloc[0, habitats.columns.get_loc('suitability')] = 'Marginal' if habitats.iloc[0]['suitability'] != 'Marginal' else 'Suitable'
+    changed = int(habitats.iloc[0]['internalTaxonId'])
+    habitats.to_csv(f'{new}/habitats.csv', index=False)
+    # add a species
+    synthetic.writeSyntheticBatch(str(tmp_path / 'extra'), 31)
+    for table in ('assessments', 'taxonomy', 'habitats', 'all_other_fields', 'common_names'):
+        extra = pandas.read_csv(f'{tmp_path}/extra/{table}.csv', dtype=str, keep_default_na=False)
+        current = pandas.read_csv(f'{new}/{table}.csv', dtype=str, keep_default_na=False)
+        pandas.concat([current, extra.loc[extra.internalTaxonId == extra.internalTaxonId.iloc[-1]]]).to_csv(f'{new}/{table}.csv', index=False)
+    added = int(pandas.read_csv(f'{new}/assessments.csv').internalTaxonId.iloc[-1])
+
+    manifest = str(tmp_path / 'manifest.csv')
+    batch.writeFingerprintManifest(batch.batchFingerprints(iucn_modlib.loadBatchSource(old)), manifest)
+    diff = batch.diffBatchSources(manifest, new)
+    assert diff.added == [added]
+    assert diff.removed == []
+    assert diff.changed == [changed]
+    assert diff.unchanged == 29
+    assert diff.toProcess() == sorted([added, changed])
+
+
+def test_resolve_names():
+    source = iucn_modlib.loadBatchSource('tests/data/red_list_batch_dummy/')
+    resolved, unresolved = batch.resolveNames(
+        ['Polygeminus grex', ' polygeminus  GREX ', 'Polygeminus grex ssp. trouble', 'Equus unicornis'], source
+        )
+    assert resolved == {'Polygeminus grex': 2345, ' polygeminus  GREX ': 2345, 'Polygeminus grex ssp. trouble': 2345}
+    assert unresolved == ['Equus unicornis']
+    resolved, unresolved = batch.resolveNames([' polygeminus  GREX '], source, normalise=False)
+    assert unresolved == [' polygeminus  GREX ']
+    # infraspecific taxa in the source resolve to their own taxon ID
+    source = {'assessments': pandas.DataFrame({
+        'scientificName': ['Polygeminus grex', 'Polygeminus grex ssp. trouble'],
+        'internalTaxonId': [2345, 2346]
+        })}
+    resolved, unresolved = batch.resolveNames(['Polygeminus grex ssp. trouble', 'Polygeminus grex ssp. bother'], source)
+    assert resolved == {'Polygeminus grex ssp. trouble': 2346, 'Polygeminus grex ssp. bother': 2345}
+
+
+def test_source_index_follows_tables():
+    source = iucn_modlib.loadBatchSource('tests/data/red_list_batch_dummy/')
+    assert batch.batchNameIndex(source) == {'Polygeminus grex': 2345}
+    # a copy with another assessments table does not reuse the copied index
+    renamed = dict(source, assessments=source['assessments'].assign(scientificName='Polygeminus trouble'))
+    assert batch.batchNameIndex(renamed) == {'Polygeminus trouble': 2345}
+    assert batch.batchNameIndex(source) == {'Polygeminus grex': 2345}
+    source['assessments'] = renamed['assessments']
+    assert batch.batchNameIndex(source) == {'Polygeminus trouble': 2345}
+
+
+def test_batch_factory_by_name():
+    source = iucn_modlib.loadBatchSource('tests/data/red_list_batch_dummy/')
+    assert iucn_modlib.TaxonFactoryRedListBatch('Polygeminus grex', source).taxonid == 2345
+    with pytest.raises(ValueError):
+        iucn_modlib.TaxonFactoryRedListBatch('Equus unicornis', source)
+
+
+@pytest.mark.parametrize("by", ['hash', 'class'])
+def test_shard_batch_source(tmp_path, by):
+    synthetic.writeSyntheticBatch(str(tmp_path / 'batch'), 40)
+    manifest = batch.shardBatchSource(str(tmp_path / 'batch'), str(tmp_path / 'shards'), 3, by=by)
+    assert sum(s['taxa'] for s in manifest['shards']) == 40
+    full = batch.batchFingerprints(iucn_modlib.loadBatchSource(str(tmp_path / 'batch')))
+    parts = [batch.batchFingerprints(iucn_modlib.loadBatchSource(p)) for p in batch.readShardManifest(str(tmp_path / 'shards'))]
+    # every taxon is in exactly one shard, with identical rows
+    assert pandas.concat(parts).sort_index().equals(full.sort_index())
+
+
+def test_merge_shard_outputs(tmp_path):
+    pandas.DataFrame({'taxonid': [10, 2], 'value': ['b', 'a']}).to_csv(tmp_path / 'a.csv', index=False)
+    pandas.DataFrame({'taxonid': [5], 'value': ['c']}).to_csv(tmp_path / 'b.csv', index=False)
+    n = batch.mergeShardOutputs([str(tmp_path / 'b.csv'), str(tmp_path / 'a.csv')], str(tmp_path / 'merged.csv'))
+    assert n == 3
+    assert list(pandas.read_csv(tmp_path / 'merged.csv').taxonid) == [2, 5, 10]
+    # numeric values sort numerically even when some values are not numeric
+    pandas.DataFrame({'taxonid': ['10', 'x', '2', ''], 'value': ['a', 'b', 'c', 'd']}).to_csv(tmp_path / 'c.csv', index=False)
+    batch.mergeShardOutputs([str(tmp_path / 'c.csv')], str(tmp_path / 'merged.csv'))
+    assert list(pandas.read_csv(tmp_path / 'merged.csv', dtype=str, keep_default_na=False).taxonid) == ['2', '10', '', 'x']
+
+
+def test_concurrent_load_matches_serial(tmp_path):
+    synthetic.writeSyntheticBatch(str(tmp_path), 50)
+    serial = iucn_modlib.loadBatchSource(str(tmp_path), workers=1)
+    concurrent = iucn_modlib.loadBatchSource(str(tmp_path), workers=5, engine='auto')
+    assert list(concurrent) == list(serial)
+    for table in serial:
+        assert concurrent[table].equals(serial[table])
+    assert 'assid' in concurrent['habitats'].columns
+    with pytest.raises(ValueError):
+        iucn_modlib.loadBatchSource(str(tmp_path), engine='python3')
+
+
+def _zipBatch(folder, path, prefix = ''):
+    import os, zipfile
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as z:
+        z.writestr(prefix + 'README.txt', 'unrelated member')
+        for filename in sorted(os.listdir(folder)):
+            z.write(os.path.join(folder, filename), prefix + filename)
+    return path
+
+
+@pytest.mark.parametrize("prefix", ['', 'redlist_species_data/'])
+def test_load_zip_archive(tmp_path, prefix):
+    synthetic.writeSyntheticBatch(str(tmp_path / 'batch'), 30)
+    archive = _zipBatch(str(tmp_path / 'batch'), str(tmp_path / 'batch.zip'), prefix)
+    folder = iucn_modlib.loadBatchSource(str(tmp_path / 'batch'))
+    zipped = iucn_modlib.loadBatchSource(archive)
+    assert list(zipped) == list(folder)
+    for table in folder:
+        assert zipped[table].equals(folder[table])
+    taxonid = int(folder['assessments'].internalTaxonId.iloc[0])
+    assert iucn_modlib.TaxonFactoryRedListBatch(taxonid, archive, cache=False).taxonid == taxonid
+
+    subset = iucn_modlib.loadBatchSource(archive, tables=('habitats', 'assessments'))
+    assert list(subset) == ['assessments', 'habitats']
+    with pytest.raises(ValueError):
+        iucn_modlib.loadBatchSource(archive, tables=())
+
+
+def test_load_zip_missing_member(tmp_path):
+    import zipfile
+    with zipfile.ZipFile(tmp_path / 'batch.zip', 'w') as z:
+        z.writestr('assessments.csv', 'internalTaxonId\n1\n')
+    with pytest.raises(FileNotFoundError):
+        iucn_modlib.loadBatchSource(str(tmp_path / 'batch.zip'))
+    assert list(iucn_modlib.loadBatchSource(str(tmp_path / 'batch.zip'), tables=['assessments'])) == ['assessments']
+
+
+def test_parsed_table_cache(tmp_path):
+    synthetic.writeSyntheticBatch(str(tmp_path / 'batch'), 30)
+    archive = _zipBatch(str(tmp_path / 'batch'), str(tmp_path / 'batch.zip'))
+    cache = tmp_path / 'cache'
+    cold = iucn_modlib.loadBatchSource(archive, cacheDir=str(cache))
+    assert len(list(cache.glob('*.pkl'))) == 5
+    instrumentation.enable()
+    instrumentation.reset()
+    try:
+        warm = iucn_modlib.loadBatchSource(archive, cacheDir=str(cache))
+        stages = instrumentation.snapshot()['stages']
+    finally:
+        instrumentation.disable()
+        instrumentation.reset()
+    assert not any(s.startswith('batch.read.') for s in stages)
+    assert 'batch.cache.habitats' in stages
+    for table in cold:
+        assert warm[table].equals(cold[table])
+    # the folder's files have other fingerprints
+    iucn_modlib.loadBatchSource(str(tmp_path / 'batch'), cacheDir=str(cache))
+    assert len(list(cache.glob('*.pkl'))) == 10
+
+
+def test_parsed_table_cache_key(tmp_path, monkeypatch):
+    synthetic.writeSyntheticBatch(str(tmp_path / 'batch'), 10)
+    archive = _zipBatch(str(tmp_path / 'batch'), str(tmp_path / 'batch.zip'))
+    cache = tmp_path / 'cache'
+    source = iucn_modlib.loadBatchSource(archive, cacheDir=str(cache))
+    assert len(list(cache.glob('*.pkl'))) == 5
+    # pickles written by other pandas versions are not read
+    monkeypatch.setattr(pandas, '__version__', '0.0.0')
+    iucn_modlib.loadBatchSource(archive, cacheDir=str(cache))
+    assert len(list(cache.glob('*.pkl'))) == 10
+    # the factory can load a zip archive through the cache
+    taxonid = int(source['assessments'].internalTaxonId.iloc[0])
+    instrumentation.enable()
+    instrumentation.reset()
+    try:
+        taxon = iucn_modlib.TaxonFactoryRedListBatch(taxonid, archive, cacheDir=str(cache), cache=False)
+        stages = instrumentation.snapshot()['stages']
+    finally:
+        instrumentation.disable()
+        instrumentation.reset()
+    assert not any(s.startswith('batch.read.') for s in stages)
+    assert taxon == iucn_modlib.TaxonFactoryRedListBatch(taxonid, source, cache=False)
@@ -0,0 +1,155 @@
+import csv
+import json
+import pytest
+import iucn_modlib
+from iucn_modlib import cli, synthetic
+
+
+def test_model_parameters():
+    tribble = iucn_modlib.TaxonFactoryRedListBatch(2345, 'tests/data/red_list_batch_dummy/')
+    params = iucn_modlib.ModelParametersFactory(tribble, 'kba_breeding', 'jung')
+    assert params.habitat_filter == 'kba_breeding'
+    assert params.elevation_lower == 950
+    assert params.elevation_upper == 9000
+    assert params.land_cover_codes == [100, 104]
+
+
+def test_export(tmp_path):
+    output = str(tmp_path / 'parameters.csv')
+    status = cli.main([
+        'export', 'tests/data/red_list_batch_dummy/',
+        '--translator', 'esacci', '--output', output, '--workers', '2', '--quiet'
+        ])
+    assert status == 0
+    with open(output) as f:
+        rows = list(csv.DictReader(f))
+    assert [r['habitat_filter'] for r in rows] == ['kba_breeding', 'kba_nonbreeding']
+    assert rows[0]['taxonid'] == '2345'
+    assert rows[0]['land_cover_codes'].startswith('40|50|60')
+
+
+def test_export_registered_crosswalk(tmp_path):
+    crosswalk = tmp_path / 'custom.json'
+    crosswalk.write_text(json.dumps({'name': 'custom_cli', 'map': {'1': [10]}}))
+    output = str(tmp_path / 'parameters.csv')
+    status = cli.main([
+        'export', 'tests/data/red_list_batch_dummy/', '--crosswalk', str(crosswalk),
+        '--translator', 'custom_cli', '--output', output, '--workers', '2', '--quiet'
+        ])
+    assert status == 0
+    with open(output) as f:
+        assert [r['land_cover_codes'] for r in csv.DictReader(f)] == ['10', '10']
+    with pytest.raises(ValueError):
+        cli.main(['export', 'tests/data/red_list_batch_dummy/', '--translator', 'unknown', '--quiet'])
+
+
+def test_export_order(tmp_path):
+    batch = str(tmp_path / 'batch')
+    synthetic.writeSyntheticBatch(batch, 30)
+    # rows are written in taxon order, whatever the number of workers
+    for workers in ('1', '3'):
+        cli.main(['export', batch, '-t', 'jung', '-o', str(tmp_path / f'{workers}.csv'), '-w', workers, '--chunk-size', '2', '-q'])
+    with open(tmp_path / '1.csv') as a, open(tmp_path / '3.csv') as b:
+        assert list(csv.DictReader(a)) == list(csv.DictReader(b))
+
+
+def test_model_parameters_cache(tmp_path):
+    tribble = iucn_modlib.TaxonFactoryRedListBatch(2345, 'tests/data/red_list_batch_dummy/')
+    with iucn_modlib.ParameterCache(str(tmp_path / 'cache.sqlite'), maxEntries=1) as cache:
+        first = iucn_modlib.ModelParametersFactory(tribble, 'kba_breeding', 'jung', cache=cache)
+        second = iucn_modlib.ModelParametersFactory(tribble, 'kba_breeding', 'jung', cache=cache)
+        assert first == second
+        assert (cache.hits, cache.misses) == (1, 1)
+        iucn_modlib.ModelParametersFactory(tribble, 'kba_breeding', 'esacci', cache=cache)
+        assert len(cache) == 1
+
+
+def test_parameter_cache_eviction(tmp_path):
+    with iucn_modlib.ParameterCache(str(tmp_path / 'cache.sqlite'), maxEntries=2) as cache:
+        cache.put('a', {'v': 1})
+        cache.put('b', {'v': 2})
+        changes = cache._con.total_changes
+        assert cache.get('a') == {'v': 1}
+        # lookups do not write
+        assert cache._con.total_changes == changes
+        cache.put('c', {'v': 3})
+        # the access time of 'a' is written before eviction: 'b' is evicted
+        assert ('a' in cache, 'b' in cache, 'c' in cache) == (True, False, True)
+    with iucn_modlib.ParameterCache(str(tmp_path / 'batched.sqlite'), maxEntries=10, pruneEvery=5) as cache:
+        cache.putMany({str(i): {'v': i} for i in range(12)})
+        assert len(cache) == 10
+        for i in range(3):
+            cache.put(f'x{i}', {'v': i})
+        # bound checked every 5 insertions
+        assert len(cache) == 13
+
+
+def test_export_cache(tmp_path):
+    outputs = []
+    for i in range(2):
+        output = str(tmp_path / f'parameters_{i}.csv')
+        metrics = str(tmp_path / f'metrics_{i}.json')
+        cli.main([
+            'export', 'tests/data/red_list_batch_dummy/', '--translator', 'jung',
+            '--output', output, '--cache', str(tmp_path / 'cache.sqlite'),
+            '--metrics', metrics, '--workers', '1', '--quiet'
+            ])
+        with open(output) as f:
+            outputs.append(f.read())
+    with open(metrics) as f:
+        assert json.load(f)['counters'] == {'cache.hits': 2, 'cache.misses': 0}
+    assert outputs[0] == outputs[1]
+
+
+def test_parameter_groups():
+    params = [
+        iucn_modlib.ModelParameters(1, 'a', 'kba_breeding', 'jung', 0, 1000, ['1.4'], [104, 100]),
+        iucn_modlib.ModelParameters(2, 'b', 'kba_breeding', 'jung', 0, 1000, ['1.4', '1'], [100, 104]),
+        iucn_modlib.ModelParameters(3, 'c', 'kba_breeding', 'jung', 0, 1200, ['1.4'], [100, 104]),
+        iucn_modlib.ModelParameters(4, 'd', 'kba_nonbreeding', 'jung', 0, 1000, ['1.4'], [100, 104]),
+        ]
+    assert params[0].signature() == params[1].signature()
+    assert params[0].signatureHash() == params[1].signatureHash() != params[2].signatureHash()
+    groups = iucn_modlib.groupParameters(params)
+    assert len(groups) == 3
+    assert groups.members == [[0, 1], [2], [3]]
+    assert groups.ratio == 4 / 3
+    assert groups.fanOut(['x', 'y', 'z']) == ['x', 'x', 'y', 'z']
+    # crosswalks can have non-integer targets
+    named = iucn_modlib.ModelParameters(5, 'e', 'kba_breeding', 'names', 0, 1000, ['1.4'], ['forest', 104, 'grassland', '100'])
+    assert named.signature()[2] == (100, 104, 'forest', 'grassland')
+    assert len(named.signatureHash()) == 16
+
+
+def test_export_signatures(tmp_path):
+    output = str(tmp_path / 'parameters.csv')
+    cli.main([
+        'export', 'tests/data/red_list_batch_dummy/', '--translator', 'jung',
+        '--output', output, '--workers', '1', '--signatures', '--quiet'
+        ])
+    with open(output) as f:
+        rows = list(csv.DictReader(f))
+    assert all(len(r['signature']) == 16 for r in rows)
+
+
+def test_parameter_cache_threads(tmp_path):
+    import threading
+    with iucn_modlib.ParameterCache(str(tmp_path / 'cache.sqlite'), pruneEvery=7, flushEvery=3) as cache:
+        def work(n):
+            for i in range(50):
+                cache.put(f'{n}-{i}', {'v': i})
+                assert cache.get(f'{n}-{i}') == {'v': i}
+        threads = [threading.Thread(target=work, args=(n,)) for n in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert (len(cache), cache.hits, cache.misses) == (400, 400, 0)
+
+
+def test_parameter_key_version(monkeypatch):
+    from iucn_modlib.classes import ParameterCache
+    key = ParameterCache.parameterKey('input', 'kba_breeding', 'jung')
+    assert ParameterCache.parameterKey('input', 'kba_breeding', 'jung') == key
+    monkeypatch.setattr(ParameterCache, '_PARAMETER_CACHE_VERSION', ParameterCache._PARAMETER_CACHE_VERSION + 1)
+    assert ParameterCache.parameterKey('input', 'kba_breeding', 'jung') != key
@@ -0,0 +1,43 @@
+import pytest
+import iucn_modlib
+from iucn_modlib import synthetic, HabitatFilters
+
+
+@pytest.fixture(scope='module')
+def source(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp('batch'))
+    synthetic.writeSyntheticBatch(path, 200)
+    return iucn_modlib.loadBatchSource(path)
+
+
+@pytest.mark.parametrize('translator', [None, 'jung', 'esacci'])
+def test_filter_table_matches_parameters(source, translator):
+    custom = HabitatFilters(season = ('Resident',), suitability = ('Suitable',))
+    filters = {'kba_breeding': 'kba_breeding', 'kba_nonbreeding': 'kba_nonbreeding', 'resident': custom, 'all': None}
+    table = iucn_modlib.FilterTableFactory(source, filters, translator)
+    taxonids = source['assessments'].internalTaxonId.tolist()
+    assert len(table) == len(filters) * len(taxonids)
+    assert table.habitat_filter.unique().tolist() == list(filters)
+    rows = {(r.taxonid, r.habitat_filter): r for r in table.itertuples()}
+    order = {c: i for i, c in enumerate(iucn_modlib.IUCNHabitatCodes_v3_1().codes)}
+    for taxonid in taxonids:
+        taxon = iucn_modlib.TaxonFactoryRedListBatch(taxonid, source)
+        for name, f in filters.items():
+            params = iucn_modlib.ModelParametersFactory(taxon, f, translator)
+            row = rows[(taxonid, name)]
+            assert row.habitat_codes == sorted(set(params.habitat_codes), key=order.get)
+            assert row.land_cover_codes == params.land_cover_codes
+
+
+def test_filter_table_names(source):
+    table = iucn_modlib.FilterTableFactory(source, ['kba_breeding', HabitatFilters(season = ('Passage',))])
+    assert table.habitat_filter.unique().tolist() == ['kba_breeding', 'custom']
+    with pytest.raises(ValueError):
+        iucn_modlib.FilterTableFactory(source, [HabitatFilters(), HabitatFilters()])
+    with pytest.raises(ValueError):
+        iucn_modlib.FilterTableFactory(source, ['kba_breeding'], 'not_a_crosswalk')
+
+
+def test_filter_table_dummy_batch():
+    table = iucn_modlib.FilterTableFactory('tests/data/red_list_batch_dummy/', 'kba_breeding', 'jung')
+    assert table.taxonid.tolist() == [2345]
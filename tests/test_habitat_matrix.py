@@ -0,0 +1,64 @@
+import pytest
+import iucn_modlib
+from iucn_modlib import synthetic, HabitatFilters, IUCNHabitatCodes_v3_1
+
+pytest.importorskip('scipy')
+
+
+@pytest.fixture(scope='module')
+def source(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp('batch'))
+    synthetic.writeSyntheticBatch(path, 200)
+    return iucn_modlib.loadBatchSource(path)
+
+
+@pytest.mark.parametrize('filters', [None, 'kba_breeding', HabitatFilters(season = ('Resident',), suitability = ('Suitable',))])
+def test_matrix_matches_taxa(source, filters):
+    matrix = iucn_modlib.HabitatMatrixFactory(source, filters)
+    if isinstance(filters, str):
+        filters = iucn_modlib.HabitatFiltersFactory(filters)
+    assert matrix.shape == (200, len(matrix.codes))
+    for taxonid in matrix.taxonids:
+        taxon = iucn_modlib.TaxonFactoryRedListBatch(taxonid, source)
+        assert matrix.habitatCodes(taxonid) == sorted(set(taxon.habitatCodes(filters)), key=matrix.columns.get)
+
+
+@pytest.mark.parametrize('level', [1, 2])
+def test_matrix_roll_up(source, level):
+    HC = IUCNHabitatCodes_v3_1()
+    matrix = iucn_modlib.HabitatMatrixFactory(source, 'kba_nonbreeding', level = level)
+    assert matrix.level == level
+    assert all(HC.codeLevel(c) <= level for c in matrix.codes)
+    for taxonid in matrix.taxonids[:50]:
+        codes = iucn_modlib.TaxonFactoryRedListBatch(taxonid, source).habitatCodes(iucn_modlib.HabitatFiltersFactory('kba_nonbreeding'))
+        assert sorted(matrix.habitatCodes(taxonid)) == sorted(HC.toLevel(codes, level) if codes else [])
+
+
+def test_matrix_from_taxa(source):
+    ids = source['assessments'].internalTaxonId.tolist()[:20]
+    taxa = [iucn_modlib.TaxonFactoryRedListBatch(t, source) for t in ids]
+    fromTaxa = iucn_modlib.HabitatMatrixFactory(taxa, 'kba_breeding')
+    fromSource = iucn_modlib.HabitatMatrixFactory(source, 'kba_breeding')
+    assert fromTaxa.taxonids == ids
+    assert all(fromTaxa.habitatCodes(t) == fromSource.habitatCodes(t) for t in ids)
+    richness = fromTaxa.richness()
+    frame = fromTaxa.toFrame()
+    assert len(frame) == fromTaxa.matrix.nnz
+    assert all(richness[c] == len(fromTaxa.taxa(c)) for c in fromTaxa.codes)
+    assert fromTaxa.cooccurrence().shape == (len(fromTaxa.codes), len(fromTaxa.codes))
+
+
+def test_matrix_dummy_batch():
+    matrix = iucn_modlib.HabitatMatrixFactory('tests/data/red_list_batch_dummy/', level = 1)
+    assert matrix.taxonids == [2345]
+    assert matrix.codes == ['1']
+    assert matrix.breadth() == {2345: 1}
+
+
+def test_translate_matrix(source):
+    matrix = iucn_modlib.HabitatMatrixFactory(source, 'kba_breeding')
+    translated, targets = iucn_modlib.translator.getCrosswalk('jung').translateMatrix(matrix)
+    assert translated.shape == (len(matrix.taxonids), len(targets))
+    for i, taxonid in enumerate(matrix.taxonids[:50]):
+        row = translated.getrow(i)
+        assert sorted(targets[row.indices].tolist()) == iucn_modlib.translator.toJung(matrix.habitatCodes(taxonid))
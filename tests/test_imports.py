@@ -0,0 +1,54 @@
+import subprocess
+import sys
+import time
+
+
+HEAVY_MODULES = ('pandas', 'numpy', 'requests')
+
+
+def run(code):
+    return subprocess.run(
+        [sys.executable, '-c', code],
+        capture_output=True, text=True, check=True
+        ).stdout.split()
+
+
+def test_import_is_light():
+    loaded = run(
+        'import sys, iucn_modlib\n'
+        'from iucn_modlib import translator, HabitatFiltersFactory, IUCNHabitatCodes_v3_1\n'
+        f'print(*[m for m in {HEAVY_MODULES!r} if m in sys.modules])'
+        )
+    assert loaded == []
+
+
+def test_factories_load_on_access():
+    loaded = run(
+        'import sys, iucn_modlib\n'
+        'iucn_modlib.TaxonFactoryRedListBatch\n'
+        f'print(*[m for m in {HEAVY_MODULES!r} if m in sys.modules])'
+        )
+    assert sorted(loaded) == sorted(HEAVY_MODULES)
+
+
+def test_api_client_import_is_light():
+    # the mock server and load tests are only loaded when imported
+    loaded = run(
+        'import sys, iucn_modlib.redlist_api\n'
+        'print(*[m for m in ("http.server", "asyncio", "iucn_modlib.synthetic") if m in sys.modules])'
+        )
+    assert loaded == []
+
+
+def test_import_time():
+    # Importing the package should cost little more than starting the
+    # interpreter. The bound is loose to be robust on slow CI runners, but
+    # eager imports of pandas and numpy exceed it.
+    def timed(code):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, '-c', code], check=True)
+        return time.perf_counter() - start
+    baseline = min(timed('pass') for _ in range(3))
+    package = min(timed('import iucn_modlib') for _ in range(3))
+    heavy = min(timed('import pandas') for _ in range(3))
+    assert package - baseline < (heavy - baseline) / 2
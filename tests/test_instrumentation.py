@@ -0,0 +1,46 @@
+import json
+import iucn_modlib
+from iucn_modlib import instrumentation
+
+
+def test_disabled_records_nothing():
+    instrumentation.disable()
+    instrumentation.reset()
+    iucn_modlib.TaxonFactoryRedListBatch(2345, 'tests/data/red_list_batch_dummy/')
+    assert instrumentation.snapshot() == {'stages': {}, 'counters': {}, 'requests': {}}
+
+
+def test_stages_and_counters():
+    instrumentation.enable()
+    instrumentation.reset()
+    try:
+        tribble = iucn_modlib.TaxonFactoryRedListBatch(2345, 'tests/data/red_list_batch_dummy/')
+        iucn_modlib.translator.toJung(tribble.habitatCodes())
+        snapshot = instrumentation.snapshot()
+    finally:
+        instrumentation.disable()
+        instrumentation.reset()
+    assert snapshot['counters'] == {'taxa.batch': 1}
+    assert snapshot['stages']['taxon.fix']['count'] == 2
+    for stage in ('batch.load', 'batch.read.habitats', 'batch.filter', 'factory.batch', 'translator.toJung'):
+        assert snapshot['stages'][stage]['count'] == 1
+    assert json.loads(json.dumps(snapshot)) == snapshot
+
+
+def test_requests_and_merge():
+    instrumentation.enable()
+    instrumentation.reset()
+    try:
+        instrumentation.observeRequest('species/id', 0.02, 200)
+        instrumentation.observeRequest('species/id', 3.0, 429)
+        snapshot = instrumentation.snapshot()
+        instrumentation.merge(snapshot)
+        merged = instrumentation.snapshot()
+    finally:
+        instrumentation.disable()
+        instrumentation.reset()
+    assert snapshot['requests']['species/id']['status'] == {'200': 1, '429': 1}
+    assert snapshot['requests']['species/id']['latency']['0.025'] == 1
+    assert snapshot['requests']['species/id']['latency']['5.0'] == 1
+    assert merged['requests']['species/id']['count'] == 4
+    assert merged['requests']['species/id']['latency']['0.025'] == 2
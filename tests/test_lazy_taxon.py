@@ -0,0 +1,70 @@
+import dataclasses
+import pytest
+import iucn_modlib
+from iucn_modlib import synthetic
+
+
+def _normalised(taxon):
+    # missing values are NaN in batch sources and None in SQLite
+    def value(v):
+        return None if v != v else v
+    fields = {k: value(v) for k, v in dataclasses.asdict(taxon).items() if k != 'habitats'}
+    fields['habitats'] = [{k: value(v) for k, v in h.items()} for h in taxon.habitats]
+    return fields
+
+
+@pytest.fixture(scope='module')
+def source(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp('batch'))
+    synthetic.writeSyntheticBatch(path, 80)
+    return iucn_modlib.loadBatchSource(path)
+
+
+@pytest.mark.parametrize("fix", [True, False])
+def test_lazy_taxa_match_batch(source, fix):
+    taxa = list(iucn_modlib.lazyTaxa(source, fixElevation=fix, fixHabitats=fix))
+    assert len(taxa) == 80
+    for taxon in taxa:
+        expected = iucn_modlib.TaxonFactoryRedListBatch(taxon.taxonid, source, fix, fix, cache=False)
+        assert isinstance(taxon, iucn_modlib.Taxon)
+        assert _normalised(taxon.materialise()) == _normalised(expected)
+
+
+def test_lazy_taxon_loads_on_access(source):
+    source = {k: v for k, v in source.items() if k != 'lazy_index'}
+    taxonid = int(source['assessments'].internalTaxonId.iloc[3])
+    taxon = iucn_modlib.LazyTaxonFactory(taxonid, source)
+    assert taxon.loaded() == {'taxonid'}
+    expected = iucn_modlib.TaxonFactoryRedListBatch(taxonid, source, cache=False)
+    assert (taxon.elevation_lower, taxon.elevation_upper) == (expected.elevation_lower, expected.elevation_upper)
+    assert taxon.loaded() == {'taxonid', 'aoo_km2', 'eoo_km2', 'elevation_upper', 'elevation_lower', 'depth_upper', 'depth_lower'}
+    # habitat columns are only converted on the first habitats access
+    assert 'habitat_columns' not in iucn_modlib.factories.LazyTaxonFactories.batchLazyIndex(source)
+    filters = iucn_modlib.HabitatFiltersFactory(template='kba_breeding')
+    assert taxon.habitatCodes(filters) == expected.habitatCodes(filters)
+    assert 'habitats' in taxon.loaded() and 'scientific_name' not in taxon.loaded()
+    assert 'habitat_columns' in iucn_modlib.factories.LazyTaxonFactories.batchLazyIndex(source)
+    params = iucn_modlib.ModelParametersFactory(taxon, filters, 'jung')
+    assert params == iucn_modlib.ModelParametersFactory(expected, filters, 'jung')
+
+    # fields set before they are loaded are kept
+    taxon = iucn_modlib.LazyTaxonFactory(taxonid, source, fixElevation=False)
+    taxon.elevation_lower = 10
+    assert taxon.elevation_upper == iucn_modlib.TaxonFactoryRedListBatch(taxonid, source, False, cache=False).elevation_upper
+    assert taxon.elevation_lower == 10
+    with pytest.raises(AttributeError):
+        taxon.weight
+    with pytest.raises(ValueError):
+        iucn_modlib.LazyTaxonFactory(1, source)
+
+
+def test_lazy_taxa_from_sqlite(source, tmp_path):
+    path = str(tmp_path / 'batch.sqlite')
+    iucn_modlib.writeBatchSQLite(source, path)
+    con = iucn_modlib.openBatchSQLite(path)
+    batch = {t.taxonid: t for t in iucn_modlib.lazyTaxa(source)}
+    for taxon in iucn_modlib.lazyTaxa(con):
+        assert _normalised(taxon.materialise()) == _normalised(batch[taxon.taxonid].materialise())
+    name = source['assessments'].scientificName.iloc[0]
+    assert iucn_modlib.LazyTaxonFactory(name, con).taxonid == iucn_modlib.LazyTaxonFactory(name, source).taxonid
+    con.close()
@@ -0,0 +1,81 @@
+import csv
+import threading
+import time
+import pytest
+import iucn_modlib
+from iucn_modlib import pipeline, synthetic, cli
+
+
+def square(x):
+    return x * x
+
+
+def fails_on_three(x):
+    if x == 3:
+        raise ValueError('three')
+    return x
+
+
+@pytest.mark.parametrize('executor', ['inline', 'thread', 'process'])
+def test_pipeline_order(executor):
+    stages = [
+        pipeline.Stage(square, executor = executor, workers = 3),
+        pipeline.Stage(lambda x: [x, -x] if x % 2 == 0 else None, flat = True, name = 'expand'),
+        ]
+    assert list(pipeline.Pipeline(range(10), stages, maxsize = 2)) == [0, 0, 4, -4, 16, -16, 36, -36, 64, -64]
+
+
+def test_pipeline_backpressure():
+    produced = []
+
+    def source():
+        for i in range(1000):
+            produced.append(i)
+            yield i
+
+    consumed = 0
+    for _ in pipeline.Pipeline(source(), [pipeline.Stage(square, executor = 'thread', workers = 2)], maxsize = 4):
+        consumed += 1
+        time.sleep(0.001)
+        # queues and in-flight items bound how far the source runs ahead
+        assert len(produced) - consumed <= 4 * 2 + 4 + 2
+        if consumed == 50:
+            break
+    time.sleep(0.1)
+    assert len(produced) < 100
+    assert threading.active_count() < 10
+
+
+def test_pipeline_errors():
+    with pytest.raises(ValueError):
+        pipeline.Pipeline(range(10), [pipeline.Stage(fails_on_three, executor = 'thread', workers = 2)]).run()
+    p = pipeline.Pipeline(range(10), [pipeline.Stage(fails_on_three)], errors = 'collect')
+    assert list(p) == [0, 1, 2, 4, 5, 6, 7, 8, 9]
+    assert p.failures == [('fails_on_three', 3, 'ValueError: three')]
+
+
+def test_pipeline_export_matches_cli(tmp_path):
+    batch = str(tmp_path / 'batch')
+    synthetic.writeSyntheticBatch(batch, 40)
+    source = iucn_modlib.loadBatchSource(batch)
+    taxa = [int(t) for t in source['assessments'].internalTaxonId]
+    pipeline.initBatchSource(source)
+    stats = pipeline.Pipeline(
+        taxa,
+        [
+            pipeline.Stage(pipeline.batchTaxon, executor = 'process', workers = 2),
+            pipeline.Stage(pipeline.modelParameters(('kba_breeding', 'kba_nonbreeding'), 'jung'), flat = True),
+            ],
+        sink = pipeline.RowSink(str(tmp_path / 'pipeline.csv'), chunkSize = 7)
+        ).run()
+    assert stats['batchTaxon']['items'] == 40
+    assert stats['sink']['items'] == 80
+    cli.main(['export', batch, '-t', 'jung', '-o', str(tmp_path / 'cli.csv'), '-w', '1', '-q'])
+    with open(tmp_path / 'pipeline.csv') as a, open(tmp_path / 'cli.csv') as b:
+        assert list(csv.DictReader(a)) == list(csv.DictReader(b))
+
+
+def test_api_taxon_stage():
+    func = pipeline.apiTaxon('token')
+    assert func.keywords['token'] == 'token'
+    assert func.func is iucn_modlib.TaxonFactoryRedListAPI
@@ -0,0 +1,60 @@
+import pytest
+import iucn_modlib
+from iucn_modlib import synthetic
+
+
+@pytest.fixture(scope='module')
+def source(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp('batch'))
+    synthetic.writeSyntheticBatch(path, 300)
+    return iucn_modlib.loadBatchSource(path)
+
+
+@pytest.fixture(scope='module')
+def taxa(source):
+    return [
+        iucn_modlib.TaxonFactoryRedListBatch(t, source, fixElevation=False)
+        for t in source['assessments'].internalTaxonId
+        ]
+
+
+def test_query_matches_taxa(source, taxa):
+    query = iucn_modlib.BatchQuery(source)
+    assert len(query) == 300
+    threatened = ('Critically Endangered', 'Endangered', 'Vulnerable')
+
+    expected = [
+        t.taxonid for t in taxa
+        if t.class_ == 'AVES' and t.category in threatened and t.terrestrial_system
+        and t.elevation_upper is not None and t.elevation_upper <= 4000
+        ]
+    assert len(expected) > 0
+    assert query.taxonids(class_ = 'aves', category = 'threatened', systems = 'Terrestrial', elevationUpper = (None, 4000)) == expected
+
+    expected = [t.taxonid for t in taxa if any(c == '1' or c.startswith('1.') for c in t.habitatCodes())]
+    assert query.taxonids(habitats = '1') == expected
+    assert query.count(habitats = '1') == len(expected)
+
+    expected = [t.taxonid for t in taxa if t.category in ('Endangered', 'Least Concern') and t.marine_system and t.freshwater_system]
+    assert query.taxonids(category = ['EN', 'Least Concern'], systems = ['marine', 'freshwater']) == expected
+
+    expected = [t.taxonid for t in taxa if t.elevation_lower is not None and 100 <= t.elevation_lower <= 1000]
+    assert query.taxonids(elevationLower = (100, 1000)) == expected
+
+
+def test_query_masks_and_taxa(source):
+    query = iucn_modlib.BatchQuery(source)
+    ids = source['assessments'].internalTaxonId.tolist()
+    assert query.taxonids() == ids
+    assert query.taxonids(taxonids = [ids[5], ids[2], -1]) == [ids[2], ids[5]]
+    birds = query.mask(class_ = 'AVES')
+    threatened = query.mask(category = 'threatened')
+    assert query.taxonids(birds & ~threatened) == [t for t in query.taxonids(class_ = 'AVES') if t not in query.taxonids(category = 'threatened')]
+    assert query.taxonids(birds, category = 'threatened') == query.taxonids(class_ = 'AVES', category = 'threatened')
+    assert query.count(family = 'no such family') == 0
+    selected = list(query.taxa(genus = source['taxonomy'].genusName.iloc[0]))
+    assert [t.taxonid for t in selected] == query.taxonids(genus = source['taxonomy'].genusName.iloc[0])
+    with pytest.raises(ValueError):
+        query.taxonids(systems = 'lunar')
+    with pytest.raises(ValueError):
+        query.taxonids(elevationUpper = 500)
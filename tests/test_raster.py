@@ -0,0 +1,52 @@
+import numpy
+import pytest
+import iucn_modlib
+from iucn_modlib import raster
+
+
+@pytest.fixture(scope='module')
+def dem(tmp_path_factory):
+    rng = numpy.random.default_rng(0)
+    dem = rng.integers(-400, 5000, size=(300, 250)).astype(numpy.int16)
+    dem[:20, :] = -32768
+    dem[100:200, 100:150] = 1000
+    path = str(tmp_path_factory.mktemp('dem') / 'dem.npy')
+    numpy.save(path, dem)
+    return path
+
+
+@pytest.mark.parametrize('lower,upper', [(-500, 9000), (200, 1500), (1000, 1000), (6000, 9000), (None, 0)])
+def test_elevation_index_matches_threshold(dem, tmp_path, lower, upper):
+    index = raster.writeElevationIndex(str(tmp_path / 'index'), dem, tileSize = (64, 48), nodata = -32768)
+    values = numpy.load(dem)
+    expected = (values != -32768)
+    if lower is not None:
+        expected &= values >= lower
+    if upper is not None:
+        expected &= values <= upper
+    assert (index.mask(lower, upper) == expected).all()
+    assert index.count(lower, upper) == expected.sum()
+
+
+def test_elevation_index_reload(dem, tmp_path):
+    path = str(tmp_path / 'index')
+    raster.writeElevationIndex(path, dem, tileSize = 100, nodata = -32768)
+    index = iucn_modlib.ElevationIndex(path)
+    assert index.shape == (300, 250)
+    assert len(index) == 9
+    # the constant block is resolved without scanning unrelated tiles
+    assert len(index.tiles(6000, 9000)) == 0
+    out = numpy.ones(index.shape, dtype=bool)
+    index.mask(1000, 1000, out = out)
+    assert out[100:200, 100:150].all()
+
+
+def test_elevation_index_float_dem(tmp_path):
+    dem = numpy.random.default_rng(1).uniform(-400, 5000, size=(90, 70)).astype(numpy.float32)
+    dem[:10] = numpy.nan
+    index = raster.writeElevationIndex(str(tmp_path / 'index'), dem, tileSize = 32)
+    assert index.dem is not None
+    expected = (dem >= 100.5) & (dem <= 2000)
+    assert (index.mask(100.5, 2000) == expected).all()
+    # without the DEM, all tiles are resolved from the sorted pixels
+    assert (raster.ElevationIndex(str(tmp_path / 'index')).mask(100.5, 2000) == expected).all()
@@ -0,0 +1,131 @@
+import asyncio
+import pytest
+import iucn_modlib
+from iucn_modlib import synthetic
+from iucn_modlib.redlist_api import mock, v3, loadtest
+
+
+@pytest.fixture(scope='module')
+def server():
+    with mock.MockRedListServer(20, seed = 2, token = 'secret') as server:
+        with v3.useBaseURL(server.url):
+            yield server
+
+
+def test_base_url():
+    previous = v3.setBaseURL('http://localhost:1/api/v3/')
+    assert v3.BASE_URL == 'http://localhost:1/api/v3'
+    v3.setBaseURL(previous)
+    with v3.useBaseURL('http://localhost:2/api/v3'):
+        assert v3.BASE_URL == 'http://localhost:2/api/v3'
+    assert v3.BASE_URL == previous
+
+
+def test_mock_serves_taxa(server):
+    for taxon in synthetic.syntheticTaxa(20, seed = 2):
+        taxonid = taxon['assessment']['internalTaxonId']
+        name = taxon['assessment']['scientificName']
+        if len(taxon['habitats']) == 0:
+            with pytest.raises(ValueError, match='habitats api call returned an empty result'):
+                iucn_modlib.TaxonFactoryRedListAPI(taxonid, 'secret')
+            continue
+        byId = iucn_modlib.TaxonFactoryRedListAPI(taxonid, 'secret')
+        byName = iucn_modlib.TaxonFactoryRedListAPI(name, 'secret')
+        assert byId.taxonid == byName.taxonid == taxonid
+        assert byId.habitatCodes() == byName.habitatCodes() == [h['code'] for h in taxon['habitats']]
+        assert str(v3.name_to_assessmentID(name)) == str(taxon['assessment']['assessmentId'])
+    with pytest.raises(ValueError, match='empty result'):
+        iucn_modlib.TaxonFactoryRedListAPI(1, 'secret')
+    with pytest.raises(ValueError, match='Token not valid'):
+        iucn_modlib.TaxonFactoryRedListAPI(taxonid, 'wrong')
+
+
+def test_mock_errors_and_throttling():
+    with mock.MockRedListServer(5, errorRate = 1.0) as server:
+        with v3.useBaseURL(server.url):
+            with pytest.raises(ValueError, match='Internal server error'):
+                iucn_modlib.TaxonFactoryRedListAPI(server.taxonids()[0], 'token')
+        assert server.stats['status'][500] == 2
+    with mock.MockRedListServer(5, rateLimit = 0.1, burst = 3) as server:
+        with v3.useBaseURL(server.url):
+            report = loadtest.loadTest(lambda t: iucn_modlib.TaxonFactoryRedListAPI(t, 'token'), server.taxonids(), 1, server = server)
+        assert report.server['status'] == {200: 3, 429: 7}
+        assert report.errors == 4
+
+
+def test_load_test(server):
+    report = loadtest.loadTest(lambda t: iucn_modlib.TaxonFactoryRedListAPI(t, 'secret'), server.taxonids(), 4, server = server)
+    empty = sum(len(t['habitats']) == 0 for t in synthetic.syntheticTaxa(20, seed = 2))
+    assert (report.calls, report.items, report.errors) == (20, 20, empty)
+    assert report.server['endpoints'] == {'species/id': 20, 'habitats/species/id': 20}
+    assert report.latency['p50'] <= report.latency['p99'] <= report.latency['max']
+    assert 'items/s' in report.summary()
+
+    bulk = loadtest.loadTest(lambda ts: [v3.id_to_habitats(t, 'secret') for t in ts], server.taxonids(), 2, batchSize = 8)
+    assert (bulk.calls, bulk.items) == (3, 20)
+
+    async def client(taxonid):
+        await asyncio.sleep(0.001)
+        if taxonid % 2:
+            raise KeyError(taxonid)
+    report = loadtest.loadTest(client, range(10), 4)
+    assert report.errors == 5 and report.errorTypes == {'KeyError': 5}
+
+
+def test_paged_listings():
+    from iucn_modlib import pipeline
+    with mock.MockRedListServer(20, seed = 2, token = 'secret', pageSize = 6) as server, v3.useBaseURL(server.url):
+        pages = list(v3.iterSpeciesPages('secret', prefetch = 3))
+        assert [len(p) for p in pages] == [6, 6, 6, 2]
+        assert [r['taxonid'] for p in pages for r in p] == server.taxonids()
+        assert 5 <= server.stats['endpoints']['species/page'] <= 7
+
+        regions = [r['identifier'] for r in v3.region_list('secret')['results']]
+        for region in regions:
+            assert [r['taxonid'] for p in v3.iterSpeciesPages('secret', region) for r in p] == server.taxonids(region)
+        assert sorted(t for r in regions for t in server.taxonids(r)) == sorted(server.taxonids())
+
+        record = next(v3.iterAssessments('secret'))['result'][0]
+        full = v3.id_to_assessment(record['taxonid'], 'secret')['result'][0]
+        assert {k: full[k] for k in v3.PAGE_FIELDS.values()} == {k: record[k] for k in v3.PAGE_FIELDS.values()}
+        assert record['elevation_upper'] is None
+
+        server.reset()
+        taxa = list(pipeline.apiPagedTaxa('secret', workers = 4, fixElevation = False))
+        withHabitats = [t['assessment']['internalTaxonId'] for t in synthetic.syntheticTaxa(20, seed = 2) if len(t['habitats']) > 0]
+        assert [t.taxonid for t in taxa] == withHabitats
+        # one habitats request per species, and no assessment requests
+        assert server.stats['endpoints']['habitats/species/id'] == 20
+        assert 'species/id' not in server.stats['endpoints']
+        assert all(t.habitatCodes() == iucn_modlib.TaxonFactoryRedListAPI(t.taxonid, 'secret', cache = False).habitatCodes() for t in taxa)
+        # page records have no elevations: without the fix they are left None
+        assert all(t.elevation_lower is None and t.elevation_upper is None for t in taxa)
+        full = list(pipeline.apiPagedTaxa('secret', workers = 4, fullAssessment = True))
+        assert full == [iucn_modlib.TaxonFactoryRedListAPI(t.taxonid, 'secret', cache = False) for t in taxa]
+
+        with pytest.raises(ValueError, match='Token not valid'):
+            list(v3.iterSpeciesPages('wrong'))
+
+
+def test_paged_taxa_failures(monkeypatch):
+    from iucn_modlib import pipeline
+    with mock.MockRedListServer(20, seed = 2, pageSize = 6) as server, v3.useBaseURL(server.url):
+        taxonids = server.taxonids()
+        habitats = v3.id_to_habitats
+
+        def failing(taxonid, token):
+            if taxonid == taxonids[1]:
+                raise ConnectionError('Connection reset')
+            if taxonid == taxonids[7]:
+                return {'message': 'Internal server error'}
+            return habitats(taxonid, token)
+        monkeypatch.setattr(v3, 'id_to_habitats', failing)
+        # failures stop the listing, unless they are collected
+        with pytest.raises(ConnectionError, match='Connection reset'):
+            list(pipeline.apiPagedTaxa('token', workers = 4))
+        failures = []
+        taxa = list(pipeline.apiPagedTaxa('token', workers = 4, failures = failures))
+    # failed species are skipped and reported, without stopping the listing
+    assert failures == [(taxonids[1], 'ConnectionError: Connection reset'), (taxonids[7], 'ValueError: Internal server error')]
+    withHabitats = [t['assessment']['internalTaxonId'] for t in synthetic.syntheticTaxa(20, seed = 2) if len(t['habitats']) > 0]
+    assert [t.taxonid for t in taxa] == [t for t in withHabitats if t not in (taxonids[1], taxonids[7])]
@@ -0,0 +1,73 @@
+import pytest
+import iucn_modlib
+from iucn_modlib import resolver, synthetic
+from iucn_modlib.redlist_api import mock, v3
+
+
+def test_resolver_tiers(tmp_path):
+    synthetic.writeSyntheticBatch(str(tmp_path / 'batch'), 30)
+    source = iucn_modlib.loadBatchSource(str(tmp_path / 'batch'))
+    local = set(source['assessments'].internalTaxonId.tolist())
+    with mock.MockRedListServer(50) as server, v3.useBaseURL(server.url):
+        taxonids = server.taxonids()
+        assert local < set(taxonids)
+        withoutHabitats = {t['assessment']['internalTaxonId'] for t in synthetic.syntheticTaxa(50) if len(t['habitats']) == 0}
+        remote = [t for t in taxonids if t not in local]
+
+        taxonResolver = resolver.TaxonResolver([
+            ('cache', iucn_modlib.TaxonCache(100)),
+            ('batch', source),
+            ('api', 'token', {'workers': 4})
+            ])
+        resolution = taxonResolver.resolve(taxonids + [taxonids[0], 1])
+        assert list(resolution.taxa) == [t for t in taxonids if t in local or t not in withoutHabitats]
+        assert resolution.missing == [t for t in taxonids if t not in local and t in withoutHabitats] + [1]
+        assert all(resolution.tiers[t] == 'batch' for t in local)
+        assert resolution.stats['cache']['hits'] == 0
+        assert resolution.stats['batch']['hits'] == 30
+        assert resolution.stats['api']['requested'] == len(remote) + 1
+        # only the taxa missing from the batch source were requested
+        assert server.stats['endpoints']['species/id'] == len(remote) + 1
+        expected = iucn_modlib.TaxonFactoryRedListBatch(taxonids[0], source, cache=False)
+        assert resolution.taxa[taxonids[0]] == expected
+
+        # resolved taxa are now cached
+        server.reset()
+        again = taxonResolver.resolve(taxonids)
+        assert again.stats['cache']['hits'] == len(resolution.taxa)
+        assert again.stats['cache']['hitRate'] == len(resolution.taxa) / 50
+        assert server.stats['endpoints']['species/id'] == len(again.missing)
+        assert taxonResolver.stats()['batch']['hits'] == 30
+        assert 'batch: 30/51 hits' in resolution.summary()
+
+
+def test_resolver_errors(tmp_path):
+    path = str(tmp_path / 'dummy.sqlite')
+    iucn_modlib.writeBatchSQLite('tests/data/red_list_batch_dummy/', path)
+    with mock.MockRedListServer(5, errorRate = 1.0) as server, v3.useBaseURL(server.url):
+        taxonResolver = resolver.TaxonResolver([('sqlite', path), ('api', 'token')])
+        resolution = taxonResolver.resolve(['Polygeminus grex', server.taxonids()[0]])
+    assert resolution.tiers == {'Polygeminus grex': 'sqlite'}
+    assert resolution.missing == [server.taxonids()[0]]
+    assert resolution.errors[server.taxonids()[0]] == [('api', 'ValueError: Internal server error')]
+    assert resolution.stats['api']['errors'] == 1
+    with pytest.raises(ValueError):
+        resolver.TaxonResolver([('ftp', 'example.org')])
+    with pytest.raises(ValueError):
+        resolver.TaxonResolver([('sqlite', path), ('sqlite', path)])
+
+
+def test_resolver_cache_identity(tmp_path):
+    old = iucn_modlib.loadBatchSource('tests/data/red_list_batch_dummy/')
+    new = dict(old, assessments=old['assessments'].assign(redlistCategory='Extinct'))
+    cache = iucn_modlib.TaxonCache(100)
+    resolvers = [resolver.TaxonResolver([('cache', cache), ('batch', source)]) for source in (old, new)]
+    for _ in range(2):
+        # resolvers over other sources sharing the cache do not serve each other's taxa
+        assert [r.resolve([2345]).taxa[2345].category for r in resolvers] == ['Least Concern', 'Extinct']
+    assert cache.hits == 2
+    # a named identity shares cached taxa deliberately
+    shared = [resolver.TaxonResolver([('cache', cache, {'identity': 'dummy'}), ('batch', source)]) for source in (old, new)]
+    assert [r.resolve([2345]).taxa[2345].category for r in shared] == ['Least Concern', 'Least Concern']
+    with pytest.raises(ValueError):
+        resolver.TaxonResolver([('cache', cache), resolver.Tier('custom', lambda *args: {})])
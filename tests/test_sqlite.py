@@ -0,0 +1,50 @@
+import dataclasses
+import pytest
+import iucn_modlib
+from iucn_modlib import synthetic
+
+
+def _fields(taxon):
+    # missing values are NaN in batch sources and None in SQLite
+    return {k: None if v != v else v for k, v in dataclasses.asdict(taxon).items() if k != 'habitats'}
+
+
+def _habitats(taxon):
+    return [{k: None if v != v else v for k, v in h.items()} for h in taxon.habitats]
+
+
+@pytest.mark.parametrize("fix", [True, False])
+def test_sqlite_matches_batch(tmp_path, fix):
+    synthetic.writeSyntheticBatch(str(tmp_path / 'batch'), 60)
+    source = iucn_modlib.loadBatchSource(str(tmp_path / 'batch'))
+    path = str(tmp_path / 'batch.sqlite')
+    assert iucn_modlib.writeBatchSQLite(source, path) == 60
+    con = iucn_modlib.openBatchSQLite(path)
+    for taxonid in source['assessments'].internalTaxonId.tolist():
+        expected = iucn_modlib.TaxonFactoryRedListBatch(taxonid, source, fix, fix, cache=False)
+        taxon = iucn_modlib.TaxonFactorySQLite(taxonid, con, fix, fix, cache=False)
+        assert _fields(taxon) == _fields(expected)
+        assert _habitats(taxon) == _habitats(expected)
+    con.close()
+
+
+def test_sqlite_factory_by_name(tmp_path):
+    path = str(tmp_path / 'dummy.sqlite')
+    iucn_modlib.writeBatchSQLite('tests/data/red_list_batch_dummy/', path)
+    tribble = iucn_modlib.TaxonFactorySQLite('Polygeminus grex', path, cache=False)
+    assert tribble.taxonid == 2345
+    assert tribble.main_common_name == 'Tribble'
+    assert tribble.habitatCodes() == iucn_modlib.TaxonFactoryRedListBatch(2345, 'tests/data/red_list_batch_dummy/', cache=False).habitatCodes()
+    with pytest.raises(ValueError):
+        iucn_modlib.TaxonFactorySQLite('Equus unicornis', path, cache=False)
+    with pytest.raises(ValueError):
+        iucn_modlib.TaxonFactorySQLite(1, path, cache=False)
+    with pytest.raises(FileNotFoundError):
+        iucn_modlib.TaxonFactorySQLite(2345, str(tmp_path / 'missing.sqlite'), cache=False)
+
+
+def test_sqlite_command(tmp_path):
+    from iucn_modlib import cli
+    path = str(tmp_path / 'dummy.sqlite')
+    assert cli.main(['sqlite', 'tests/data/red_list_batch_dummy/', path, '--quiet']) == 0
+    assert iucn_modlib.TaxonFactorySQLite(2345, path, cache=False).scientific_name == 'Polygeminus grex'
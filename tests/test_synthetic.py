@@ -0,0 +1,33 @@
+import iucn_modlib
+from iucn_modlib import synthetic
+
+
+def test_synthetic_batch(tmp_path):
+    synthetic.writeSyntheticBatch(str(tmp_path), 50, seed=1)
+    source = iucn_modlib.loadBatchSource(str(tmp_path))
+    assert len(source['assessments']) == 50
+    assert source['assessments'].scientificName.is_unique
+    for taxonid in source['assessments'].internalTaxonId:
+        tax = iucn_modlib.TaxonFactoryRedListBatch(taxonid, source)
+        assert -500 <= tax.elevation_lower < tax.elevation_upper <= 9000
+
+
+def test_synthetic_is_reproducible():
+    assert list(synthetic.syntheticTaxa(20, seed=3)) == list(synthetic.syntheticTaxa(20, seed=3))
+
+
+def test_synthetic_api_jsons(tmp_path):
+    pairs = synthetic.writeSyntheticAPIJsons(str(tmp_path), 5)
+    for taxon, (assessment, habitats) in zip(synthetic.syntheticTaxa(5), pairs):
+        tax = iucn_modlib.TaxonFactoryRedListAPIJsons(assessment, habitats)
+        assert tax.taxonid == taxon['assessment']['internalTaxonId']
+        assert tax.habitatCodes() == [h['code'] for h in taxon['habitats']]
+
+
+def test_synthetic_dem():
+    dem = synthetic.syntheticDEM((200, 300), seed = 3)
+    assert dem.shape == (200, 300)
+    ocean = (dem == -32768).mean()
+    assert 0.5 < ocean < 0.7
+    assert dem[dem != -32768].min() >= -400 and dem.max() <= 6000
+    assert (dem == synthetic.syntheticDEM((200, 300), seed = 3)).all()
@@ -0,0 +1,105 @@
+import sqlite3
+import pytest
+import iucn_modlib
+from iucn_modlib import synthetic, TaxonCache, setTaxonCache
+
+
+@pytest.fixture(scope='module')
+def path(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp('batch'))
+    synthetic.writeSyntheticBatch(path, 20)
+    return path
+
+
+@pytest.fixture(scope='module')
+def source(path):
+    return iucn_modlib.loadBatchSource(path)
+
+
+def test_cache_hits_and_copies(path, source):
+    cache = TaxonCache(100)
+    taxonid = int(source['assessments'].internalTaxonId.iloc[0])
+    name = source['assessments'].scientificName.iloc[0]
+    a = iucn_modlib.TaxonFactoryRedListBatch(taxonid, source, cache = cache)
+    b = iucn_modlib.TaxonFactoryRedListBatch(taxonid, source, cache = cache)
+    assert (cache.hits, cache.misses) == (1, 1)
+    assert a == b and a is not b
+    # callers cannot corrupt the cached entry
+    b.habitats.clear()
+    a.habitats[0]['code'] = 'x'
+    c = iucn_modlib.TaxonFactoryRedListBatch(taxonid, source, cache = cache)
+    assert c == iucn_modlib.TaxonFactoryRedListBatch(taxonid, source)
+    # names are aliases of the taxon id entry
+    assert iucn_modlib.TaxonFactoryRedListBatch(name, source, cache = cache) == c
+    assert len(cache) == 1
+    # fix flags and sources are part of the key
+    iucn_modlib.TaxonFactoryRedListBatch(taxonid, source, fixElevation = False, cache = cache)
+    iucn_modlib.TaxonFactoryRedListBatch(taxonid, iucn_modlib.loadBatchSource(path), cache = cache)
+    iucn_modlib.TaxonFactoryRedListBatch(taxonid, path, cache = cache)
+    iucn_modlib.TaxonFactoryRedListBatch(taxonid, path, cache = cache)
+    assert len(cache) == 4
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses']) == (3, 5)
+
+
+def test_cache_eviction(source):
+    cache = TaxonCache(5)
+    ids = source['assessments'].internalTaxonId.tolist()
+    for t in ids:
+        iucn_modlib.TaxonFactoryRedListBatch(t, source, cache = cache)
+    assert len(cache) == 5 and cache.evictions == len(ids) - 5
+    iucn_modlib.TaxonFactoryRedListBatch(ids[-1], source, cache = cache)
+    iucn_modlib.TaxonFactoryRedListBatch(ids[0], source, cache = cache)
+    assert cache.hits == 1
+    cache.clear()
+    assert len(cache) == 0
+    with pytest.raises(ValueError):
+        TaxonCache(0)
+
+
+def test_default_cache(tmp_path):
+    pairs = synthetic.writeSyntheticAPIJsons(str(tmp_path / 'jsons'), 3)
+    bundle = str(tmp_path / 'bundle.jsonl')
+    iucn_modlib.writeRedListAPIJsonBundle(bundle, pairs)
+    taxonid = iucn_modlib.TaxonFactoryRedListAPIJsons(*pairs[0]).taxonid
+    cache = TaxonCache()
+    previous = setTaxonCache(cache)
+    try:
+        for _ in range(2):
+            iucn_modlib.TaxonFactoryRedListAPIJsons(*pairs[0])
+            iucn_modlib.TaxonFactoryRedListAPIJsonBundle(taxonid, bundle)
+        assert (cache.hits, cache.misses) == (2, 2)
+        iucn_modlib.TaxonFactoryRedListAPIJsons(*pairs[0], cache = False)
+        assert (cache.hits, cache.misses) == (2, 2)
+    finally:
+        setTaxonCache(previous)
+
+
+def test_sqlite_connections_are_identified_by_file(tmp_path):
+    source = iucn_modlib.loadBatchSource('tests/data/red_list_batch_dummy/')
+    iucn_modlib.writeBatchSQLite(source, str(tmp_path / 'a.sqlite'))
+    source['assessments'] = source['assessments'].assign(redlistCategory='Extinct')
+    iucn_modlib.writeBatchSQLite(source, str(tmp_path / 'b.sqlite'))
+    cache = TaxonCache()
+    for path, category in (('a.sqlite', 'Least Concern'), ('b.sqlite', 'Extinct'), ('a.sqlite', 'Least Concern')):
+        con = iucn_modlib.openBatchSQLite(str(tmp_path / path))
+        assert iucn_modlib.TaxonFactorySQLite(2345, con, cache=cache).category == category
+        con.close()
+        del con
+    assert (cache.hits, cache.misses) == (1, 2)
+    # in-memory databases have no stable identity, and are not cached
+    assert iucn_modlib.classes.TaxonCache.sourceIdentity(sqlite3.connect(':memory:')) is None
+
+
+def test_source_identity_of_dicts(source):
+    from iucn_modlib.classes.TaxonCache import sourceIdentity
+    source = dict(source)
+    keys = set(source)
+    identity = sourceIdentity(source)
+    # nothing is stored in the source, and copies with the same tables share it
+    assert set(source) == keys
+    assert sourceIdentity(dict(source)) == identity
+    assert sourceIdentity(dict(source, assessments=source['assessments'].copy())) != identity
+    source['assessments'] = source['assessments'].copy()
+    assert sourceIdentity(source) != identity
+    assert sourceIdentity({}) is None
@@ -17,5 +17,71 @@ def test_import_batch():
     assert tribble.taxonid == 2345
     assert tribble.scientific_name == "Polygeminus grex"
     assert tribble.main_common_name == "Tribble"
-    assert tribble.habitatCodes() == [1.4]
+    assert tribble.habitatCodes() == ['1.4']
     assert tribble.habitatNames() == ['Silo - grain']
+
+
+def test_import_json_bundle(tmp_path):
+    bundle = str(tmp_path / 'bundle.jsonl')
+    n = iucn_modlib.writeRedListAPIJsonBundle(bundle, [(
+        'tests/data/red_list_api_json_dummy/equus_unicornis_assessment.json',
+        'tests/data/red_list_api_json_dummy/equus_unicornis_habitats.json'
+        )])
+    assert n == 1
+    tax = iucn_modlib.TaxonFactoryRedListAPIJsonBundle(0, bundle)
+    assert tax.scientific_name == 'Equus unicornis'
+    assert tax.habitatCodes() == ['4.4', '8.2']
+    with iucn_modlib.RedListAPIJsonBundle(bundle) as b:
+        assert len(b) == 1
+        assert 'Equus unicornis' in b
+        assert 1 not in b
+        assessment, habitats = next(iter(b))
+        assert assessment['result'][0]['taxonid'] == 0
+
+
+def test_import_json_bundle_without_index(tmp_path):
+    bundle = str(tmp_path / 'bundle.jsonl')
+    iucn_modlib.writeRedListAPIJsonBundle(bundle, [(
+        'tests/data/red_list_api_json_dummy/equus_unicornis_assessment.json',
+        'tests/data/red_list_api_json_dummy/equus_unicornis_habitats.json'
+        )])
+    (tmp_path / 'bundle.jsonl.idx').unlink()
+    tax = iucn_modlib.TaxonFactoryRedListAPIJsonBundle('Equus unicornis', bundle)
+    assert tax.taxonid == 0
+
+
+def test_json_bundle_stale_index(tmp_path):
+    import os
+    import shutil
+    bundle = str(tmp_path / 'bundle.jsonl')
+
+    def responses(taxonid, name):
+        return [({'result': [{'taxonid': taxonid, 'scientific_name': name}]}, {'result': []})]
+    iucn_modlib.writeRedListAPIJsonBundle(bundle, responses(1, 'Aaaa bbbb'))
+    shutil.copyfile(bundle + '.idx', tmp_path / 'old.idx')
+    mtime = os.stat(bundle).st_mtime_ns
+    # rewritten with the same size, next to the index of the old bundle
+    iucn_modlib.writeRedListAPIJsonBundle(bundle, responses(2, 'Cccc dddd'))
+    os.utime(bundle, ns=(mtime + 10**9, mtime + 10**9))
+    shutil.copyfile(tmp_path / 'old.idx', bundle + '.idx')
+    with iucn_modlib.RedListAPIJsonBundle(bundle) as b:
+        assert b.taxonids() == [2]
+        assert 'Cccc dddd' in b and 'Aaaa bbbb' not in b
+
+
+def test_fix_habitats_missing_values():
+    tribble = iucn_modlib.TaxonFactoryRedListBatch(2345, 'tests/data/red_list_batch_dummy/', fixHabitats=False)
+    nan = float('nan')
+    tribble.habitats = [
+        {'code': '1.4', 'habitat': 'a', 'season': None, 'suitability': None, 'majorimportance': None},
+        {'code': '1.5', 'habitat': 'b', 'season': nan, 'suitability': nan, 'majorimportance': nan},
+        {'code': '1.6', 'habitat': 'c', 'season': 'Resident', 'suitability': 'Suitable', 'majorimportance': 'Yes'}
+        ]
+    tribble.fix(fixType='habitats')
+    assert [(h['season'], h['suitability'], h['majorimportance']) for h in tribble.habitats] == [
+        # None (API and database sources) was already treated as missing
+        ('Seasonal Occurrence Unknown', 'Unknown', 'No'),
+        # NaN (batch downloads) was previously kept, as (nan, nan, nan)
+        ('Seasonal Occurrence Unknown', 'Unknown', 'No'),
+        ('Resident', 'Suitable', 'Yes')
+        ]
@@ -0,0 +1,100 @@
+import numpy
+import pytest
+from iucn_modlib import synthetic, ModelParameters
+from iucn_modlib.raster import scheduleTiles, maskKey
+
+
+CLASSES = numpy.array([100, 101, 102, 200, 201, 400, 600, 1401], dtype=numpy.uint16)
+
+
+@pytest.fixture(scope='module')
+def rasters(tmp_path_factory):
+    path = tmp_path_factory.mktemp('rasters')
+    numpy.save(path / 'lc.npy', synthetic.syntheticLandCover((130, 170), CLASSES, seed = 1, patch = 16))
+    numpy.save(path / 'dem.npy', synthetic.syntheticDEM((130, 170), seed = 1))
+    return str(path / 'lc.npy'), str(path / 'dem.npy')
+
+
+def species():
+    return [
+        ModelParameters(1, 'a', 'custom', 'jung', -500, 9000, [], [100, 101]),
+        ModelParameters(2, 'b', 'custom', 'jung', 1000, 2500, [], [200, 201, 400]),
+        ModelParameters(3, 'c', 'custom', 'jung', 5900, 9000, [], [1401]),
+        ModelParameters(4, 'd', 'custom', 'jung', None, 300, [], [600, 999]),
+        ModelParameters(5, 'e', 'custom', None, -500, 9000, [], []),
+        ]
+
+
+@pytest.mark.parametrize('maxMemory,maxSpecies', [(256 * 2**20, 4096), (1, 2)])
+def test_schedule_tiles_matches_per_species(rasters, tmp_path, maxMemory, maxSpecies):
+    lc, dem = numpy.load(rasters[0]), numpy.load(rasters[1])
+    stats = scheduleTiles(species(), *rasters, output = str(tmp_path), tileSize = 50, nodata = -32768, maxMemory = maxMemory, maxSpecies = maxSpecies)
+    for p in species():
+        expected = numpy.isin(lc, p.land_cover_codes) & (dem != -32768)
+        if p.elevation_lower is not None:
+            expected &= dem >= p.elevation_lower
+        if p.elevation_upper is not None:
+            expected &= dem <= p.elevation_upper
+        assert (numpy.load(tmp_path / f'{maskKey(p)}.npy') == expected).all()
+        assert stats['pixels'][maskKey(p)] == expected.sum()
+    # each tile is read once per species batch
+    assert stats['batches'] == -(-5 // maxSpecies)
+    assert stats['tiles_read'] == 12 * stats['batches']
+    assert stats['evaluations'] + stats['skipped'] == 12 * 5
+
+
+def test_schedule_tiles_counts_only(rasters):
+    stats = scheduleTiles(species(), *rasters, tileSize = 64, nodata = -32768)
+    pixels = {int(k.split('_')[0]): n for k, n in stats['pixels'].items()}
+    assert pixels[5] == 0
+    assert pixels[1] > 0
+
+
+def test_schedule_tiles_deduplicate(rasters, tmp_path):
+    params = species() + [ModelParameters(6, 'f', 'custom', 'jung', -500, 9000, [], [101, 100])]
+    stats = scheduleTiles(params, *rasters, output = str(tmp_path), tileSize = 64, nodata = -32768, deduplicate = True)
+    assert stats['signatures'] == 5
+    assert stats['dedup_ratio'] == 6 / 5
+    first, copy = maskKey(params[0]), maskKey(params[5])
+    assert stats['pixels'][copy] == stats['pixels'][first]
+    assert (numpy.load(tmp_path / f'{copy}.npy') == numpy.load(tmp_path / f'{first}.npy')).all()
+
+
+def test_schedule_tiles_same_taxon(rasters, tmp_path):
+    # parameter sets of the same taxon for several filters are kept apart
+    params = [
+        ModelParameters(1, 'a', 'kba_breeding', 'jung', None, None, [], [100]),
+        ModelParameters(1, 'a', 'kba_nonbreeding', 'jung', None, None, [], [200, 201]),
+        ModelParameters(2, 'b', 'kba_breeding', 'jung', None, None, [], [100])
+        ]
+    for deduplicate in (False, True):
+        stats = scheduleTiles(params, *rasters, output = str(tmp_path), tileSize = 64, deduplicate = deduplicate)
+        lc = numpy.load(rasters[0])
+        for p in params:
+            assert (numpy.load(tmp_path / f'{maskKey(p)}.npy') == numpy.isin(lc, p.land_cover_codes)).all()
+            assert stats['pixels'][maskKey(p)] == numpy.isin(lc, p.land_cover_codes).sum()
+
+
+def test_schedule_tiles_open_files_limit(rasters, tmp_path):
+    resource = pytest.importorskip('resource')
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    params = [ModelParameters(i, 'a', 'custom', 'jung', -500, 9000, [], [100]) for i in range(150)]
+    resource.setrlimit(resource.RLIMIT_NOFILE, (200, hard))
+    try:
+        stats = scheduleTiles(params, *rasters, output = str(tmp_path), tileSize = 64)
+    finally:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (soft, hard))
+    # batches of 200 - 128 open files
+    assert stats['batches'] == 3
+    assert len(stats['pixels']) == 150
+
+
+def test_schedule_tiles_non_integer_codes(tmp_path):
+    params = species() + [ModelParameters(6, 'f', 'custom', 'names', None, None, [], ['Forest'])]
+    # validated before the (missing) rasters are opened
+    with pytest.raises(ValueError, match='taxon 6'):
+        scheduleTiles(params, str(tmp_path / 'lc.npy'), str(tmp_path / 'dem.npy'))
+    # numeric strings are integer classes
+    params = [ModelParameters(7, 'g', 'custom', 'jung', None, None, [], ['100', '101'])]
+    lc = numpy.array([[100, 101], [102, 100]], dtype=numpy.uint16)
+    assert scheduleTiles(params, lc, numpy.zeros((2, 2)))['pixels'][maskKey(params[0])] == 3
@@ -63,3 +63,38 @@ def test_esacci_translator(input, expected):
     result = translator.toESACCI(input)
     result.sort()
     assert expected == result
+
+
+def test_translators_are_registered_crosswalks():
+    assert {'jung', 'esacci'} <= set(translator.crosswalkNames())
+    jung = translator.getCrosswalk('jung')
+    assert jung.levels == (1, 2)
+    assert jung.table.shape == (len(jung.codes), len(jung.targets))
+    assert translator.toJung('11.1') == jung.translate(['11.1']) == [1100, 1101]
+
+
+def test_translator_invalid_code():
+    with pytest.raises(ValueError):
+        translator.toJung(['1', '99'])
+    with pytest.raises(ValueError):
+        translator.toESACCI('Apple pie')
+
+
+def test_custom_crosswalk(tmp_path):
+    import json
+    from iucn_modlib import TranslatorFactory
+    path = tmp_path / 'custom.json'
+    path.write_text(json.dumps({
+        'name': 'custom',
+        'levels': [1, 2],
+        'map': {'1': [10], '1.1': [11], '1.2': [12], '14': [140]},
+        'unmappable': ['1.2']
+        }))
+    translator.registerCrosswalk(str(path))
+    assert TranslatorFactory('custom')(['1.1']) == [10, 11]
+    assert TranslatorFactory('custom')(['1']) == [10, 11]
+    assert TranslatorFactory('custom')(['14.1', '2']) == [140]
+    with pytest.raises(ValueError):
+        TranslatorFactory('missing')
+    with pytest.raises(ValueError):
+        translator.Crosswalk('broken', {'99': [1]})